@@ -0,0 +1,269 @@
+import json
+import os
+import re
+import shutil
+import logging
+import numpy as np
+from .quantization import VectorQuantizer, recall_at_k
+
+logger = logging.getLogger(__name__)
+
+# Rows per block for exact search (bounds the distance matrix)
+CHUNK_ROWS = 65536
+
+
+class LocalHit:
+    """Search hit with the attributes used from pymilvus hits"""
+
+    def __init__(self, id, distance, entity):
+        self.id = id
+        self.distance = distance
+        self.score = distance
+        self.entity = entity
+
+    def get(self, field_name):
+        return self.entity.get(field_name)
+
+
+class LocalCollection:
+    """In-process collection with the subset of the pymilvus Collection API used by MilvusClient"""
+
+    def __init__(self, path, dim=1024, vector_dtype="float32"):
+        self.path = path
+        self.dim = dim
+        # Vectors are stored as float32, float16 or int8 codes and dequantized per search block
+        self.quantizer = VectorQuantizer(vector_dtype)
+        self.ids = np.empty(0, dtype=np.int64)
+        self.vectors = np.empty((0, dim), dtype=self.quantizer.numpy_dtype)
+        self.texts = []
+        self.metadata = []
+        self.index_params = {"index_type": "FLAT", "metric_type": "L2", "params": {}}
+        self.centroids = None
+        self.assignments = None
+        self._indexed_rows = 0
+        if os.path.exists(os.path.join(path, "meta.json")):
+            self._open()
+
+    @property
+    def num_entities(self):
+        return len(self.ids)
+
+    def create_index(self, field_name, index_params):
+        """Store index parameters; IVF indexes are trained on first search once enough rows exist"""
+        self.index_params = {
+            "index_type": str(index_params.get("index_type", "FLAT")),
+            "metric_type": str(index_params.get("metric_type", "L2")),
+            "params": dict(index_params.get("params", {}))
+        }
+        self.centroids = None
+        self.assignments = None
+
+    def insert(self, entities):
+        """Insert column-based entities [texts, embeddings, metadata] with auto-generated ids"""
+        texts, embeddings, metadata_list = entities
+        vectors = np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dim)
+        start = int(self.ids.max()) + 1 if len(self.ids) else 1
+        ids = np.arange(start, start + len(vectors), dtype=np.int64)
+
+        if self.quantizer.dtype != "float32" and not len(self.ids):
+            # The first batch of an empty collection sets the int8 scale
+            self.quantizer.fit(vectors)
+            logger.info(f"{self.quantizer.dtype} recall@10 vs float32: {recall_at_k(vectors, self.quantizer):.3f}")
+
+        self.ids = np.concatenate([self.ids, ids])
+        self.vectors = np.concatenate([self.vectors, self.quantizer.quantize(vectors)])
+        self.texts.extend(texts)
+        self.metadata.extend(metadata_list)
+        if self.centroids is not None:
+            self.assignments = np.concatenate([self.assignments, self._nearest_centroids(vectors)])
+        return ids
+
+    def delete(self, expr):
+        """Delete rows matching an 'id in [...]' or 'id == n' expression"""
+        keep = ~self._id_mask(expr)
+        self.ids = self.ids[keep]
+        self.vectors = self.vectors[keep]
+        self.texts = [text for text, k in zip(self.texts, keep) if k]
+        self.metadata = [meta for meta, k in zip(self.metadata, keep) if k]
+        if self.assignments is not None:
+            self.assignments = self.assignments[keep]
+
+    def _id_mask(self, expr):
+        match = re.fullmatch(r"\s*id\s*(in|==)\s*(.+?)\s*", expr)
+        if not match:
+            raise ValueError(f"Unsupported expression: {expr}")
+        values = json.loads(match.group(2))
+        return np.isin(self.ids, values if isinstance(values, list) else [values])
+
+    def load(self):
+        pass
+
+    def release(self):
+        pass
+
+    def search(self, data, anns_field, param, limit, output_fields=None, expr=None):
+        """Search with exact distances, or within the nprobe closest IVF clusters"""
+        queries = np.asarray(data, dtype=np.float32).reshape(-1, self.dim)
+        nprobe = int(param.get("params", {}).get("nprobe", 16))
+        allowed = self._id_mask(expr) if expr else None
+        self._ensure_index()
+
+        results = []
+        for query in queries:
+            rows = None
+            if self.centroids is not None:
+                probes = np.argsort(((self.centroids - query) ** 2).sum(axis=1))[:nprobe]
+                rows = np.flatnonzero(np.isin(self.assignments, probes))
+            if allowed is not None:
+                rows = np.flatnonzero(allowed) if rows is None else rows[allowed[rows]]
+            hits = []
+            for row, distance in self._exact(query, rows, limit):
+                entity = {"text": self.texts[row], "metadata": self.metadata[row]}
+                if output_fields is not None:
+                    entity = {name: value for name, value in entity.items() if name in output_fields}
+                hits.append(LocalHit(int(self.ids[row]), distance, entity))
+            results.append(hits)
+        return results
+
+    def _exact(self, query, rows, limit):
+        total = len(self.ids) if rows is None else len(rows)
+        best_rows = np.empty(0, dtype=np.int64)
+        best_dist = np.empty(0, dtype=np.float32)
+        for start in range(0, total, CHUNK_ROWS):
+            chunk = np.arange(start, min(total, start + CHUNK_ROWS)) if rows is None else rows[start:start + CHUNK_ROWS]
+            diff = self.quantizer.dequantize(self.vectors[chunk]) - query
+            dist = np.concatenate([best_dist, np.einsum("ij,ij->i", diff, diff)])
+            cand = np.concatenate([best_rows, chunk])
+            if len(dist) > limit:
+                top = np.argpartition(dist, limit)[:limit]
+                dist, cand = dist[top], cand[top]
+            best_rows, best_dist = cand, dist
+        order = np.argsort(best_dist, kind="stable")
+        return [(int(row), float(dist)) for row, dist in zip(best_rows[order], best_dist[order])]
+
+    def _ensure_index(self):
+        """Train IVF centroids once the collection has enough rows, retrain after it doubled"""
+        if not self.index_params["index_type"].startswith("IVF"):
+            return
+        nlist = int(self.index_params["params"].get("nlist", 1024))
+        if len(self.ids) < nlist * 4:
+            # Too few rows for meaningful clusters: exact search
+            self.centroids = None
+            self.assignments = None
+            return
+        if self.centroids is not None and len(self.ids) <= 2 * self._indexed_rows:
+            return
+        rng = np.random.default_rng(0)
+        sample = self.quantizer.dequantize(self.vectors[rng.choice(len(self.ids), min(len(self.ids), nlist * 40), replace=False)])
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(10):
+            labels = self._nearest_centroids(sample, centroids)
+            counts = np.bincount(labels, minlength=nlist)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+        self.centroids = centroids
+        self.assignments = np.concatenate([
+            self._nearest_centroids(self.quantizer.dequantize(self.vectors[i:i + CHUNK_ROWS]))
+            for i in range(0, len(self.ids), CHUNK_ROWS)
+        ])
+        self._indexed_rows = len(self.ids)
+
+    def _nearest_centroids(self, vectors, centroids=None):
+        centroids = self.centroids if centroids is None else centroids
+        vectors = np.asarray(vectors)
+        return np.concatenate([
+            (vectors[i:i + CHUNK_ROWS] @ centroids.T * -2.0 + (centroids * centroids).sum(axis=1)).argmin(axis=1)
+            for i in range(0, len(vectors), CHUNK_ROWS)
+        ] or [np.empty(0, dtype=np.int64)])
+
+    def flush(self):
+        """Write the collection to disk (vectors as .npy, texts and metadata as JSON)"""
+        tmp_path = self.path + ".tmp"
+        if os.path.exists(tmp_path):
+            shutil.rmtree(tmp_path)
+        os.makedirs(tmp_path)
+        np.save(os.path.join(tmp_path, "ids.npy"), self.ids)
+        np.save(os.path.join(tmp_path, "vectors.npy"), np.asarray(self.vectors))
+        with open(os.path.join(tmp_path, "records.json"), "w", encoding="utf-8") as f:
+            json.dump({"texts": self.texts, "metadata": self.metadata}, f, ensure_ascii=False)
+        with open(os.path.join(tmp_path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"dim": self.dim, "index_params": self.index_params, "quantization": self.quantizer.to_dict()}, f)
+
+        if os.path.exists(self.path):
+            shutil.rmtree(self.path)
+        os.rename(tmp_path, self.path)
+        # Re-open memory-mapped so the in-memory copy can be dropped
+        self.vectors = np.load(os.path.join(self.path, "vectors.npy"), mmap_mode="r")
+
+    def _open(self):
+        with open(os.path.join(self.path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(os.path.join(self.path, "records.json"), encoding="utf-8") as f:
+            records = json.load(f)
+        self.dim = meta["dim"]
+        self.index_params = meta["index_params"]
+        if "quantization" in meta:
+            self.quantizer = VectorQuantizer.from_dict(meta["quantization"])
+        self.ids = np.load(os.path.join(self.path, "ids.npy"))
+        self.vectors = np.load(os.path.join(self.path, "vectors.npy"), mmap_mode="r")
+        self.texts = records["texts"]
+        self.metadata = records["metadata"]
+
+
+class LocalVectorStore:
+    """Drop-in replacement for MilvusClient that keeps vectors in local NumPy files"""
+
+    def __init__(self, path="vector_store", collection_name="energy_vectors", dim=1024, vector_dtype="float32"):
+        self.path = path
+        self.dim = dim
+        self.vector_dtype = vector_dtype
+        self.collection = None
+        self._init_collection(collection_name)
+
+    def _init_collection(self, collection_name="energy_vectors"):
+        """Open or create the collection directory"""
+        collection_path = os.path.join(self.path, collection_name)
+        exists = os.path.exists(os.path.join(collection_path, "meta.json"))
+        self.collection = LocalCollection(collection_path, self.dim, self.vector_dtype)
+        if exists:
+            return
+
+        os.makedirs(self.path, exist_ok=True)
+        self.collection.create_index(
+            field_name="embedding",
+            index_params={"metric_type": "L2", "index_type": "IVF_FLAT", "params": {"nlist": 1024}}
+        )
+
+    def insert(self, texts, embeddings, metadata_list=None):
+        """Insert documents and their embeddings"""
+        if metadata_list is None:
+            metadata_list = [{}] * len(texts)
+
+        self.collection.insert([texts, np.asarray(embeddings, dtype=np.float32), metadata_list])
+        self.collection.flush()
+
+    def search(self, query_embedding, top_k=5, nprobe=16):
+        """Search for similar vectors"""
+        search_params = {
+            "metric_type": "L2",
+            "params": {"nprobe": nprobe}
+        }
+
+        return self.collection.search(
+            data=[np.asarray(query_embedding, dtype=np.float32)],
+            anns_field="embedding",
+            param=search_params,
+            limit=top_k,
+            output_fields=["text", "metadata"]
+        )
+
+    def delete(self, ids):
+        """Delete vectors by ID"""
+        self.collection.delete(f"id in {list(ids)}")
+        self.collection.flush()
+
+    def close(self):
+        """Nothing to disconnect; data is flushed on every write"""
+        pass
@@ -1,3 +1,5 @@
+import logging
+import numpy as np
 from pymilvus import (
     connections,
     utility,
@@ -8,12 +10,23 @@ from pymilvus import (
     IndexType,
     MetricType
 )
+from .quantization import VECTOR_FIELD_TYPES, VectorQuantizer, recall_at_k
+
+logger = logging.getLogger(__name__)
 
 class MilvusClient:
-    def __init__(self, host='localhost', port='19530'):
+    def __init__(self, host='localhost', port='19530', vector_dtype='float32', scale_file=None):
+        """vector_dtype: float32, float16 or int8 storage of the embeddings;
+        scale_file keeps the int8 scale between runs and is required for int8"""
+        if vector_dtype == "int8" and not scale_file:
+            raise ValueError("int8 vector storage requires a scale_file to keep the scale between runs")
         self.host = host
         self.port = port
         self.collection = None
+        self.scale_file = scale_file
+        self.quantizer = VectorQuantizer.load(scale_file, vector_dtype)
+        # Recall of the quantized format against float32, checked on the first insert
+        self.recall = None
         self._connect()
         self._init_collection()
     
@@ -25,50 +38,91 @@ class MilvusClient:
         """Initialize collection with schema"""
         if utility.exists_collection(collection_name):
             self.collection = Collection(collection_name)
+            # Existing collections keep the storage format they were created with
+            field = next(f for f in self.collection.schema.fields if f.name == "embedding")
+            if field.dtype.name != self.quantizer.field_type:
+                dtype = next(d for d, t in VECTOR_FIELD_TYPES.items() if t == field.dtype.name)
+                if dtype == "int8" and not self.scale_file:
+                    raise ValueError(f"Collection {collection_name} stores int8 vectors, pass its scale_file")
+                self.quantizer = VectorQuantizer.load(self.scale_file, dtype) if dtype == "int8" else VectorQuantizer(dtype)
+            if not self.quantizer.fitted and self.collection.num_entities > 0:
+                # Rows quantized with a lost scale cannot be matched by a newly fitted one
+                raise ValueError(f"No int8 scale found in {self.scale_file} for the existing rows of {collection_name}")
             return
 
         fields = [
             FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=True),
             FieldSchema(name="text", dtype=DataType.VARCHAR, max_length=65535),
-            FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=1024),
+            FieldSchema(name="embedding", dtype=getattr(DataType, self.quantizer.field_type), dim=1024),
             FieldSchema(name="metadata", dtype=DataType.JSON)
         ]
         
         schema = CollectionSchema(fields=fields, description="Energy domain text embeddings")
         self.collection = Collection(name=collection_name, schema=schema)
         
-        # Create IVF_FLAT index
-        index_params = {
-            "metric_type": MetricType.L2,
-            "index_type": IndexType.IVF_FLAT,
-            "params": {"nlist": 1024}
-        }
+        # Create IVF_FLAT index (INT8_VECTOR fields only support HNSW)
+        if self.quantizer.dtype == "int8":
+            index_params = {
+                "metric_type": MetricType.L2,
+                "index_type": "HNSW",
+                "params": {"M": 16, "efConstruction": 200}
+            }
+        else:
+            index_params = {
+                "metric_type": MetricType.L2,
+                "index_type": IndexType.IVF_FLAT,
+                "params": {"nlist": 1024}
+            }
         self.collection.create_index(field_name="embedding", index_params=index_params)
     
     def insert(self, texts, embeddings, metadata_list=None):
         """Insert documents and their embeddings"""
         if metadata_list is None:
             metadata_list = [{}] * len(texts)
+
+        if self.quantizer.dtype == "float32":
+            vectors = embeddings.tolist()
+        else:
+            embeddings = np.asarray(embeddings.tolist(), dtype=np.float32)
+            if self.recall is None:
+                self._calibrate(embeddings)
+            vectors = list(self.quantizer.quantize(embeddings))
             
         entities = [
             texts,
-            embeddings.tolist(),
+            vectors,
             metadata_list
         ]
         
         self.collection.insert(entities)
         self.collection.flush()
     
+    def _calibrate(self, embeddings):
+        """Fit the int8 scale on the first batch and log recall@10 against float32"""
+        if not self.quantizer.fitted:
+            # L2 on int8 codes only ranks like float32 with one scale for all dimensions
+            self.quantizer.fit(embeddings, per_dimension=False)
+            if self.scale_file:
+                self.quantizer.save(self.scale_file)
+        self.recall = recall_at_k(embeddings, self.quantizer)
+        logger.info(f"{self.quantizer.dtype} recall@10 vs float32: {self.recall:.3f}")
+
     def search(self, query_embedding, top_k=5, nprobe=16):
         """Search for similar vectors"""
         search_params = {
             "metric_type": MetricType.L2,
             "params": {"nprobe": nprobe}
         }
+        query = query_embedding.tolist()
+        if self.quantizer.dtype != "float32":
+            query = self.quantizer.quantize(np.asarray([query], dtype=np.float32))[0]
+        if self.quantizer.dtype == "int8":
+            # HNSW search width instead of IVF probes
+            search_params["params"] = {"ef": max(top_k, nprobe * 4)}
         
         self.collection.load()
         results = self.collection.search(
-            data=[query_embedding.tolist()],
+            data=[query],
             anns_field="embedding",
             param=search_params,
             limit=top_k,
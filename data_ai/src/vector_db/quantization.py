@@ -0,0 +1,121 @@
+import json
+import os
+import numpy as np
+
+# Milvus vector field type per storage format
+VECTOR_FIELD_TYPES = {
+    "float32": "FLOAT_VECTOR",
+    "float16": "FLOAT16_VECTOR",
+    "int8": "INT8_VECTOR"
+}
+
+_DTYPES = {
+    "float32": np.float32,
+    "float16": np.float16,
+    "int8": np.int8
+}
+
+
+class VectorQuantizer:
+    """Converts float32 embeddings to a compact storage format and back
+
+    float16 halves the vector memory. int8 quarters it and stores a scale per
+    dimension (code = value / scale, rounded to -127..127) that is fitted on
+    the first inserted batch and kept afterwards.
+    """
+
+    def __init__(self, dtype="float32", scale=None):
+        if dtype not in _DTYPES:
+            raise ValueError(f"Unsupported vector dtype {dtype!r}, expected one of {', '.join(_DTYPES)}")
+        self.dtype = dtype
+        self.scale = None if scale is None else np.asarray(scale, dtype=np.float32)
+
+    @property
+    def field_type(self):
+        return VECTOR_FIELD_TYPES[self.dtype]
+
+    @property
+    def numpy_dtype(self):
+        return _DTYPES[self.dtype]
+
+    @property
+    def fitted(self):
+        return self.dtype != "int8" or self.scale is not None
+
+    def fit(self, vectors, per_dimension=True):
+        """Fit the int8 scale to the largest magnitude of each dimension
+
+        With per_dimension=False all dimensions share one scale, which keeps
+        L2 distances between codes proportional to the float32 distances.
+        """
+        if self.dtype != "int8":
+            return
+        magnitudes = np.abs(np.asarray(vectors, dtype=np.float32)).max(axis=0)
+        if not per_dimension:
+            magnitudes = np.full_like(magnitudes, magnitudes.max())
+        self.scale = np.where(magnitudes > 0, magnitudes / 127.0, 1.0 / 127.0).astype(np.float32)
+
+    def quantize(self, vectors):
+        """Convert float32 vectors to the storage format (int8 values outside the scale are clipped)
+
+        int8 requires a fitted or loaded scale: codes of vectors quantized
+        with different scales are not comparable.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.dtype == "int8":
+            if self.scale is None:
+                raise RuntimeError("int8 quantizer has no scale, call fit() or load a saved scale first")
+            return np.clip(np.rint(vectors / self.scale), -127, 127).astype(np.int8)
+        return vectors.astype(self.numpy_dtype, copy=False)
+
+    def dequantize(self, codes):
+        """Convert stored codes back to float32 vectors"""
+        vectors = np.asarray(codes).astype(np.float32, copy=False)
+        if self.dtype == "int8":
+            return vectors * self.scale
+        return vectors
+
+    def to_dict(self):
+        return {"dtype": self.dtype, "scale": None if self.scale is None else self.scale.tolist()}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["dtype"], data.get("scale"))
+
+    def save(self, path):
+        """Write dtype and scale to a JSON file"""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, dtype="float32"):
+        """Read a saved quantizer, or create an unfitted one if the file does not exist"""
+        if path is None or not os.path.exists(path):
+            return cls(dtype)
+        with open(path, encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+
+def recall_at_k(vectors, quantizer, k=10, sample_size=200, seed=0):
+    """Fraction of the float32 L2 top-k neighbours that are also found on the quantized vectors
+
+    Queries are sampled from the vectors themselves; distances on the
+    quantized side are computed between dequantized vectors.
+    """
+    rng = np.random.default_rng(seed)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    k = min(k, len(vectors))
+    if k == 0:
+        return 1.0
+    queries = vectors[rng.choice(len(vectors), min(sample_size, len(vectors)), replace=False)]
+
+    def top_k(base):
+        scores = 2.0 * queries @ base.T - (base * base).sum(axis=1)
+        return np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+    exact = top_k(vectors)
+    approx = top_k(quantizer.dequantize(quantizer.quantize(vectors)))
+    found = sum(len(np.intersect1d(e, a)) for e, a in zip(exact, approx))
+    return found / (len(queries) * k)
@@ -0,0 +1,88 @@
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from src.vector_db.local_store import LocalVectorStore
+
+class TestLocalStore(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.client = LocalVectorStore(path=self.path)
+        self.test_texts = [
+            "Test document 1",
+            "Test document 2",
+            "Test document 3"
+        ]
+        self.test_embeddings = np.random.randn(3, 1024).astype(np.float32)
+        self.test_metadata = [
+            {'source': 'test1'},
+            {'source': 'test2'},
+            {'source': 'test3'}
+        ]
+        self.client.insert(
+            texts=self.test_texts,
+            embeddings=self.test_embeddings,
+            metadata_list=self.test_metadata
+        )
+
+    def test_insert(self):
+        """Test vector insertion"""
+        self.assertEqual(self.client.collection.num_entities, 3)
+
+    def test_search(self):
+        """Test that the nearest document comes first"""
+        results = self.client.search(self.test_embeddings[0], top_k=2)
+
+        self.assertEqual(len(results), 1)  # One query
+        self.assertEqual(len(results[0]), 2)  # top_k=2
+        self.assertEqual(results[0][0].entity.get('text'), "Test document 1")
+        self.assertAlmostEqual(results[0][0].distance, 0.0, places=3)
+
+    def test_delete(self):
+        """Test vector deletion"""
+        self.client.delete([1])
+
+        self.assertEqual(self.client.collection.num_entities, 2)
+        results = self.client.search(self.test_embeddings[0], top_k=3)
+        self.assertNotIn(1, [hit.id for hit in results[0]])
+
+    def test_persistence(self):
+        """Test that a new client reopens the stored collection"""
+        reopened = LocalVectorStore(path=self.path)
+
+        self.assertEqual(reopened.collection.num_entities, 3)
+        results = reopened.search(self.test_embeddings[2], top_k=1)
+        self.assertEqual(results[0][0].entity.get('metadata'), {'source': 'test3'})
+
+    def test_ivf_search(self):
+        """Test that IVF search finds the query's own vector"""
+        centers = np.random.randn(32, 1024).astype(np.float32) * 10
+        embeddings = centers[np.arange(4096) % 32] + np.random.randn(4096, 1024).astype(np.float32)
+        self.client.collection.create_index(
+            field_name="embedding",
+            index_params={"metric_type": "L2", "index_type": "IVF_FLAT", "params": {"nlist": 32}}
+        )
+        self.client.insert(texts=[str(i) for i in range(4096)], embeddings=embeddings)
+
+        results = self.client.search(embeddings[100], top_k=1, nprobe=4)
+        self.assertIsNotNone(self.client.collection.centroids)
+        self.assertEqual(results[0][0].entity.get('text'), "100")
+
+    def test_int8_storage(self):
+        """Test int8 storage with persisted scale"""
+        client = LocalVectorStore(path=self.path, collection_name="int8_vectors", vector_dtype="int8")
+        client.insert(texts=self.test_texts, embeddings=self.test_embeddings, metadata_list=self.test_metadata)
+        reopened = LocalVectorStore(path=self.path, collection_name="int8_vectors")
+
+        self.assertEqual(reopened.collection.vectors.dtype, np.int8)
+        self.assertEqual(reopened.collection.quantizer.dtype, "int8")
+        results = reopened.search(self.test_embeddings[1], top_k=1)
+        self.assertEqual(results[0][0].entity.get('text'), "Test document 2")
+
+    def tearDown(self):
+        """Clean up after tests"""
+        self.client.close()
+        shutil.rmtree(self.path)
+
+if __name__ == '__main__':
+    unittest.main()
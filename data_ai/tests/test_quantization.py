@@ -0,0 +1,52 @@
+import unittest
+import numpy as np
+from src.vector_db.quantization import VectorQuantizer, recall_at_k
+
+class TestQuantization(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        centers = rng.standard_normal((20, 1024)).astype(np.float32)
+        self.embeddings = centers[np.arange(2000) % 20] + 0.5 * rng.standard_normal((2000, 1024)).astype(np.float32)
+
+    def test_float16(self):
+        """Test float16 storage halves the size"""
+        quantizer = VectorQuantizer("float16")
+        codes = quantizer.quantize(self.embeddings)
+
+        self.assertEqual(codes.nbytes, self.embeddings.nbytes // 2)
+        np.testing.assert_allclose(quantizer.dequantize(codes), self.embeddings, atol=1e-2)
+
+    def test_int8(self):
+        """Test int8 storage quarters the size with a per-dimension scale"""
+        quantizer = VectorQuantizer("int8")
+        quantizer.fit(self.embeddings)
+        codes = quantizer.quantize(self.embeddings)
+
+        self.assertEqual(codes.dtype, np.int8)
+        self.assertEqual(codes.nbytes, self.embeddings.nbytes // 4)
+        self.assertEqual(quantizer.scale.shape, (1024,))
+        error = np.abs(quantizer.dequantize(codes) - self.embeddings).max(axis=0)
+        self.assertTrue(np.all(error <= quantizer.scale / 2 + 1e-6))
+
+    def test_recall(self):
+        """Test recall against float32 for both formats"""
+        for dtype in ("float16", "int8"):
+            quantizer = VectorQuantizer(dtype)
+            quantizer.fit(self.embeddings)
+            self.assertGreaterEqual(recall_at_k(self.embeddings, quantizer), 0.9)
+
+    def test_round_trip(self):
+        """Test that the scale survives serialization"""
+        quantizer = VectorQuantizer("int8")
+        quantizer.fit(self.embeddings)
+        restored = VectorQuantizer.from_dict(quantizer.to_dict())
+
+        np.testing.assert_array_equal(restored.quantize(self.embeddings), quantizer.quantize(self.embeddings))
+
+    def test_unfitted_int8(self):
+        """Test that int8 refuses to quantize without a scale"""
+        with self.assertRaises(RuntimeError):
+            VectorQuantizer("int8").quantize(self.embeddings[:1])
+
+if __name__ == '__main__':
+    unittest.main()
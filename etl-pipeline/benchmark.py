@@ -0,0 +1,289 @@
+import argparse
+import hashlib
+import json
+import multiprocessing
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from loguru import logger
+from config import BENCHMARK_CONFIG, COLLECTION_CONFIGS, ETL_CONFIG, INDEX_CONFIG, VECTOR_DIM
+from collection_schema import default_schema
+from local_store import LocalVectorStore
+from mastr_generator import COLLECTION_TEMPLATES, generate_dataset, parse_count
+from metrics import peak_rss_bytes
+from record_batch import RecordBatch
+from xml_processor import XMLProcessor
+
+# Gemessene Stufen in Pipeline-Reihenfolge
+STAGES = ["parse", "convert", "embed", "insert"]
+
+class StubEmbeddingModel:
+    def __init__(self, dim: int = VECTOR_DIM, table_size: int = 4096, seed: int = 0):
+        """Deterministischer Ersatz für SentenceTransformer, um Embedding-Kosten aus dem Benchmark herauszuhalten.
+
+        Jeder Text wird gehasht; der Vektor ist die Summe dreier Zeilen einer
+        festen Zufallstabelle. Gleiche Texte ergeben gleiche Vektoren.
+        """
+        self.dim = dim
+        self._table = np.random.default_rng(seed).standard_normal((table_size, dim)).astype(np.float32)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def encode(self, texts: List[str], batch_size: int = 32, convert_to_numpy: bool = True,
+               show_progress_bar: bool = False) -> np.ndarray:
+        hashes = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little") for text in texts),
+            dtype=np.uint64, count=len(texts)
+        )
+        size = np.uint64(len(self._table))
+        rows = [(hashes >> np.uint64(shift)) % size for shift in (0, 21, 42)]
+        return self._table[rows[0]] + self._table[rows[1]] + self._table[rows[2]]
+
+class _Timer:
+    """Summiert die in einer Stufe verbrachte Zeit."""
+    def __init__(self) -> None:
+        self.seconds = 0.0
+
+def peak_rss_mb() -> Optional[float]:
+    """Höchster Speicherbedarf (RSS) des aktuellen Prozesses in MB, None wenn nicht messbar."""
+    peak = peak_rss_bytes()
+    return round(peak / (1 << 20), 1) if peak is not None else None
+
+def _converted_batches(jobs: List[Tuple[str, Path]], schema_dir: Path, batch_size: int,
+                       timers: Dict[str, _Timer]) -> Iterator[Tuple[str, RecordBatch]]:
+    """Parst und typisiert die Dateien über iter_record_batches wie die Worker der Pipeline (XSDs aus schema_dir).
+
+    Parsen und Typisierung werden über die in jedem Block mitgelieferten
+    stage_seconds getrennt gemessen.
+    """
+    processor = XMLProcessor(None)
+    for collection_name, xml_file in jobs:
+        config = COLLECTION_CONFIGS[collection_name]
+        batches = processor.iter_record_batches(
+            str(xml_file),
+            batch_size,
+            source_file=xml_file.name,
+            key_field=config.get("key_field"),
+            update_field=ETL_CONFIG["update_field"],
+            schema_file=str(schema_dir / config["schema_file"])
+        )
+        for batch in batches:
+            for stage, seconds in batch.stage_seconds.items():
+                timers[stage].seconds += seconds
+            yield collection_name, batch
+
+def _embedded_batches(jobs: List[Tuple[str, Path]], schema_dir: Path, batch_size: int, embedding_model,
+                      timers: Dict[str, _Timer]) -> Iterator[Tuple[str, RecordBatch]]:
+    """Bettet die typisierten Blöcke wie die Embedding-Stufe der Pipeline ein (ohne Embedding-Cache)."""
+    processor = XMLProcessor(embedding_model, batch_size=ETL_CONFIG["embedding_batch_size"],
+                             normalize=INDEX_CONFIG["normalize"])
+    for collection_name, batch in _converted_batches(jobs, schema_dir, batch_size, timers):
+        started = time.perf_counter()
+        processor.embed_batch(batch)
+        timers["embed"].seconds += time.perf_counter() - started
+        yield collection_name, batch
+
+def _load_model(model_name: str, dim: int):
+    """Liefert das Stub-Modell oder lädt ein SentenceTransformer-Modell."""
+    if model_name == "stub":
+        return StubEmbeddingModel(dim)
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name)
+
+def run_stage(stage: str, jobs: List[Tuple[str, Path]], schema_dir: Path, batch_size: int = 5000,
+              model_name: str = "stub", dim: int = VECTOR_DIM, expected_rows: int = 0) -> Dict[str, Any]:
+    """Misst eine Stufe; die vorgelagerten Stufen laufen mit, zählen aber nicht zur Zeit der Stufe.
+
+    Läuft in einem eigenen Prozess, damit der höchste Speicherbedarf je Stufe
+    getrennt gemessen wird. Der Insert schreibt in einen lokalen Vektorspeicher
+    in einem temporären Verzeichnis; seine Vektoren kommen immer vom Stub-Modell.
+    """
+    # Fortschrittsmeldungen der Module würden die Messung verfälschen
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    baseline = peak_rss_mb()
+    timers = {name: _Timer() for name in STAGES}
+    records = 0
+
+    if stage in ("parse", "convert"):
+        for _, batch in _converted_batches(jobs, schema_dir, batch_size, timers):
+            records += len(batch)
+    elif stage == "embed":
+        embedding_model = _load_model(model_name, dim)
+        for _, batch in _embedded_batches(jobs, schema_dir, batch_size, embedding_model, timers):
+            records += len(batch)
+    elif stage == "insert":
+        with tempfile.TemporaryDirectory(prefix="etl-benchmark-") as store_dir:
+            store = LocalVectorStore(Path(store_dir))
+            for collection_name in sorted({collection_name for collection_name, _ in jobs}):
+                store.create_collection(collection_name, default_schema(collection_name, schema_dir),
+                                        expected_rows=expected_rows)
+            embedding_model = StubEmbeddingModel(dim)
+            for collection_name, batch in _embedded_batches(jobs, schema_dir, batch_size, embedding_model, timers):
+                started = time.perf_counter()
+                store.insert_data(collection_name, batch)
+                timers["insert"].seconds += time.perf_counter() - started
+                records += len(batch)
+            started = time.perf_counter()
+            store.flush()
+            timers["insert"].seconds += time.perf_counter() - started
+            store.close()
+    else:
+        raise ValueError(f"Unbekannte Stufe: {stage}")
+
+    seconds = timers[stage].seconds
+    return {
+        "records": records,
+        "seconds": round(seconds, 4),
+        "records_per_second": round(records / seconds, 1) if seconds > 0 else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "baseline_rss_mb": baseline
+    }
+
+def git_revision() -> Dict[str, Any]:
+    """Commit und Änderungsstatus des Arbeitsverzeichnisses (None außerhalb eines Git-Repositorys)."""
+    cwd = Path(__file__).parent
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=cwd, capture_output=True, text=True, check=True)
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=cwd,
+                                capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+    return {"commit": commit.stdout.strip(), "dirty": bool(status.stdout.strip())}
+
+def prepare_dataset(records: int, collections: List[str], records_per_file: int, seed: int, encoding: str) -> Path:
+    """Erzeugt den synthetischen Datensatz, sofern er nicht schon vollständig vorliegt."""
+    dataset_dir = Path(BENCHMARK_CONFIG["data_dir"]) / f"{records}-seed{seed}-{encoding}"
+    dataset_file = dataset_dir / "dataset.json"
+    if dataset_file.exists():
+        dataset = json.loads(dataset_file.read_text(encoding="utf-8"))
+        if dataset["records_per_file"] == records_per_file and set(collections) <= set(dataset["files"]):
+            logger.info(f"Verwende vorhandene Testdaten in {dataset_dir}")
+            return dataset_dir
+        # Bereits erzeugte Collections bleiben Teil des Datensatzes
+        collections = sorted(set(collections) | set(dataset["files"]))
+    logger.info(f"Erzeuge {records} Datensätze je Collection in {dataset_dir}")
+    generate_dataset(dataset_dir, records, collections, records_per_file, seed, encoding)
+    return dataset_dir
+
+def run_benchmark(dataset_dir: Path, collections: Optional[List[str]] = None, stages: Optional[List[str]] = None,
+                  model_name: str = "stub", batch_size: int = 5000, dim: int = VECTOR_DIM) -> Dict[str, Any]:
+    """Misst alle Stufen nacheinander, jede in einem neuen Prozess, und liefert das Ergebnis als Dict."""
+    dataset_dir = Path(dataset_dir)
+    dataset = json.loads((dataset_dir / "dataset.json").read_text(encoding="utf-8"))
+    collections = collections or sorted(dataset["files"])
+    jobs = [(name, dataset_dir / file) for name in collections for file in dataset["files"][name]]
+    schema_dir = dataset_dir / dataset["schema_dir"]
+    input_bytes = sum(xml_file.stat().st_size for _, xml_file in jobs)
+
+    results: Dict[str, Any] = {}
+    context = multiprocessing.get_context("spawn")
+    for stage in stages or STAGES:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            result = executor.submit(
+                run_stage, stage, jobs, schema_dir, batch_size, model_name, dim, dataset["records"]
+            ).result()
+        results[stage] = result
+        logger.info(
+            f"{stage}: {result['records']} Datensätze in {result['seconds']:.2f} s "
+            f"({result['records_per_second'] or 0:,.0f}/s), Speicher max. {result['peak_rss_mb'] or 0:.0f} MB"
+        )
+
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        **git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": multiprocessing.cpu_count(),
+        "params": {
+            "records": dataset["records"],
+            "collections": collections,
+            "files": len(jobs),
+            "input_mb": round(input_bytes / (1 << 20), 1),
+            "encoding": dataset["encoding"],
+            "seed": dataset["seed"],
+            "model": model_name,
+            "batch_size": batch_size,
+            "dim": dim
+        },
+        "stages": results
+    }
+
+def compare_results(previous: Dict[str, Any], current: Dict[str, Any], tolerance: float = 0.1) -> List[str]:
+    """Vergleicht zwei Läufe je Stufe und liefert die Stufen, deren Durchsatz oder Speicherbedarf sich verschlechtert hat."""
+    if previous.get("params") != current.get("params"):
+        logger.warning("Die Läufe wurden mit unterschiedlichen Parametern gemessen")
+    regressions = []
+    for stage, result in current["stages"].items():
+        before = previous.get("stages", {}).get(stage)
+        if not before or not before.get("records_per_second") or not result.get("records_per_second"):
+            continue
+        speed = result["records_per_second"] / before["records_per_second"] - 1
+        message = (f"{stage}: {before['records_per_second']:,.0f}/s -> {result['records_per_second']:,.0f}/s ({speed:+.1%})")
+        slower = speed < -tolerance
+        if before.get("peak_rss_mb") and result.get("peak_rss_mb"):
+            memory = result["peak_rss_mb"] / before["peak_rss_mb"] - 1
+            message += f", Speicher {before['peak_rss_mb']:.0f} -> {result['peak_rss_mb']:.0f} MB ({memory:+.1%})"
+            slower = slower or memory > tolerance
+        if slower:
+            logger.warning(f"Verschlechterung gegenüber {previous.get('commit') or 'dem Vergleichslauf'}: {message}")
+            regressions.append(stage)
+        else:
+            logger.info(message)
+    return regressions
+
+def save_result(result: Dict[str, Any], output: Optional[Path] = None) -> Path:
+    """Speichert das Ergebnis als JSON, standardmäßig unter <Zeitpunkt>_<Commit>.json im Ergebnisverzeichnis."""
+    if output is None:
+        stamp = datetime.fromisoformat(result["timestamp"]).strftime("%Y%m%d-%H%M%S")
+        output = Path(BENCHMARK_CONFIG["results_dir"]) / f"{stamp}_{(result['commit'] or 'nogit')[:10]}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2), encoding="utf-8")
+    return output
+
+def parse_args() -> argparse.Namespace:
+    """Liest die Kommandozeilenargumente."""
+    parser = argparse.ArgumentParser(description="Durchsatz-Benchmark der ETL-Stufen auf synthetischen MaStR-Daten")
+    parser.add_argument("--records", type=parse_count, default=10_000, help="Datensätze je Collection, z.B. 10k oder 10M")
+    parser.add_argument(
+        "--collections", nargs="+", choices=sorted(COLLECTION_TEMPLATES), default=None,
+        help="Gemessene Collections (Standard: alle)"
+    )
+    parser.add_argument("--records-per-file", type=parse_count, default=100_000, help="Datensätze je XML-Datei")
+    parser.add_argument("--seed", type=int, default=0, help="Startwert des Testdaten-Generators")
+    parser.add_argument("--encoding", default="utf-16", choices=["utf-16", "utf-8"], help="Zeichenkodierung der XML-Dateien")
+    parser.add_argument("--data-dir", type=Path, default=None, help="Vorhandenen Datensatz von mastr_generator.py verwenden")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES, help="Gemessene Stufen")
+    parser.add_argument(
+        "--model", default="stub",
+        help="Embedding-Modell: stub (deterministische Hash-Vektoren) oder ein SentenceTransformer-Modellname"
+    )
+    parser.add_argument("--batch-size", type=int, default=ETL_CONFIG["insert_batch_size"], help="Datensätze je Block")
+    parser.add_argument("--dim", type=int, default=VECTOR_DIM, help="Dimension der Stub-Vektoren")
+    parser.add_argument("--output", type=Path, default=None, help="Ergebnisdatei (Standard: state/benchmark/results/)")
+    parser.add_argument("--compare", type=Path, default=None, help="Früheres Ergebnis, mit dem verglichen wird")
+    parser.add_argument(
+        "--tolerance", type=float, default=BENCHMARK_CONFIG["tolerance"],
+        help="Erlaubte Verschlechterung beim Vergleich (0.1 = 10 %%)"
+    )
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    collections = args.collections or sorted(COLLECTION_TEMPLATES)
+    dataset_dir = args.data_dir or prepare_dataset(args.records, collections, args.records_per_file, args.seed, args.encoding)
+    result = run_benchmark(dataset_dir, args.collections, args.stages, args.model, args.batch_size, args.dim)
+    logger.success(f"Ergebnis gespeichert in {save_result(result, args.output)}")
+    if args.compare is not None:
+        previous = json.loads(args.compare.read_text(encoding="utf-8"))
+        # Verschlechterungen führen zu einem Exit-Code ungleich 0, z.B. für CI
+        if compare_results(previous, result, args.tolerance):
+            sys.exit(1)
@@ -0,0 +1,220 @@
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, IO, List, Optional, Set
+from loguru import logger
+from manifest import source_key
+from sources import source_stat
+from parallel_parser import ParseJob
+
+class CheckpointStore:
+    def __init__(self, checkpoint_file: Path, data_dir: Optional[Path] = None, fsync: bool = True):
+        """Dauerhafter Fortschritt eines Laufs je Quelldatei, um nach einem Absturz fortzusetzen.
+
+        Der Checkpoint ist ein Journal (eine JSON-Zeile je Eintrag), an das nur
+        angehängt wird; so kostet ein Checkpoint ein paar hundert Bytes und ein
+        fsync. Je Datei steht darin die Anzahl der Datensatz-Elemente (offset),
+        deren Datensätze eingebettet und vom Vektorspeicher bestätigt wurden,
+        sowie Anzahl, neuester Änderungszeitpunkt und Fingerprint (Größe,
+        Änderungszeit). Eine beim Absturz abgeschnittene letzte Zeile wird ignoriert.
+        """
+        self.checkpoint_file = Path(checkpoint_file)
+        self.data_dir = data_dir
+        self.fsync = fsync
+        # Modus und Startzeit des Laufs, zu dem der Checkpoint gehört (None: kein unterbrochener Lauf)
+        self.run: Optional[Dict[str, Any]] = None
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self._pending: List[Dict[str, Any]] = []
+        self._fingerprints: Dict[str, Dict[str, int]] = {}
+        # True, wenn dieser Lauf einen unterbrochenen Lauf fortsetzt
+        self._resuming = False
+        # Nicht abgeschlossene Dateien des unterbrochenen Laufs, die in diesem Lauf fortgesetzt werden
+        self._resumed: Set[str] = set()
+        self._journal: Optional[IO[str]] = None
+        self._lock = threading.Lock()
+        if self.checkpoint_file.exists():
+            self._load()
+
+    def _load(self) -> None:
+        """Spielt das Journal ab."""
+        try:
+            with open(self.checkpoint_file, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Beim Absturz nur teilweise geschriebene Zeile
+                        break
+                    if "run" in entry:
+                        self.run = entry["run"]
+                        self.files = {}
+                        continue
+                    self.files.setdefault(entry.pop("file"), {}).update(entry)
+        except OSError as e:
+            logger.warning(f"Checkpoint {self.checkpoint_file} konnte nicht gelesen werden: {str(e)}")
+            self.run, self.files = None, {}
+            return
+        if self.run is not None:
+            done = sum(1 for entry in self.files.values() if entry.get("done"))
+            records = sum(entry.get("records", 0) for entry in self.files.values())
+            logger.info(f"Checkpoint eines unterbrochenen Laufs ({self.run.get('mode')}, gestartet "
+                        f"{self.run.get('started')}) gefunden: {done} Dateien fertig, {records} Datensätze gespeichert")
+
+    def key(self, job: ParseJob) -> str:
+        return source_key(job[1], self.data_dir)
+
+    def can_resume(self, mode: str) -> bool:
+        """True, wenn ein unterbrochener Lauf desselben Modus fortgesetzt werden kann."""
+        return self.run is not None and self.run.get("mode") == mode
+
+    def start(self, mode: str) -> None:
+        """Beginnt einen neuen Lauf; ein vorhandener Checkpoint wird verworfen."""
+        with self._lock:
+            self.run = {"mode": mode, "started": datetime.now().isoformat(timespec="seconds")}
+            self.files = {}
+            self._pending = []
+            self._resuming = False
+            self._rewrite()
+
+    def resume(self) -> None:
+        """Setzt den unterbrochenen Lauf fort; das Journal wird dabei auf eine Zeile je Datei verdichtet."""
+        with self._lock:
+            self._resuming = True
+            self._rewrite()
+
+    def _rewrite(self) -> None:
+        """Schreibt den aktuellen Stand atomar als neues Journal und öffnet es zum Anhängen."""
+        self._close_journal()
+        self.checkpoint_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.checkpoint_file.with_suffix(".tmp")
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"run": self.run}) + "\n")
+            for key, entry in self.files.items():
+                f.write(json.dumps({"file": key, **entry}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.checkpoint_file)
+        self._journal = open(self.checkpoint_file, "a", encoding="utf-8")
+
+    def stale_jobs(self, jobs: List[ParseJob]) -> List[ParseJob]:
+        """Aufträge mit Fortschritt im Checkpoint, deren Datei sich seitdem geändert hat."""
+        stale = []
+        for job in jobs:
+            entry = self.files.get(self.key(job))
+            if not entry or "size" not in entry:
+                continue
+            if self._fingerprint(job) != {"size": entry["size"], "mtime": entry["mtime"]}:
+                stale.append(job)
+        return stale
+
+    def reset(self, job: ParseJob) -> None:
+        """Setzt den Fortschritt einer Datei zurück (z.B. weil sie sich geändert hat)."""
+        self._append({"file": self.key(job), "offset": 0, "records": 0, "max_update": "", "done": False})
+
+    def begin(self, jobs: List[ParseJob]) -> Dict[Path, int]:
+        """Liefert die Offsets, ab denen die Dateien der Aufträge gelesen werden (nur Dateien mit Fortschritt).
+
+        Bei einer Fortsetzung gelten alle nicht abgeschlossenen Dateien als
+        fortgesetzt, auch ohne gespeicherten Offset: Ihre Blöcke können vor dem
+        Abbruch schon gespeichert, aber noch nicht im Checkpoint vermerkt worden sein.
+        """
+        offsets = {job[1]: self.offset(job) for job in jobs if self.offset(job) and not self.completed(job)}
+        self._resumed = {self.key(job) for job in jobs if not self.completed(job)} if self._resuming else set()
+        for job in jobs:
+            if job[1] in offsets:
+                logger.info(f"{job[1].name} wird ab Element {offsets[job[1]]} fortgesetzt "
+                            f"({self.records(job)} Datensätze bereits gespeichert)")
+        return offsets
+
+    def resumed(self, job: ParseJob) -> bool:
+        """True, wenn die Datei zu einem fortgesetzten Lauf gehört; ihre Datensätze werden dann per Upsert gespeichert."""
+        return self.key(job) in self._resumed
+
+    def has_progress(self, key: str) -> bool:
+        """True, wenn aus der Quelldatei in diesem Lauf bereits Datensätze gespeichert wurden."""
+        entry = self.files.get(key)
+        return bool(entry and (entry.get("offset") or entry.get("done")))
+
+    def completed(self, job: ParseJob) -> bool:
+        return bool(self.files.get(self.key(job), {}).get("done"))
+
+    def offset(self, job: ParseJob) -> int:
+        """Anzahl der Datensatz-Elemente am Anfang der Datei, die bereits gespeichert sind."""
+        return self.files.get(self.key(job), {}).get("offset", 0)
+
+    def records(self, job: ParseJob) -> int:
+        return self.files.get(self.key(job), {}).get("records", 0)
+
+    def max_updates(self) -> Dict[str, str]:
+        """Neuester gespeicherter Änderungszeitpunkt je Collection über alle Dateien des Checkpoints."""
+        latest: Dict[str, str] = {}
+        for entry in self.files.values():
+            collection_name, max_update = entry.get("collection"), entry.get("max_update") or ""
+            if collection_name and max_update > latest.get(collection_name, ""):
+                latest[collection_name] = max_update
+        return latest
+
+    def _fingerprint(self, job: ParseJob) -> Dict[str, int]:
+        key = self.key(job)
+        if key not in self._fingerprints:
+            self._fingerprints[key] = source_stat(job[1])
+        return self._fingerprints[key]
+
+    def advance(self, job: ParseJob, offset: int, records: int, max_update: str = "") -> None:
+        """Vermerkt bestätigte Datensätze einer Datei bis einschließlich Element offset - 1 (wirksam mit commit)."""
+        entry = self.files.get(self.key(job), {})
+        self._append({
+            "file": self.key(job),
+            "collection": job[0],
+            "offset": offset,
+            "records": entry.get("records", 0) + records,
+            "max_update": max(entry.get("max_update") or "", max_update or ""),
+            **self._fingerprint(job)
+        })
+
+    def complete(self, job: ParseJob) -> None:
+        """Vermerkt eine vollständig gespeicherte Datei (wirksam mit commit)."""
+        self._append({"file": self.key(job), "collection": job[0], "done": True})
+
+    def _append(self, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self.files.setdefault(entry["file"], {}).update({name: value for name, value in entry.items() if name != "file"})
+            self._pending.append(entry)
+
+    def commit(self) -> None:
+        """Hängt die vermerkten Einträge an das Journal an und schreibt sie dauerhaft auf die Platte."""
+        with self._lock:
+            if not self._pending or self._journal is None:
+                return
+            self._journal.write("".join(json.dumps(entry) + "\n" for entry in self._pending))
+            self._journal.flush()
+            if self.fsync:
+                os.fsync(self._journal.fileno())
+            self._pending = []
+
+    def discard(self) -> None:
+        """Verwirft den Checkpoint (z.B. vor einem Neustart ohne Fortsetzung)."""
+        with self._lock:
+            self._close_journal()
+            self.checkpoint_file.unlink(missing_ok=True)
+            self.run, self.files, self._pending = None, {}, []
+            self._resuming = False
+            self._resumed = set()
+
+    def finish(self) -> None:
+        """Beendet den Lauf erfolgreich und entfernt den Checkpoint."""
+        self.discard()
+        logger.info("Lauf abgeschlossen, Checkpoint entfernt")
+
+    def _close_journal(self) -> None:
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def close(self) -> None:
+        """Schreibt offene Einträge und schließt das Journal; der Checkpoint bleibt für die Fortsetzung erhalten."""
+        self.commit()
+        with self._lock:
+            self._close_journal()
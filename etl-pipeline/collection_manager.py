@@ -0,0 +1,198 @@
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+from pymilvus import Collection, DataType, utility
+from pymilvus.client.types import LoadState
+from loguru import logger
+from metrics import milvus_call
+
+# Geschätzter Speicherbedarf je Feldwert in Bytes (Vektoren werden aus der Dimension berechnet)
+_FIELD_BYTES = {
+    DataType.INT64: 8,
+    DataType.DOUBLE: 8,
+    DataType.FLOAT: 4,
+    DataType.BOOL: 1,
+    DataType.VARCHAR: 64,
+    DataType.JSON: 256
+}
+
+# Bytes je Vektorkomponente der (quantisierten) Vektorfelder
+_VECTOR_COMPONENT_BYTES = {
+    DataType.FLOAT_VECTOR: 4,
+    DataType.FLOAT16_VECTOR: 2,
+    DataType.INT8_VECTOR: 1
+}
+
+class _LoadedCollection:
+    def __init__(self, collection: Collection, size_bytes: int):
+        self.collection = collection
+        # Geschätzter Speicherbedarf der geladenen Collection
+        self.size_bytes = size_bytes
+        # Laufende Abfragen; solange > 0 wird die Collection nicht freigegeben
+        self.in_use = 0
+
+class CollectionManager:
+    def __init__(self, memory_budget: int = 4 << 30):
+        """Hält Collection-Handles und geladene Collections für die Lebensdauer des Prozesses.
+
+        Geladene Collections bleiben geladen, bis das Speicherbudget überschritten
+        wird; dann werden die am längsten ungenutzten, gerade nicht abgefragten
+        Collections freigegeben.
+        """
+        self.memory_budget = memory_budget
+        self._handles: Dict[str, Collection] = {}
+        # Geladene Collections in LRU-Reihenfolge (zuletzt genutzte am Ende)
+        self._loaded: "OrderedDict[str, _LoadedCollection]" = OrderedDict()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        # Signalisiert das Ende einer Abfrage (für exclusive)
+        self._idle = threading.Condition(self._lock)
+        self.loads = 0
+        self.releases = 0
+
+    def get(self, collection_name: str) -> Optional[Collection]:
+        """Liefert das gecachte Handle einer Collection (None, wenn sie nicht existiert)."""
+        with self._lock:
+            collection = self._handles.get(collection_name)
+            if collection is None and utility.has_collection(collection_name):
+                collection = self._handles[collection_name] = Collection(collection_name)
+            return collection
+
+    @contextmanager
+    def loaded(self, collection_name: str) -> Iterator[Optional[Collection]]:
+        """Stellt eine geladene Collection für eine Abfrage bereit (None, wenn sie nicht existiert).
+
+        Nur der erste Zugriff lädt die Collection; während der Abfrage kann sie
+        nicht von einer anderen Abfrage freigegeben werden.
+        """
+        entry = self._acquire(collection_name)
+        try:
+            yield entry.collection if entry is not None else None
+        finally:
+            if entry is not None:
+                with self._lock:
+                    entry.in_use -= 1
+                    if not entry.in_use:
+                        self._idle.notify_all()
+
+    def _acquire(self, collection_name: str) -> Optional[_LoadedCollection]:
+        """Lädt eine Collection bei Bedarf und markiert sie als in Benutzung."""
+        with self._lock:
+            entry = self._loaded.get(collection_name)
+            if entry is not None:
+                entry.in_use += 1
+                self._loaded.move_to_end(collection_name)
+                return entry
+            load_lock = self._load_locks.setdefault(collection_name, threading.Lock())
+
+        # Gleichzeitige Abfragen derselben Collection laden sie nur einmal
+        with load_lock:
+            with self._lock:
+                entry = self._loaded.get(collection_name)
+                if entry is not None:
+                    entry.in_use += 1
+                    self._loaded.move_to_end(collection_name)
+                    return entry
+
+            collection = self.get(collection_name)
+            if collection is None:
+                return None
+            if utility.load_state(collection_name) != LoadState.Loaded:
+                with milvus_call("load"):
+                    collection.load()
+                self.loads += 1
+                logger.info(f"Collection {collection_name} geladen")
+
+            entry = _LoadedCollection(collection, self._estimate_size(collection))
+            with self._lock:
+                entry.in_use += 1
+                self._loaded[collection_name] = entry
+                victims = self._select_victims()
+        for name, victim in victims:
+            self._release(name, victim)
+        return entry
+
+    def _estimate_size(self, collection: Collection) -> int:
+        """Schätzt den Speicherbedarf einer geladenen Collection aus Schema und Anzahl Datensätzen."""
+        row_bytes = 0
+        for field in collection.schema.fields:
+            if field.dtype in _VECTOR_COMPONENT_BYTES:
+                row_bytes += field.params.get("dim", 0) * _VECTOR_COMPONENT_BYTES[field.dtype]
+            else:
+                row_bytes += _FIELD_BYTES.get(field.dtype, 8)
+        return collection.num_entities * row_bytes
+
+    def _select_victims(self) -> List[Tuple[str, _LoadedCollection]]:
+        """Entfernt ungenutzte Collections in LRU-Reihenfolge, bis das Budget eingehalten wird (Lock muss gehalten werden)."""
+        total = sum(entry.size_bytes for entry in self._loaded.values())
+        victims: List[Tuple[str, _LoadedCollection]] = []
+        for name, entry in list(self._loaded.items()):
+            if total <= self.memory_budget:
+                break
+            if entry.in_use:
+                continue
+            del self._loaded[name]
+            total -= entry.size_bytes
+            victims.append((name, entry))
+        return victims
+
+    def _release(self, collection_name: str, entry: _LoadedCollection) -> None:
+        """Gibt eine geladene Collection auf dem Server frei."""
+        try:
+            with milvus_call("release"):
+                entry.collection.release()
+            self.releases += 1
+            logger.info(f"Collection {collection_name} freigegeben (ca. {entry.size_bytes >> 20} MB)")
+        except Exception as e:
+            logger.warning(f"Fehler beim Freigeben der Collection {collection_name}: {str(e)}")
+
+    @contextmanager
+    def exclusive(self, collection_name: str) -> Iterator[Optional[Collection]]:
+        """Stellt eine freigegebene Collection exklusiv bereit (z.B. für einen Index-Neuaufbau).
+
+        Wartet, bis laufende Abfragen der Collection beendet sind, und gibt sie
+        dann auf dem Server frei. Neue Abfragen warten bis zum Ende des Blocks
+        und laden die Collection danach erneut.
+        """
+        with self._lock:
+            load_lock = self._load_locks.setdefault(collection_name, threading.Lock())
+        # Solange der Lade-Lock gehalten wird, kann keine Abfrage die Collection laden
+        with load_lock:
+            with self._lock:
+                entry = self._loaded.pop(collection_name, None)
+                if entry is not None and entry.in_use:
+                    logger.info(f"Warte auf {entry.in_use} laufende Abfragen von {collection_name}")
+                    self._idle.wait_for(lambda: not entry.in_use)
+            collection = self.get(collection_name)
+            if collection is not None:
+                with milvus_call("release"):
+                    collection.release()
+                if entry is not None:
+                    self.releases += 1
+            yield collection
+
+    def forget(self, collection_name: str) -> None:
+        """Vergisst Handle und Ladezustand einer Collection (z.B. nach dem Löschen)."""
+        with self._lock:
+            self._handles.pop(collection_name, None)
+            self._loaded.pop(collection_name, None)
+
+    def release_all(self) -> None:
+        """Gibt alle geladenen, gerade nicht abgefragten Collections frei."""
+        with self._lock:
+            victims = [(name, entry) for name, entry in self._loaded.items() if not entry.in_use]
+            for name, _ in victims:
+                del self._loaded[name]
+        for name, entry in victims:
+            self._release(name, entry)
+
+    def stats(self) -> Dict[str, int]:
+        """Liefert die Zähler des Collection-Managers."""
+        with self._lock:
+            return {
+                "loaded": len(self._loaded),
+                "loaded_bytes": sum(entry.size_bytes for entry in self._loaded.values()),
+                "loads": self.loads,
+                "releases": self.releases
+            }
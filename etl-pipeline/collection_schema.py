@@ -0,0 +1,109 @@
+from pathlib import Path
+from typing import Dict, Any, List
+from loguru import logger
+from config import COLLECTION_CONFIGS, DATA_SCHEMA_DIR, QUANTIZATION_CONFIG, VECTOR_DIM
+from quantization import VECTOR_FIELD_TYPES
+from xsd_types import load_field_kinds
+
+# Milvus erlaubt standardmäßig höchstens 64 Felder pro Collection
+MAX_COLLECTION_FIELDS = 64
+
+# Milvus-Feldtyp je Feldart der XSD
+_KIND_FIELD_TYPES = {
+    "int": "INT64",
+    "date": "INT64",
+    "datetime": "INT64",
+    "decimal": "FLOAT",
+    "bool": "BOOL",
+    "string": "VARCHAR"
+}
+
+def default_schema(collection_name: str, schema_dir: Path = DATA_SCHEMA_DIR) -> List[Dict[str, Any]]:
+    """Erstellt ein Standard-Schema für eine Collection basierend auf dem Kollektionstyp.
+
+    schema_dir enthält die XSD-Dateien (z.B. die des Testdaten-Generators).
+    """
+    config = COLLECTION_CONFIGS.get(collection_name) or {}
+    base_fields = [
+        {
+            "name": "id",
+            "type": "INT64",
+            "is_primary": True
+        },
+        {
+            "name": "vector",
+            # float32 oder quantisiert, je nach QUANTIZATION_CONFIG
+            "type": VECTOR_FIELD_TYPES[QUANTIZATION_CONFIG["mode"]],
+            # Mit Projektion die Zieldimension der PCA, sonst die des Embedding-Modells
+            "dim": config.get("projection_dim") or VECTOR_DIM
+        },
+        {
+            "name": "registrierungsdatum",
+            "type": "INT64"
+        },
+        {
+            "name": "datum_letzte_aktualisierung",
+            "type": "INT64"
+        },
+        {
+            "name": "eeg_inbetriebnahmedatum",
+            "type": "INT64"
+        },
+        {
+            "name": "eeg_mastr_nummer",
+            "type": "VARCHAR",
+            "max_length": 64
+        },
+        {
+            "name": "anlagenschluessel_eeg",
+            "type": "VARCHAR",
+            "max_length": 64
+        },
+        {
+            "name": "installierte_leistung",
+            "type": "FLOAT"
+        },
+        {
+            "name": "netzanschlusspunkt_id",
+            "type": "VARCHAR",
+            "max_length": 64
+        },
+        {
+            "name": "betreiber_id",
+            "type": "VARCHAR",
+            "max_length": 64
+        },
+        {
+            "name": "genehmigungsdatum",
+            "type": "INT64"
+        },
+        {
+            "name": "source_file",
+            "type": "VARCHAR",
+            "max_length": 512
+        },
+        {
+            "name": "metadata",
+            "type": "JSON"
+        }
+    ]
+
+    # Typisierte Felder aus der XSD der Collection ergänzen; was nicht mehr
+    # in das Feldlimit passt, landet beim Insert im JSON-Feld metadata
+    if not config:
+        return base_fields
+    field_kinds = load_field_kinds(str(Path(schema_dir) / config["schema_file"]))
+    names = {field["name"] for field in base_fields}
+    for tag, kind in field_kinds.items():
+        name = tag.lower()
+        if name in names:
+            continue
+        if len(base_fields) >= MAX_COLLECTION_FIELDS:
+            logger.info(f"Feldlimit erreicht, weitere Felder von {collection_name} werden in metadata gespeichert")
+            break
+        field = {"name": name, "type": _KIND_FIELD_TYPES[kind]}
+        if field["type"] == "VARCHAR":
+            field["max_length"] = 65535
+        base_fields.append(field)
+        names.add(name)
+    return base_fields
@@ -12,10 +12,54 @@ BASE_DIR = Path(__file__).parent.parent
 DATA_SCHEMA_DIR = BASE_DIR / "data_schema"
 DATA_DIR = BASE_DIR / "data"
 LOG_DIR = BASE_DIR / "logs"
+STATE_DIR = BASE_DIR / "state"  # Zustand zwischen ETL-Läufen (Manifest usw.)
 
 # Erstelle Log-Verzeichnis falls nicht vorhanden
 LOG_DIR.mkdir(parents=True, exist_ok=True)
 
+# Lokaler Vektorspeicher (Alternative zu Milvus, siehe local_store.py)
+LOCAL_STORE_DIR = STATE_DIR / "local_store"
+
+# Manifest der geladenen Quelldateien für inkrementelle Läufe
+MANIFEST_FILE = STATE_DIR / "manifest.json"
+
+# Höchster geladener Änderungszeitpunkt je Collection für Delta-Läufe
+WATERMARK_FILE = STATE_DIR / "watermarks.json"
+
+# Checkpoint eines laufenden ETL-Laufs, um nach einem Absturz fortzusetzen (siehe checkpoint.py)
+CHECKPOINT_CONFIG = {
+    "enabled": os.getenv("ETL_CHECKPOINT", "1") != "0",
+    "checkpoint_file": STATE_DIR / "checkpoint.jsonl",  # Journal, wird nach einem erfolgreichen Lauf gelöscht
+    "interval_records": int(os.getenv("ETL_CHECKPOINT_INTERVAL", 5000)),  # Datensätze zwischen zwei Checkpoints
+    "flush_interval_records": 200_000,  # Beim lokalen Vektorspeicher (speichert bei jedem Checkpoint die Collections)
+    "fsync": True  # Checkpoint vor dem Weiterarbeiten dauerhaft auf die Platte schreiben
+}
+
+# Geparste Datensätze mit Embeddings als Parquet- oder Arrow-Dateien je Collection (siehe staging.py)
+STAGING_CONFIG = {
+    "dir": STATE_DIR / "staging",
+    "format": os.getenv("ETL_STAGING_FORMAT", "parquet"),  # parquet (kompakt) oder arrow (ohne Kopie per Memory-Mapping lesbar)
+    "compression": "zstd"  # Kompression der Parquet-Dateien
+}
+
+# Gelernte PCA-Projektionen der Milvus-Collections (eine .npz-Datei je Collection)
+PROJECTION_DIR = STATE_DIR / "projections"
+
+# Synthetische MaStR-Daten und Ergebnisse der Durchsatz-Benchmarks (siehe benchmark.py)
+BENCHMARK_CONFIG = {
+    "data_dir": STATE_DIR / "benchmark" / "data",  # Ein Unterverzeichnis je Größe und Startwert
+    "results_dir": STATE_DIR / "benchmark" / "results",  # Eine JSON-Datei je Lauf
+    "tolerance": 0.1  # Erlaubter Rückgang des Durchsatzes beim Vergleich mit einem früheren Lauf
+}
+
+# Metriken der Pipeline-Stufen (siehe metrics.py)
+METRICS_CONFIG = {
+    "port": int(os.getenv("ETL_METRICS_PORT", 0)),  # HTTP-Endpunkt /metrics für Prometheus (0 = aus)
+    "snapshot_file": STATE_DIR / "metrics.json",  # JSON-Snapshot der Metriken
+    "snapshot_interval": 60.0,  # Sekunden zwischen zwei Snapshots (0 = nur am Ende)
+    "log_interval": float(os.getenv("ETL_LOG_INTERVAL", 30))  # Sekunden zwischen zwei Fortschrittszeilen
+}
+
 # Milvus Konfiguration
 MILVUS_CONFIG = {
     "uri": "https://in03-75001f770ba89d7.serverless.gcp-us-west1.cloud.zilliz.com",
@@ -24,6 +68,56 @@ MILVUS_CONFIG = {
     "timeout": 30  # Timeout in Sekunden
 }
 
+# Inserts in Milvus: mehrere Blöcke gleichzeitig, Blockgröße passt sich der Latenz an
+INSERT_CONFIG = {
+    "concurrency": int(os.getenv("ETL_INSERT_CONCURRENCY", 4)),  # Gleichzeitig laufende Insert-Blöcke
+    "initial_batch_size": 1000,  # Startgröße eines Insert-Blocks
+    "min_batch_size": 100,
+    "max_batch_size": 10000,
+    "target_latency": 2.0,  # Angestrebte Dauer eines Inserts in Sekunden
+    "max_batch_bytes": 32 << 20,  # Obergrenze der Nutzdaten pro Insert (Nachrichtenlimit)
+    "max_retries": 5,  # Wiederholungen eines fehlgeschlagenen Blocks
+    "retry_backoff": 0.5,  # Erste Wartezeit in Sekunden, verdoppelt sich pro Versuch
+    "max_backoff": 30.0
+}
+
+# Geladene Collections bleiben geladen, bis ihr geschätzter Speicherbedarf das Budget überschreitet
+COLLECTION_MANAGER_CONFIG = {
+    "memory_budget": int(os.getenv("ETL_MILVUS_MEMORY_BUDGET_MB", 4096)) << 20  # Bytes
+}
+
+# Suche über mehrere Collections
+SEARCH_CONFIG = {
+    "concurrency": int(os.getenv("ETL_SEARCH_CONCURRENCY", 8)),  # Gleichzeitig laufende Collection-Suchen
+    "query_cache_size": 10000,  # Anfragetexte im Embedding-LRU
+    "result_cache_size": 10000,  # Gespeicherte Suchergebnisse
+    "result_cache_ttl": float(os.getenv("ETL_SEARCH_CACHE_TTL", 300))  # Gültigkeit eines Suchergebnisses in Sekunden
+}
+
+# Wahl des Vektorindex abhängig von der Anzahl der Datensätze (siehe index_tuning.py)
+INDEX_CONFIG = {
+    "target_recall": float(os.getenv("ETL_TARGET_RECALL", 0.95)),  # Ab 0.98 wird HNSW verwendet
+    "flat_threshold": 50_000,  # Darunter exakte Suche (FLAT)
+    "sq8_threshold": 1_000_000,  # Ab hier IVF_SQ8 statt IVF_FLAT
+    "normalize": True  # Embeddings normieren und mit innerem Produkt (IP) suchen
+}
+
+# Speicherformat der Vektoren neuer Collections (siehe quantization.py)
+QUANTIZATION_CONFIG = {
+    "mode": os.getenv("ETL_VECTOR_QUANTIZATION", "float32"),  # float32, float16 (halber Speicher) oder int8 (ein Viertel)
+    "min_recall": 0.95,  # Warnung, wenn der Recall gegenüber float32 darunter liegt
+    "recall_k": 10,  # Treffer je Anfrage in der Recall-Prüfung
+    "recall_sample": 200  # Anfragen in der Recall-Prüfung
+}
+
+# PCA-Projektion zwischen Embedding-Modell und Vektorspeicher; die Zieldimension
+# steht je Collection in COLLECTION_CONFIGS ("projection_dim", None = keine Projektion)
+PROJECTION_CONFIG = {
+    "min_recall": 0.9,  # Warnung, wenn der Recall gegenüber den vollen Embeddings darunter liegt
+    "recall_k": 10,  # Treffer je Anfrage in der Recall-Prüfung
+    "recall_sample": 200  # Anfragen in der Recall-Prüfung
+}
+
 # Optimierte Logging-Konfiguration
 LOG_CONFIG = {
     "handlers": [
@@ -52,6 +146,37 @@ LOG_CONFIG = {
 # Vector-Dimensionen
 VECTOR_DIM = 768
 
+# Embedding-Modell
+EMBEDDING_MODEL_NAME = "all-mpnet-base-v2"
+
+# Persistenter Embedding-Cache (ca. 3 KB pro Eintrag bei 768 Dimensionen)
+EMBEDDING_CACHE_CONFIG = {
+    "enabled": os.getenv("ETL_EMBEDDING_CACHE", "1") != "0",
+    "cache_file": STATE_DIR / "embedding_cache.sqlite",
+    "max_entries": int(os.getenv("ETL_EMBEDDING_CACHE_MAX_ENTRIES", 5_000_000))
+}
+
+# Embeddings je Collection als append-only float32-Matrix mit ID-Index (siehe embedding_store.py),
+# ca. 3 KB pro Datensatz bei 768 Dimensionen
+EMBEDDING_STORE_CONFIG = {
+    "enabled": os.getenv("ETL_EMBEDDING_STORE", "0") != "0",
+    "dir": STATE_DIR / "embeddings",
+    "fsync": True,  # Angehängte Embeddings bei jedem Checkpoint dauerhaft auf die Platte schreiben
+    "chunk_rows": 16384  # Zeilen je Block bei Suche und Indexaufbau (16384 x 768 float32 = 48 MB)
+}
+
+# ETL Konfiguration
+ETL_CONFIG = {
+    "insert_batch_size": 5000,  # Datensätze pro Block zwischen den Pipeline-Stufen
+    "embedding_batch_size": 256,  # Texte pro encode()-Aufruf des Embedding-Modells
+    "parse_workers": int(os.getenv("ETL_PARSE_WORKERS", os.cpu_count() or 1)),  # Prozesse für paralleles Parsen
+    "parse_queue_size": 16,  # Maximal wartende geparste Blöcke zwischen Workern und Hauptprozess
+    "split_bytes": int(os.getenv("ETL_SPLIT_MB", 64)) << 20,  # Große Dateien in Bereiche dieser Größe teilen (0 = aus)
+    "stage_queue_size": 4,  # Maximal wartende Blöcke zwischen Parse-, Embedding- und Insert-Stufe
+    "insert_window": 2 * INSERT_CONFIG["concurrency"],  # Maximal gesendete, noch nicht bestätigte Blöcke
+    "update_field": "DatumLetzteAktualisierung"  # Änderungszeitpunkt eines Datensatzes (für Delta-Läufe)
+}
+
 # Collection Konfigurationen
 COLLECTION_CONFIGS: Dict[str, Dict[str, Any]] = {
     "biomasse_anlagen": {
@@ -59,48 +184,75 @@ COLLECTION_CONFIGS: Dict[str, Dict[str, Any]] = {
         "vector_field": "vector",
         "dim": VECTOR_DIM,
         "data_dir": "biomasse",  # Unterverzeichnis für Biomasse-Daten
-        "file_patterns": ["*Biomasse*.xml", "*Biogas*.xml", "*Biomethan*.xml"]
+        "file_patterns": ["*Biomasse*.xml", "*Biogas*.xml", "*Biomethan*.xml"],
+        "key_field": "EegMaStRNummer",  # Fachlicher Schlüssel für stabile IDs
+        "projection_dim": None  # Zieldimension der PCA-Projektion, z.B. 256 (None: volle Dimension)
     },
     "solar_anlagen": {
         "schema_file": "AnlagenEegSolar.xsd",
         "vector_field": "vector",
         "dim": VECTOR_DIM,
         "data_dir": "solar",  # Unterverzeichnis für Solar-Daten
-        "file_patterns": ["*Solar*.xml", "*Photovoltaik*.xml", "*PV*.xml"]
+        "file_patterns": ["*Solar*.xml", "*Photovoltaik*.xml", "*PV*.xml"],
+        "key_field": "EegMaStRNummer",  # Fachlicher Schlüssel für stabile IDs
+        "projection_dim": None  # Zieldimension der PCA-Projektion, z.B. 256 (None: volle Dimension)
     },
     "wind_anlagen": {
         "schema_file": "AnlagenEegWind.xsd",
         "vector_field": "vector",
         "dim": VECTOR_DIM,
         "data_dir": "wind",  # Unterverzeichnis für Wind-Daten
-        "file_patterns": ["*Wind*.xml", "*Onshore*.xml", "*Offshore*.xml"]
+        "file_patterns": ["*Wind*.xml", "*Onshore*.xml", "*Offshore*.xml"],
+        "key_field": "EegMaStRNummer",  # Fachlicher Schlüssel für stabile IDs
+        "projection_dim": None  # Zieldimension der PCA-Projektion, z.B. 256 (None: volle Dimension)
     },
     "wasser_anlagen": {
         "schema_file": "AnlagenEegWasser.xsd",
         "vector_field": "vector",
         "dim": VECTOR_DIM,
         "data_dir": "wasser",  # Unterverzeichnis für Wasser-Daten
-        "file_patterns": ["*Wasser*.xml", "*Wasserkraft*.xml"]
+        "file_patterns": ["*Wasser*.xml", "*Wasserkraft*.xml"],
+        "key_field": "EegMaStRNummer",  # Fachlicher Schlüssel für stabile IDs
+        "projection_dim": None  # Zieldimension der PCA-Projektion, z.B. 256 (None: volle Dimension)
     },
     "geothermie_anlagen": {
         "schema_file": "AnlagenEegGeothermieGrubengasDruckentspannung.xsd",
         "vector_field": "vector",
         "dim": VECTOR_DIM,
         "data_dir": "geothermie",  # Unterverzeichnis für Geothermie-Daten
-        "file_patterns": ["*Geothermie*.xml", "*Grubengas*.xml", "*Druckentspannung*.xml"]
+        "file_patterns": ["*Geothermie*.xml", "*Grubengas*.xml", "*Druckentspannung*.xml"],
+        "key_field": "EegMaStRNummer",  # Fachlicher Schlüssel für stabile IDs
+        "projection_dim": None  # Zieldimension der PCA-Projektion, z.B. 256 (None: volle Dimension)
     },
     "netzanschlusspunkte": {
         "schema_file": "Netzanschlusspunkte.xsd",
         "vector_field": "vector",
         "dim": VECTOR_DIM,
         "data_dir": "netzanschlusspunkte",
-        "file_patterns": ["*Netzanschlusspunkt*.xml", "*Lokation*.xml"]
+        "file_patterns": ["*Netzanschlusspunkt*.xml", "*Lokation*.xml"],
+        "key_field": "NetzanschlusspunktMastrNummer",  # Fachlicher Schlüssel für stabile IDs
+        "projection_dim": None  # Zieldimension der PCA-Projektion, z.B. 256 (None: volle Dimension)
     },
     "netze": {
         "schema_file": "Netze.xsd",
         "vector_field": "vector",
         "dim": VECTOR_DIM,
         "data_dir": "netze",
-        "file_patterns": ["*Netz*.xml", "*Netze*.xml"]
+        "file_patterns": ["*Netz*.xml", "*Netze*.xml"],
+        "key_field": "MastrNummer",  # Fachlicher Schlüssel für stabile IDs
+        "projection_dim": None  # Zieldimension der PCA-Projektion, z.B. 256 (None: volle Dimension)
     }
-} 
\ No newline at end of file
+} 
+
+# Reihenfolge beim Zuordnen von Dateien zu Collections: Die erste passende
+# Collection gewinnt, daher stehen spezifischere Muster vor allgemeineren
+# (z.B. "*Netzanschlusspunkt*.xml" vor "*Netz*.xml").
+COLLECTION_PRECEDENCE = [
+    "netzanschlusspunkte",
+    "netze",
+    "biomasse_anlagen",
+    "solar_anlagen",
+    "wind_anlagen",
+    "wasser_anlagen",
+    "geothermie_anlagen"
+]
@@ -0,0 +1,132 @@
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Tuple
+import numpy as np
+from loguru import logger
+
+# SQLite erlaubt nur eine begrenzte Anzahl Parameter pro Statement
+_SQL_CHUNK = 500
+
+class EmbeddingCache:
+    def __init__(self, cache_file: Path, model_name: str, vector_dim: int, max_entries: int = 5_000_000):
+        """Persistenter Embedding-Cache in SQLite, Schlüssel ist ein Hash aus Modellname und Text."""
+        self.cache_file = Path(cache_file)
+        self.model_name = model_name
+        self.vector_dim = vector_dim
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        # Der Cache wird aus der Embedding-Stufe der Pipeline (eigener Thread) verwendet
+        self._conn = sqlite3.connect(str(self.cache_file), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key BLOB PRIMARY KEY, vector BLOB NOT NULL, last_used INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        self._conn.commit()
+
+        self._size, clock = self._conn.execute("SELECT COUNT(*), COALESCE(MAX(last_used), 0) FROM embeddings").fetchone()
+        # Logische Uhr für die LRU-Verdrängung, wird pro Zugriff erhöht
+        self._clock = clock
+        logger.info(f"Embedding-Cache {self.cache_file.name} geöffnet: {self._size} Einträge")
+
+    def key(self, text: str) -> bytes:
+        """Berechnet den Cache-Schlüssel aus Modellname und Text."""
+        return hashlib.blake2b(f"{self.model_name}\0{text}".encode("utf-8"), digest_size=16).digest()
+
+    def get_many(self, texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Sucht mehrere Texte im Cache.
+
+        Liefert eine float32-Matrix (Zeilen ohne Treffer sind Null) und eine
+        Maske der gefundenen Zeilen.
+        """
+        vectors = np.zeros((len(texts), self.vector_dim), dtype=np.float32)
+        found = np.zeros(len(texts), dtype=bool)
+        keys = [self.key(text) for text in texts]
+        positions: Dict[bytes, List[int]] = {}
+        for i, key in enumerate(keys):
+            positions.setdefault(key, []).append(i)
+
+        with self._lock:
+            self._clock += 1
+            unique_keys = list(positions)
+            for start in range(0, len(unique_keys), _SQL_CHUNK):
+                chunk = unique_keys[start:start + _SQL_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                hit_keys = []
+                for key, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32)
+                    # Einträge mit abweichender Dimension gelten als Fehlschlag
+                    if vector.shape[0] != self.vector_dim:
+                        continue
+                    hit_keys.append(key)
+                    for i in positions[key]:
+                        vectors[i] = vector
+                        found[i] = True
+                if hit_keys:
+                    self._conn.execute(
+                        f"UPDATE embeddings SET last_used = ? WHERE key IN ({','.join('?' * len(hit_keys))})",
+                        [self._clock, *hit_keys]
+                    )
+            self._conn.commit()
+
+            hits = int(found.sum())
+            self.hits += hits
+            self.misses += len(texts) - hits
+        return vectors, found
+
+    def put_many(self, texts: List[str], vectors: np.ndarray) -> None:
+        """Speichert mehrere Embeddings im Cache."""
+        if not texts:
+            return
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self._lock:
+            self._clock += 1
+            rows = [(self.key(text), vector.tobytes(), self._clock) for text, vector in zip(texts, vectors)]
+            before = self._conn.total_changes
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows)
+            # Ersetzte Einträge werden mitgezählt, daher vor dem Verdrängen genau nachzählen
+            self._size += self._conn.total_changes - before
+            if self._size > self.max_entries:
+                self._size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+                if self._size > self.max_entries:
+                    self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        """Verdrängt die am längsten nicht genutzten Einträge (auf 90% der Maximalgröße)."""
+        excess = self._size - int(self.max_entries * 0.9)
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+            (excess,)
+        )
+        self._size -= excess
+        self.evictions += excess
+        logger.info(f"Embedding-Cache: {excess} Einträge verdrängt")
+
+    def stats(self) -> Dict[str, float]:
+        """Liefert die Zähler des Caches."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": self._size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+    def close(self) -> None:
+        """Schließt die Datenbankverbindung."""
+        with self._lock:
+            self._conn.close()
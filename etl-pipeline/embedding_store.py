@@ -0,0 +1,626 @@
+import argparse
+import json
+import math
+import mmap
+import os
+import sys
+import threading
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from loguru import logger
+from config import EMBEDDING_MODEL_NAME, EMBEDDING_STORE_CONFIG, INDEX_CONFIG, LOG_CONFIG
+from index_tuning import normalize_rows, search_params
+from record_batch import RecordBatch
+
+# Rohdateien einer Collection (ohne Header, Zeile für Zeile gleich ausgerichtet); gültig sind
+# nur die ersten count Zeilen aus meta.json, beim Absturz halb angehängte Zeilen werden abgeschnitten
+_VECTOR_FILE = "vectors.f32"
+_ID_FILE = "ids.i64"
+_SOURCE_FILE = "sources.i32"
+
+# Obergrenze der Abstandsmatrix (Zeilen x Clusterzentren) beim Zuordnen zu den Clustern
+_MAX_SCORES = 1 << 24
+
+def _nearest_centroids(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Nächstes Clusterzentrum je Zeile, blockweise, damit die Abstandsmatrix klein bleibt."""
+    # ||x - c||² = ||x||² - 2 x·c + ||c||²; ||x||² ist je Zeile konstant
+    centroid_norms = (centroids * centroids).sum(axis=1)
+    step = max(1, _MAX_SCORES // len(centroids))
+    labels = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), step):
+        scores = vectors[start:start + step] @ centroids.T * -2.0 + centroid_norms
+        labels[start:start + step] = scores.argmin(axis=1)
+    return labels
+
+class EmbeddingMatrix:
+    def __init__(self, path: Path, dim: Optional[int] = None, model_name: Optional[str] = None, normalized: bool = True,
+                 fsync: bool = True, chunk_rows: int = 16384):
+        """Append-only float32-Matrix der Embeddings einer Collection mit ID-Index daneben.
+
+        Vektoren, IDs und Quelldatei je Zeile liegen in Rohdateien, die per
+        Memory-Mapping ohne Kopie gelesen werden; der Arbeitsspeicher begrenzt
+        also nicht die Anzahl der Vektoren. Angehängte Zeilen werden mit commit()
+        sichtbar. Eine ID kann mehrfach vorkommen (Upsert, erneut geladene Datei),
+        es gilt die zuletzt angehängte Zeile. Ohne dim wird eine vorhandene Matrix
+        zum Lesen geöffnet; passen Dimension oder Modell nicht, wird sie verworfen.
+        """
+        self.path = Path(path)
+        self.fsync = fsync
+        self.chunk_rows = chunk_rows
+        self.lock = threading.RLock()
+        self._files: Optional[List[BinaryIO]] = None
+        self._appended = 0
+        # Memory-Maps, ID-Index und IVF zum aktuellen Stand (nach jeder Änderung neu erzeugt)
+        self._views: Dict[str, Any] = {}
+        meta = self._load_meta()
+        if meta is not None and dim is not None and (meta["dim"] != dim or meta.get("model") != model_name
+                                                      or meta.get("normalized") != normalized):
+            logger.warning(f"Embeddings in {self.path} stammen von {meta.get('model')} ({meta['dim']} Dimensionen) "
+                           f"und werden verworfen")
+            self._remove_files()
+            meta = None
+        if meta is None and dim is None:
+            raise FileNotFoundError(f"Keine Embeddings in {self.path}")
+        self._apply_meta(meta or {"dim": dim, "model": model_name, "normalized": normalized})
+
+    def _apply_meta(self, meta: Dict[str, Any]) -> None:
+        self.dim: int = meta["dim"]
+        self.model_name: Optional[str] = meta.get("model")
+        self.normalized: bool = meta.get("normalized", True)
+        self.count: int = meta.get("count", 0)
+        # Quelldatei-Schlüssel je Code in sources.i32 (-1: ohne Quelldatei)
+        self.sources: List[str] = meta.get("sources", [])
+        # Entfernte Quelldateien: Code -> Zeilen davor gelten als gelöscht
+        self.removed: Dict[str, int] = meta.get("removed", {})
+        # Zählt Entfernen, Verdichten und Leeren; ID-Index und IVF gelten nur für ihre Generation
+        self.generation: int = meta.get("generation", 0)
+        self._source_codes = {key: code for code, key in enumerate(self.sources)}
+        self._views = {}
+
+    def refresh(self) -> None:
+        """Liest den Stand neu, den ein anderer Prozess (z.B. ein laufender ETL-Lauf) inzwischen bestätigt hat."""
+        with self.lock:
+            meta = self._load_meta()
+            if meta is not None and self._files is None:
+                self._apply_meta(meta)
+
+    def _load_meta(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.path / "meta.json", "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _save_meta(self) -> None:
+        self.path.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.path / "meta.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": 1,
+                "dim": self.dim,
+                "model": self.model_name,
+                "normalized": self.normalized,
+                "count": self.count,
+                "sources": self.sources,
+                "removed": self.removed,
+                "generation": self.generation
+            }, f, indent=2)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp_file, self.path / "meta.json")
+
+    def _row_bytes(self) -> Dict[str, int]:
+        return {_VECTOR_FILE: self.dim * 4, _ID_FILE: 8, _SOURCE_FILE: 4}
+
+    def _truncate(self) -> None:
+        """Schneidet nicht bestätigte Zeilen am Ende der Rohdateien ab (vor dem ersten Anhängen)."""
+        for name, row_bytes in self._row_bytes().items():
+            file_path = self.path / name
+            if not file_path.exists():
+                continue
+            size = file_path.stat().st_size
+            if size > self.count * row_bytes:
+                os.truncate(file_path, self.count * row_bytes)
+            elif size < self.count * row_bytes:
+                logger.warning(f"{file_path} ist kürzer als vermerkt, es gelten nur {size // row_bytes} Zeilen")
+                self.count = size // row_bytes
+
+    def _remove_files(self) -> None:
+        self._close_files()
+        if self.path.exists():
+            for file_path in self.path.iterdir():
+                file_path.unlink()
+        self._views = {}
+
+    def _close_files(self) -> None:
+        if self._files is not None:
+            for f in self._files:
+                f.close()
+            self._files = None
+
+    def append(self, ids: np.ndarray, vectors: np.ndarray, source_file: Optional[str] = None) -> None:
+        """Hängt Zeilen an (sichtbar und dauerhaft erst mit commit)."""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or vectors.shape[1] != self.dim:
+            raise ValueError(f"Vektor-Dimension stimmt nicht überein: {vectors.shape} != (*, {self.dim})")
+        with self.lock:
+            code = -1
+            if source_file is not None:
+                code = self._source_codes.get(source_file, -1)
+                if code < 0:
+                    code = self._source_codes[source_file] = len(self.sources)
+                    self.sources.append(source_file)
+            if self._files is None:
+                self.path.mkdir(parents=True, exist_ok=True)
+                # Reste eines abgebrochenen Laufs; Leser lassen die Dateien unverändert
+                self._truncate()
+                self._files = [open(self.path / name, "ab") for name in (_VECTOR_FILE, _ID_FILE, _SOURCE_FILE)]
+            vector_file, id_file, source_file_handle = self._files
+            vector_file.write(vectors.data)
+            id_file.write(np.ascontiguousarray(ids, dtype=np.int64).data)
+            source_file_handle.write(np.full(len(vectors), code, dtype=np.int32).data)
+            self._appended += len(vectors)
+
+    def commit(self) -> None:
+        """Schreibt die angehängten Zeilen dauerhaft auf die Platte und macht sie sichtbar."""
+        with self.lock:
+            if not self._appended:
+                return
+            for f in self._files:
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+            self.count += self._appended
+            self._appended = 0
+            self._save_meta()
+            self._views = {}
+
+    def remove_source(self, source_file: str) -> None:
+        """Entfernt alle bisher angehängten Zeilen einer Quelldatei (danach angehängte bleiben gültig)."""
+        with self.lock:
+            code = self._source_codes.get(source_file)
+            if code is None:
+                return
+            self.commit()
+            self.removed[str(code)] = self.count
+            self.generation += 1
+            self._save_meta()
+            self._views = {}
+
+    def reset(self) -> None:
+        """Leert die Matrix (z.B. vor einem vollständigen Lauf)."""
+        with self.lock:
+            self._remove_files()
+            self.count, self._appended = 0, 0
+            self.sources, self.removed, self._source_codes = [], {}, {}
+            self.generation += 1
+            self._save_meta()
+
+    def _map(self, name: str, dtype: Any, shape: Tuple[int, ...]) -> np.ndarray:
+        key = f"map:{name}"
+        if key not in self._views:
+            if not self.count:
+                self._views[key] = np.empty(shape, dtype=dtype)
+            else:
+                with open(self.path / name, "rb") as f:
+                    mapping = mmap.mmap(f.fileno(), int(np.prod(shape)) * np.dtype(dtype).itemsize, access=mmap.ACCESS_READ)
+                self._views[key] = np.frombuffer(mapping, dtype=dtype).reshape(shape)
+                self._views[f"mmap:{name}"] = mapping
+        return self._views[key]
+
+    def _release(self, start: int, stop: int) -> None:
+        """Gibt die Seiten gelesener Zeilen der Vektordatei frei; sie bleiben im Page Cache des Systems.
+
+        So wächst der Speicherbedarf (RSS) beim Durchlaufen großer Matrizen nicht
+        mit der Dateigröße (nicht auf allen Plattformen verfügbar).
+        """
+        mapping = self._views.get(f"mmap:{_VECTOR_FILE}")
+        if mapping is None or not hasattr(mmap, "MADV_DONTNEED"):
+            return
+        row_bytes = self.dim * 4
+        offset = int(start) * row_bytes // mmap.PAGESIZE * mmap.PAGESIZE
+        mapping.madvise(mmap.MADV_DONTNEED, offset, int(stop) * row_bytes - offset)
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """Alle bestätigten Zeilen als (count, dim)-Matrix, per Memory-Mapping ohne Kopie (nur lesbar)."""
+        with self.lock:
+            return self._map(_VECTOR_FILE, np.float32, (self.count, self.dim))
+
+    @property
+    def ids(self) -> np.ndarray:
+        with self.lock:
+            return self._map(_ID_FILE, np.int64, (self.count,))
+
+    def _id_index(self) -> np.ndarray:
+        """ID-Index der gültigen Zeilen: [0] aufsteigende IDs, [1] die zugehörige (letzte) Zeile.
+
+        Wird beim ersten Zugriff nach einer Änderung gebaut und als id_index.<count>.<generation>.npy
+        neben den Rohdateien gespeichert, damit auch andere Prozesse ihn per Memory-Mapping lesen.
+        """
+        with self.lock:
+            if "id_index" in self._views:
+                return self._views["id_index"]
+            index_file = self.path / f"id_index.{self.count}.{self.generation}.npy"
+            if index_file.exists():
+                index = np.load(index_file, mmap_mode="r")
+            else:
+                index = self._build_id_index()
+                if self.count:
+                    for old_file in self.path.glob("id_index.*.npy"):
+                        if not old_file.name.endswith(".tmp.npy"):
+                            old_file.unlink(missing_ok=True)
+                    # Eindeutiger Name, falls ein anderer Prozess den Index gleichzeitig baut
+                    tmp_file = self.path / f"id_index.{os.getpid()}.tmp.npy"
+                    np.save(tmp_file, index)
+                    os.replace(tmp_file, index_file)
+            self._views["id_index"] = index
+            return index
+
+    def _build_id_index(self) -> np.ndarray:
+        ids = np.asarray(self.ids)
+        order = np.argsort(ids, kind="stable")
+        sorted_ids = ids[order]
+        # Bei mehrfachen IDs gilt die letzte Zeile
+        last = np.ones(len(order), dtype=bool)
+        last[:-1] = sorted_ids[1:] != sorted_ids[:-1]
+        rows, keys = order[last], sorted_ids[last]
+        if self.removed:
+            sources = self._map(_SOURCE_FILE, np.int32, (self.count,))[rows]
+            dead = np.zeros(len(rows), dtype=bool)
+            for code, limit in self.removed.items():
+                dead |= (sources == int(code)) & (rows < limit)
+            rows, keys = rows[~dead], keys[~dead]
+        return np.stack([keys, rows.astype(np.int64)])
+
+    def live_rows(self) -> Optional[np.ndarray]:
+        """Aufsteigende Nummern der gültigen Zeilen; None, wenn alle Zeilen gültig sind."""
+        with self.lock:
+            if "live_rows" not in self._views:
+                rows = self._id_index()[1]
+                self._views["live_rows"] = None if len(rows) == self.count else np.sort(rows)
+            return self._views["live_rows"]
+
+    def __len__(self) -> int:
+        """Anzahl gültiger Zeilen (verschiedener IDs)."""
+        return self._id_index().shape[1]
+
+    def lookup(self, ids: np.ndarray) -> np.ndarray:
+        """Zeilennummern zu IDs (-1 für unbekannte IDs)."""
+        index = self._id_index()
+        ids = np.asarray(ids, dtype=np.int64)
+        rows = np.full(len(ids), -1, dtype=np.int64)
+        if index.shape[1]:
+            positions = np.minimum(np.searchsorted(index[0], ids), index.shape[1] - 1)
+            hit = index[0][positions] == ids
+            rows[hit] = index[1][positions[hit]]
+        return rows
+
+    def get(self, ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Vektoren zu IDs (Kopie) samt Maske der gefundenen IDs; fehlende Vektoren sind 0."""
+        rows = self.lookup(ids)
+        found = rows >= 0
+        vectors = np.zeros((len(rows), self.dim), dtype=np.float32)
+        vectors[found] = self.vectors[rows[found]]
+        return vectors, found
+
+    def iter_chunks(self, chunk_rows: Optional[int] = None) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """Liefert die gültigen Zeilen blockweise als (IDs, Vektoren), z.B. für Neuindizierung oder Evaluation.
+
+        Sind alle Zeilen gültig, sind die Blöcke Sichten auf die Datei ohne Kopie.
+        """
+        chunk_rows = chunk_rows or self.chunk_rows
+        vectors, ids, rows = self.vectors, self.ids, self.live_rows()
+        total = len(vectors) if rows is None else len(rows)
+        for start in range(0, total, chunk_rows):
+            if rows is None:
+                yield ids[start:start + chunk_rows], vectors[start:start + chunk_rows]
+                self._release(start, min(total, start + chunk_rows))
+            else:
+                chunk = rows[start:start + chunk_rows]
+                yield ids[chunk], vectors[chunk]
+                self._release(chunk[0], chunk[-1] + 1)
+
+    def build_ivf(self, nlist: Optional[int] = None, iterations: int = 10, seed: int = 0) -> None:
+        """Baut einen IVF-Index (k-Means auf einer Stichprobe) für die ungefähre Suche.
+
+        Die Zeilen werden nach Cluster sortiert gespeichert (ivf_rows.npy,
+        ivf_offsets.npy); danach angehängte Zeilen durchsucht search() exakt, bis
+        der Index neu gebaut wird.
+        """
+        with self.lock:
+            rows = self.live_rows()
+            total = self.count if rows is None else len(rows)
+            if not total:
+                return
+            nlist = min(total, nlist or int(min(65536, max(16, 4 * math.sqrt(total)))))
+            rng = np.random.default_rng(seed)
+            sample_rows = np.sort(rng.choice(total, min(total, max(nlist * 40, 10000)), replace=False))
+            if rows is not None:
+                sample_rows = rows[sample_rows]
+            sample = np.asarray(self.vectors[sample_rows])
+            self._release(0, self.count)
+            centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+            for _ in range(iterations):
+                labels = _nearest_centroids(sample, centroids)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, labels, sample)
+                counts = np.bincount(labels, minlength=nlist)
+                filled = counts > 0
+                # Leere Cluster behalten ihr bisheriges Zentrum
+                centroids[filled] = sums[filled] / counts[filled, None]
+
+            assignments = np.empty(total, dtype=np.int32)
+            for start, (_, vectors) in zip(range(0, total, self.chunk_rows), self.iter_chunks()):
+                assignments[start:start + len(vectors)] = _nearest_centroids(np.asarray(vectors), centroids)
+            order = np.argsort(assignments, kind="stable")
+            ivf_rows = order if rows is None else rows[order]
+            offsets = np.searchsorted(assignments[order], np.arange(nlist + 1)).astype(np.int64)
+
+            for name, array in (("ivf_centroids", centroids), ("ivf_rows", ivf_rows.astype(np.int64)), ("ivf_offsets", offsets)):
+                np.save(self.path / f"{name}.tmp.npy", array)
+                os.replace(self.path / f"{name}.tmp.npy", self.path / f"{name}.npy")
+            with open(self.path / "ivf.json", "w", encoding="utf-8") as f:
+                json.dump({"count": self.count, "generation": self.generation, "nlist": nlist}, f)
+            self._views.pop("ivf", None)
+            logger.info(f"IVF-Index für {self.path.name} gebaut: {total} Vektoren in {nlist} Clustern")
+
+    def _ivf(self) -> Optional[Dict[str, Any]]:
+        """Gespeicherter IVF-Index; None ohne Index oder wenn seitdem Zeilen entfernt wurden."""
+        if "ivf" not in self._views:
+            ivf = None
+            try:
+                with open(self.path / "ivf.json", "r", encoding="utf-8") as f:
+                    info = json.load(f)
+                if info["count"] <= self.count and info["generation"] == self.generation:
+                    ivf = {
+                        **info,
+                        "centroids": np.load(self.path / "ivf_centroids.npy"),
+                        "rows": np.load(self.path / "ivf_rows.npy", mmap_mode="r"),
+                        "offsets": np.load(self.path / "ivf_offsets.npy")
+                    }
+            except (FileNotFoundError, KeyError):
+                pass
+            self._views["ivf"] = ivf
+        return self._views["ivf"]
+
+    def search(self, queries: np.ndarray, limit: int = 10, metric_type: Optional[str] = None,
+               nprobe: Optional[int] = None) -> List[List[Tuple[int, float]]]:
+        """Sucht die limit nächsten gültigen Zeilen je Anfragevektor; liefert (ID, Distanz) je Treffer.
+
+        Mit IVF-Index werden nur die Cluster der nprobe nächsten Zentren
+        durchsucht (Standard nach INDEX_CONFIG["target_recall"]), mit nprobe=0
+        oder ohne Index alle Zeilen. Metrik ist IP für normierte Embeddings, sonst L2.
+        """
+        metric_type = metric_type or ("IP" if self.normalized else "L2")
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        if metric_type == "IP" and self.normalized:
+            queries = normalize_rows(queries)
+        with self.lock:
+            ivf = self._ivf() if nprobe != 0 else None
+            live = self.live_rows()
+            if ivf is None:
+                return self._scan(queries, live, limit, metric_type)
+            if nprobe is None:
+                index = {"index_type": "IVF_FLAT", "metric_type": metric_type, "params": {"nlist": ivf["nlist"]}}
+                nprobe = search_params(index, limit, INDEX_CONFIG["target_recall"])["params"]["nprobe"]
+            # Gültige Zeilen als Maske, um veraltete Zeilen aus den Clustern zu filtern
+            mask = None
+            if live is not None:
+                mask = np.zeros(self.count, dtype=bool)
+                mask[live] = True
+            tail = np.arange(ivf["count"], self.count)
+            results = []
+            for query in queries:
+                probes = np.argsort(((ivf["centroids"] - query) ** 2).sum(axis=1))[:nprobe]
+                rows = np.concatenate([ivf["rows"][ivf["offsets"][c]:ivf["offsets"][c + 1]] for c in probes] + [tail])
+                if mask is not None:
+                    rows = rows[mask[rows]]
+                # Aufsteigend gelesen greift die Suche möglichst zusammenhängend auf die Datei zu
+                results.extend(self._scan(query[None, :], np.sort(rows), limit, metric_type))
+            return results
+
+    def _scan(self, queries: np.ndarray, rows: Optional[np.ndarray], limit: int,
+              metric_type: str) -> List[List[Tuple[int, float]]]:
+        """Exakte Suche aller Anfragen über alle bzw. die angegebenen Zeilen, blockweise."""
+        vectors = self.vectors
+        total = len(vectors) if rows is None else len(rows)
+        best_keys = np.empty((0, len(queries)), dtype=np.float32)
+        best_rows = np.empty((0, len(queries)), dtype=np.int64)
+        query_norms = (queries * queries).sum(axis=1)
+        for start in range(0, total, self.chunk_rows):
+            if rows is None:
+                chunk_rows = np.arange(start, min(total, start + self.chunk_rows))
+                chunk = vectors[start:start + self.chunk_rows]
+            else:
+                chunk_rows = rows[start:start + self.chunk_rows]
+                chunk = vectors[chunk_rows]
+            products = np.asarray(chunk) @ queries.T
+            if metric_type == "IP":
+                # Größeres inneres Produkt ist besser; Schlüssel zum Sortieren negieren
+                keys = -products
+            else:
+                keys = np.einsum("ij,ij->i", chunk, chunk)[:, None] - 2.0 * products + query_norms
+            # Auch verstreut gelesene Zeilen: das System blendet benachbarte Seiten mit ein
+            self._release(chunk_rows[0], chunk_rows[-1] + 1)
+            keys = np.concatenate([best_keys, keys])
+            candidates = np.concatenate([best_rows, np.broadcast_to(chunk_rows[:, None], products.shape)])
+            if len(keys) > limit:
+                top = np.argpartition(keys, limit - 1, axis=0)[:limit]
+                keys, candidates = np.take_along_axis(keys, top, 0), np.take_along_axis(candidates, top, 0)
+            best_keys, best_rows = keys, candidates
+
+        ids = self.ids
+        sign = -1.0 if metric_type == "IP" else 1.0
+        results = []
+        for q in range(len(queries)):
+            order = np.argsort(best_keys[:, q], kind="stable")
+            results.append([(int(ids[row]), float(sign * key)) for row, key in zip(best_rows[order, q], best_keys[order, q])])
+        return results
+
+    def compact(self) -> None:
+        """Schreibt nur die gültigen Zeilen neu; veraltete und entfernte Zeilen geben ihren Platz frei."""
+        with self.lock:
+            self.commit()
+            rows = self.live_rows()
+            if rows is None and not self.removed:
+                return
+            self._close_files()
+            total = self.count if rows is None else len(rows)
+            names = (_VECTOR_FILE, _ID_FILE, _SOURCE_FILE)
+            sources = self._map(_SOURCE_FILE, np.int32, (self.count,))
+            with open(self.path / f"{_VECTOR_FILE}.tmp", "wb") as vector_file, \
+                    open(self.path / f"{_ID_FILE}.tmp", "wb") as id_file, \
+                    open(self.path / f"{_SOURCE_FILE}.tmp", "wb") as source_file:
+                for start in range(0, total, self.chunk_rows):
+                    chunk = np.arange(start, min(total, start + self.chunk_rows)) if rows is None else rows[start:start + self.chunk_rows]
+                    vector_file.write(np.ascontiguousarray(self.vectors[chunk]).data)
+                    id_file.write(np.ascontiguousarray(self.ids[chunk]).data)
+                    source_file.write(np.ascontiguousarray(sources[chunk]).data)
+                    self._release(chunk[0], chunk[-1] + 1)
+                for f in (vector_file, id_file, source_file):
+                    f.flush()
+                    os.fsync(f.fileno())
+            before = self.count
+            self._views = {}
+            for name in names:
+                os.replace(self.path / f"{name}.tmp", self.path / name)
+            for file_path in list(self.path.glob("id_index.*.npy")) + list(self.path.glob("ivf*")):
+                file_path.unlink()
+            self.count, self.removed = total, {}
+            self.generation += 1
+            self._save_meta()
+            logger.info(f"Embeddings von {self.path.name} verdichtet: {before} -> {total} Zeilen")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rows": self.count,
+            "live": len(self),
+            "dim": self.dim,
+            "model": self.model_name,
+            "bytes": self.count * self.dim * 4,
+            "ivf": self._ivf()["nlist"] if self._ivf() is not None else None
+        }
+
+    def close(self) -> None:
+        """Bestätigt offene Zeilen und schließt die Dateien."""
+        with self.lock:
+            self.commit()
+            self._close_files()
+            self._views = {}
+
+class EmbeddingStore:
+    def __init__(self, root_dir: Path, model_name: str, normalized: bool = True, fsync: bool = True,
+                 chunk_rows: int = 16384):
+        """Embeddings aller Collections als memory-gemappte Matrizen, eine je Unterverzeichnis.
+
+        Die ETL hängt die Embeddings jedes Blocks an; Neuindizierung, Evaluation
+        und lokale Suche öffnen dieselben Dateien, ohne sie in den Speicher zu laden.
+        """
+        self.root_dir = Path(root_dir)
+        self.model_name = model_name
+        self.normalized = normalized
+        self.fsync = fsync
+        self.chunk_rows = chunk_rows
+        self._matrices: Dict[str, EmbeddingMatrix] = {}
+        self._lock = threading.Lock()
+
+    def collections(self) -> List[str]:
+        """Collections mit gespeicherten Embeddings."""
+        if not self.root_dir.exists():
+            return []
+        return sorted(path.name for path in self.root_dir.iterdir() if (path / "meta.json").exists())
+
+    def matrix(self, collection_name: str, dim: Optional[int] = None) -> EmbeddingMatrix:
+        """Matrix einer Collection; ohne dim wird eine vorhandene Matrix zum Lesen geöffnet."""
+        with self._lock:
+            matrix = self._matrices.get(collection_name)
+            if matrix is None or (dim is not None and matrix.dim != dim):
+                if dim is None:
+                    matrix = EmbeddingMatrix(self.root_dir / collection_name, chunk_rows=self.chunk_rows, fsync=self.fsync)
+                else:
+                    matrix = EmbeddingMatrix(self.root_dir / collection_name, dim, self.model_name, self.normalized,
+                                             fsync=self.fsync, chunk_rows=self.chunk_rows)
+                self._matrices[collection_name] = matrix
+            return matrix
+
+    def append(self, collection_name: str, batch: RecordBatch) -> None:
+        """Hängt die Embeddings eines eingebetteten Blocks an."""
+        self.matrix(collection_name, batch.vectors.shape[1]).append(batch.ids, batch.vectors, batch.source_file)
+
+    def remove_source(self, collection_name: str, source_file: str) -> None:
+        if (self.root_dir / collection_name / "meta.json").exists():
+            self.matrix(collection_name).remove_source(source_file)
+
+    def reset(self, collection_name: str) -> None:
+        if (self.root_dir / collection_name / "meta.json").exists():
+            self.matrix(collection_name).reset()
+
+    def commit(self) -> None:
+        """Bestätigt die angehängten Zeilen aller Collections."""
+        with self._lock:
+            matrices = list(self._matrices.values())
+        for matrix in matrices:
+            matrix.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            matrices = list(self._matrices.values())
+            self._matrices = {}
+        for matrix in matrices:
+            matrix.close()
+
+def open_embedding_store() -> Optional[EmbeddingStore]:
+    """Öffnet den Embedding-Speicher aus EMBEDDING_STORE_CONFIG, falls aktiviert."""
+    if not EMBEDDING_STORE_CONFIG["enabled"]:
+        return None
+    return EmbeddingStore(
+        EMBEDDING_STORE_CONFIG["dir"],
+        EMBEDDING_MODEL_NAME,
+        normalized=INDEX_CONFIG["normalize"],
+        fsync=EMBEDDING_STORE_CONFIG["fsync"],
+        chunk_rows=EMBEDDING_STORE_CONFIG["chunk_rows"]
+    )
+
+def parse_args() -> argparse.Namespace:
+    """Liest die Kommandozeilenargumente."""
+    parser = argparse.ArgumentParser(description="Gespeicherte Embeddings verwalten und lokal durchsuchen")
+    parser.add_argument("command", choices=["stats", "index", "compact", "search"], help="Aktion")
+    parser.add_argument("query", nargs="?", default=None, help="Suchtext (nur für search)")
+    parser.add_argument("--collections", nargs="+", default=None, help="Collections (Standard: alle gespeicherten)")
+    parser.add_argument("--nlist", type=int, default=None, help="Cluster des IVF-Index (Standard: 4·√n)")
+    parser.add_argument("--limit", type=int, default=10, help="Treffer je Collection")
+    parser.add_argument("--nprobe", type=int, default=None, help="Durchsuchte Cluster (0 = exakte Suche)")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    logger.remove()
+    for handler in LOG_CONFIG["handlers"]:
+        if handler["sink"] == "sys.stdout":
+            handler["sink"] = sys.stdout
+        logger.add(**handler)
+
+    args = parse_args()
+    store = EmbeddingStore(EMBEDDING_STORE_CONFIG["dir"], EMBEDDING_MODEL_NAME, normalized=INDEX_CONFIG["normalize"],
+                           chunk_rows=EMBEDDING_STORE_CONFIG["chunk_rows"])
+    query_vector = None
+    if args.command == "search":
+        if not args.query:
+            logger.error("search benötigt einen Suchtext")
+            sys.exit(2)
+        from sentence_transformers import SentenceTransformer
+        query_vector = SentenceTransformer(EMBEDDING_MODEL_NAME).encode([args.query])
+    for collection_name in args.collections or store.collections():
+        matrix = store.matrix(collection_name)
+        if args.command == "index":
+            matrix.build_ivf(args.nlist)
+        elif args.command == "compact":
+            matrix.compact()
+        elif args.command == "search":
+            for record_id, distance in matrix.search(query_vector, args.limit, nprobe=args.nprobe)[0]:
+                logger.info(f"{collection_name}: {record_id} ({distance:.4f})")
+            continue
+        logger.info(f"{collection_name}: {matrix.stats()}")
+    store.close()
@@ -0,0 +1,80 @@
+import math
+from typing import Any, Dict
+import numpy as np
+
+# Anteil der Cluster, die eine IVF-Suche je Ziel-Recall durchsucht
+_IVF_PROBE_FRACTIONS = [(0.9, 1 / 64), (0.95, 1 / 32), (0.98, 1 / 16)]
+# HNSW-Suchbreite (ef) je Ziel-Recall
+_HNSW_EF = [(0.9, 64), (0.95, 96), (0.98, 128)]
+
+def choose_index(row_count: int, target_recall: float = 0.95, flat_threshold: int = 50_000,
+                 sq8_threshold: int = 1_000_000, normalized: bool = True,
+                 vector_type: str = "FLOAT_VECTOR") -> Dict[str, Any]:
+    """Wählt Index-Typ, Metrik und Build-Parameter für eine Collection mit row_count Datensätzen.
+
+    - bis flat_threshold: FLAT (exakte Suche, kein IVF-Overhead)
+    - Ziel-Recall ab 0.98: HNSW, M und efConstruction wachsen mit der Größe
+    - bis sq8_threshold: IVF_FLAT, sonst IVF_SQ8 (ein Viertel des Speichers)
+    nlist folgt der Faustregel 4 * sqrt(n). Bei normierten Vektoren ist das
+    innere Produkt ranggleich zum L2-Abstand und wird daher als Metrik verwendet.
+    int8-Vektorfelder (INT8_VECTOR) unterstützt Milvus nur mit HNSW.
+    """
+    metric_type = "IP" if normalized else "L2"
+    large = row_count >= sq8_threshold
+    hnsw = {
+        "index_type": "HNSW",
+        "metric_type": metric_type,
+        "params": {"M": 32 if large else 16, "efConstruction": 360 if large else 200}
+    }
+    if vector_type == "INT8_VECTOR":
+        return hnsw
+    if row_count < flat_threshold:
+        return {"index_type": "FLAT", "metric_type": metric_type, "params": {}}
+    if target_recall >= 0.98:
+        return hnsw
+    nlist = int(min(65536, max(16, 4 * math.sqrt(row_count))))
+    return {
+        "index_type": "IVF_SQ8" if large else "IVF_FLAT",
+        "metric_type": metric_type,
+        "params": {"nlist": nlist}
+    }
+
+def search_params(index: Dict[str, Any], limit: int, target_recall: float = 0.95) -> Dict[str, Any]:
+    """Leitet die Suchparameter (nprobe bzw. ef) aus den gespeicherten Index-Parametern ab."""
+    index_type = index.get("index_type", "")
+    params = index.get("params", {})
+    metric_type = index.get("metric_type", "L2")
+    if index_type.startswith("IVF"):
+        nlist = int(params.get("nlist", 1024))
+        fraction = next((f for recall, f in _IVF_PROBE_FRACTIONS if target_recall <= recall), 1 / 8)
+        nprobe = min(nlist, max(8, math.ceil(nlist * fraction)))
+        return {"metric_type": metric_type, "params": {"nprobe": nprobe}}
+    if index_type == "HNSW":
+        ef = next((ef for recall, ef in _HNSW_EF if target_recall <= recall), 256)
+        return {"metric_type": metric_type, "params": {"ef": max(ef, limit)}}
+    return {"metric_type": metric_type, "params": {}}
+
+def needs_rebuild(current: Dict[str, Any], wanted: Dict[str, Any]) -> bool:
+    """Prüft, ob sich ein Neuaufbau lohnt: anderer Typ oder Metrik bzw. nlist um mehr als Faktor 2 daneben."""
+    if current.get("index_type") != wanted["index_type"] or current.get("metric_type") != wanted["metric_type"]:
+        return True
+    current_nlist = int(current.get("params", {}).get("nlist", 0))
+    wanted_nlist = wanted["params"].get("nlist")
+    if wanted_nlist and current_nlist:
+        return not wanted_nlist / 2 <= current_nlist <= wanted_nlist * 2
+    return False
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """Normiert die Zeilen einer Matrix auf Länge 1; Null-Vektoren bleiben unverändert."""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1.0).astype(vectors.dtype)
+
+def rank_distance(hit: Dict[str, Any]) -> float:
+    """Macht Treffer verschiedener Metriken vergleichbar (kleiner ist besser).
+
+    Für normierte Vektoren gilt ||a - b||² = 2 - 2 * <a, b>; IP-Werte werden
+    daher in den quadrierten L2-Abstand umgerechnet.
+    """
+    if hit.get("metric_type") == "IP":
+        return 2.0 - 2.0 * hit["distance"]
+    return hit["distance"]
@@ -0,0 +1,176 @@
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+from loguru import logger
+
+def completed_future(result: Any = None) -> Future:
+    """Liefert ein bereits abgeschlossenes Future (für synchron speichernde Backends)."""
+    future: Future = Future()
+    future.set_result(result)
+    return future
+
+class AdaptiveBatchSizer:
+    def __init__(self, initial_size: int = 1000, min_size: int = 100, max_size: int = 10000,
+                 target_latency: float = 2.0, max_bytes: int = 32 << 20):
+        """Passt die Blockgröße an die gemessene Latenz und die Nutzdatengröße an."""
+        self.min_size = min_size
+        self.max_size = max_size
+        self.size = max(min_size, min(initial_size, max_size))
+        # Angestrebte Dauer eines Inserts in Sekunden
+        self.target_latency = target_latency
+        # Obergrenze der Nutzdaten pro Insert (Nachrichtenlimit des Servers)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def next_size(self, row_bytes: float) -> int:
+        """Liefert die Größe des nächsten Blocks für Zeilen der angegebenen Größe."""
+        with self._lock:
+            byte_limit = int(self.max_bytes // max(row_bytes, 1.0))
+            return max(self.min_size, min(self.size, byte_limit))
+
+    def record(self, rows: int, seconds: float) -> None:
+        """Wertet die Dauer eines erfolgreichen Inserts aus."""
+        with self._lock:
+            # Kurze Restblöcke sagen wenig über die Latenz voller Blöcke aus
+            if rows < self.size // 2 or seconds <= 0:
+                return
+            # Dauer auf die aktuelle Blockgröße hochrechnen
+            projected = seconds * self.size / rows
+            if projected < self.target_latency / 2:
+                self.size = min(self.max_size, int(self.size * 1.5))
+            elif projected > self.target_latency:
+                self.size = max(self.min_size, int(self.size * self.target_latency / projected))
+
+    def record_failure(self) -> None:
+        """Halbiert die Blockgröße nach einem fehlgeschlagenen Insert."""
+        with self._lock:
+            self.size = max(self.min_size, self.size // 2)
+
+class InsertEngine:
+    def __init__(self, concurrency: int = 4, initial_batch_size: int = 1000, min_batch_size: int = 100,
+                 max_batch_size: int = 10000, target_latency: float = 2.0, max_batch_bytes: int = 32 << 20,
+                 max_retries: int = 5, retry_backoff: float = 0.5, max_backoff: float = 30.0):
+        """Sendet Inserts in adaptiven Blöcken, mit mehreren Blöcken gleichzeitig und Wiederholung bei Fehlern."""
+        self.concurrency = max(1, concurrency)
+        self.sizer = AdaptiveBatchSizer(initial_batch_size, min_batch_size, max_batch_size, target_latency, max_batch_bytes)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="milvus-insert")
+        # Plätze im gemeinsamen Fenster aller Aufrufe: höchstens concurrency Blöcke gleichzeitig unterwegs
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.retries = 0
+        self.failures = 0
+
+    def run(self, send: Callable[[int, int], Any], total: int, row_bytes: float,
+            retryable: Optional[Callable[[Exception], bool]] = None) -> int:
+        """Sendet die Zeilen [0, total) über send(start, stop) und wartet auf das Ende (siehe submit)."""
+        return self.submit(send, total, row_bytes, retryable).result()
+
+    def submit(self, send: Callable[[int, int], Any], total: int, row_bytes: float,
+               retryable: Optional[Callable[[Exception], bool]] = None) -> Future:
+        """Startet das Senden der Zeilen [0, total) über send(start, stop) und liefert ein Future mit der Anzahl Zeilen.
+
+        Die Blöcke aller Aufrufe teilen sich ein Fenster von höchstens concurrency
+        gleichzeitigen Inserts. submit wartet nur, bis im Fenster Platz für den
+        nächsten Block ist, nicht auf das Ende des Inserts; so bleiben auch dann
+        mehrere Blöcke unterwegs, wenn jeder Aufruf nur einen Block umfasst.
+        Schlägt ein Block auch nach allen Wiederholungen fehl, werden die übrigen
+        Blöcke des Aufrufs nicht mehr gestartet und das Future endet mit dem
+        Fehler, sobald die laufenden Blöcke abgeschlossen sind.
+        """
+        result: Future = Future()
+        parts = []
+        start = 0
+        while start < total:
+            stop = min(total, start + self.sizer.next_size(row_bytes))
+            parts.append((start, stop))
+            start = stop
+        if not parts:
+            result.set_result(0)
+            return result
+
+        lock = threading.Lock()
+        state: Dict[str, Any] = {"pending": len(parts), "sent": 0, "error": None}
+
+        def finish(rows: int, error: Optional[BaseException]) -> None:
+            with lock:
+                state["pending"] -= 1
+                state["sent"] += rows
+                if error is not None and state["error"] is None:
+                    state["error"] = error
+                if state["pending"]:
+                    return
+            if state["error"] is not None:
+                result.set_exception(state["error"])
+            else:
+                result.set_result(state["sent"])
+
+        def send_part(start: int, stop: int) -> None:
+            try:
+                rows = self._send_with_retry(send, start, stop, retryable)
+            except Exception as e:
+                self._slots.release()
+                finish(0, e)
+                return
+            self._slots.release()
+            finish(rows, None)
+
+        for start, stop in parts:
+            self._slots.acquire()
+            with lock:
+                failed = state["error"] is not None
+            if failed:
+                # Nach einem endgültigen Fehler keine weiteren Blöcke des Aufrufs starten
+                self._slots.release()
+                finish(0, None)
+                continue
+            self._executor.submit(send_part, start, stop)
+        return result
+
+    def _send_with_retry(self, send: Callable[[int, int], Any], start: int, stop: int,
+                         retryable: Optional[Callable[[Exception], bool]]) -> int:
+        """Sendet einen Block und wiederholt ihn bei Fehlern mit exponentiellem Backoff."""
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            try:
+                send(start, stop)
+            except Exception as e:
+                self.sizer.record_failure()
+                if attempt >= self.max_retries or (retryable is not None and not retryable(e)):
+                    with self._lock:
+                        self.failures += 1
+                    logger.error(f"Insert von {stop - start} Datensätzen endgültig fehlgeschlagen: {str(e)}")
+                    raise
+                # Exponentieller Backoff mit Zufallsanteil, damit parallele Blöcke nicht gleichzeitig wiederholen
+                delay = min(self.max_backoff, self.retry_backoff * 2 ** attempt) * random.uniform(0.5, 1.0)
+                attempt += 1
+                with self._lock:
+                    self.retries += 1
+                logger.warning(f"Insert von {stop - start} Datensätzen fehlgeschlagen, Versuch {attempt} "
+                               f"von {self.max_retries} in {delay:.1f}s: {str(e)}")
+                time.sleep(delay)
+                continue
+
+            self.sizer.record(stop - start, time.monotonic() - started)
+            with self._lock:
+                self.batches += 1
+            return stop - start
+
+    def stats(self) -> Dict[str, int]:
+        """Liefert die Zähler der Insert-Engine."""
+        return {
+            "batches": self.batches,
+            "retries": self.retries,
+            "failures": self.failures,
+            "batch_size": self.sizer.size
+        }
+
+    def close(self) -> None:
+        """Beendet die Insert-Threads."""
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,647 @@
+import ast
+import heapq
+import json
+import math
+import shutil
+import threading
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple, Union
+import numpy as np
+from loguru import logger
+from config import COLLECTION_CONFIGS, INDEX_CONFIG, PROJECTION_CONFIG, QUANTIZATION_CONFIG, SEARCH_CONFIG
+from collection_schema import default_schema
+from index_tuning import choose_index, needs_rebuild, normalize_rows, rank_distance, search_params as search_params_for
+from insert_engine import completed_future
+from metrics import METRICS
+from projection import PCAProjection, fit_projection
+from query_cache import QueryEmbeddingCache
+from quantization import VectorQuantizer, VECTOR_FIELD_TYPES
+from record_batch import RecordBatch
+
+# Numpy-Datentyp und Standardwert je skalarem Feldtyp; VARCHAR und JSON werden als Objekt-Arrays gehalten
+_FIELD_DTYPES: Dict[str, Tuple[Any, Any]] = {
+    "INT64": (np.int64, 0),
+    "FLOAT": (np.float64, 0.0),
+    "BOOL": (np.bool_, False)
+}
+
+# Zeilen je Block bei der exakten Suche und der Cluster-Zuordnung (begrenzt die Zwischenmatrix)
+_CHUNK_ROWS = 65536
+
+def _empty_column(field_type: str, size: int) -> np.ndarray:
+    """Erzeugt eine mit Standardwerten gefüllte Spalte."""
+    if field_type in _FIELD_DTYPES:
+        dtype, default = _FIELD_DTYPES[field_type]
+        return np.full(size, default, dtype=dtype)
+    column = np.empty(size, dtype=object)
+    column[:] = [{} if field_type == "JSON" else "" for _ in range(size)]
+    return column
+
+def _coerce_column(field_type: str, column: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    """Passt eine RecordBatch-Spalte an den Feldtyp an; unpassende Spalten werden zu Standardwerten."""
+    if field_type == "VARCHAR":
+        if column.dtype == object:
+            return column
+        values = np.empty(len(column), dtype=object)
+        values[:] = [str(value) if ok else "" for value, ok in zip(column.tolist(), valid)]
+        return values
+    dtype, default = _FIELD_DTYPES.get(field_type, (None, None))
+    if dtype is None or column.dtype == object or (field_type == "BOOL" and column.dtype.kind != "b"):
+        return _empty_column(field_type, len(column))
+    return column.astype(dtype)
+
+class _FilterCompiler:
+    """Wertet Milvus-Filterausdrücke (Vergleiche, in, and/or/not) spaltenweise als Maske aus."""
+
+    _COMPARE = {
+        ast.Eq: np.equal, ast.NotEq: np.not_equal,
+        ast.Lt: np.less, ast.LtE: np.less_equal,
+        ast.Gt: np.greater, ast.GtE: np.greater_equal
+    }
+
+    def __init__(self, columns: Dict[str, np.ndarray]):
+        self.columns = columns
+
+    def mask(self, expr: str) -> np.ndarray:
+        # Milvus erlaubt && / || sowie true / false
+        source = expr.replace("&&", " and ").replace("||", " or ")
+        try:
+            tree = ast.parse(source, mode="eval")
+        except SyntaxError as e:
+            raise ValueError(f"Ungültiger Filterausdruck: {expr}") from e
+        return np.asarray(self._eval(tree.body), dtype=bool)
+
+    def _eval(self, node: ast.AST) -> Any:
+        if isinstance(node, ast.BoolOp):
+            values = [self._eval(value) for value in node.values]
+            reduce = np.logical_and.reduce if isinstance(node.op, ast.And) else np.logical_or.reduce
+            return reduce(values)
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            return np.logical_not(self._eval(node.operand))
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            return -self._eval(node.operand)
+        if isinstance(node, ast.Compare):
+            result = None
+            left = self._eval(node.left)
+            for op, comparator in zip(node.ops, node.comparators):
+                right = self._eval(comparator)
+                if isinstance(op, (ast.In, ast.NotIn)):
+                    part = np.isin(left, list(right))
+                    if isinstance(op, ast.NotIn):
+                        part = ~part
+                elif type(op) in self._COMPARE:
+                    part = self._COMPARE[type(op)](left, right)
+                else:
+                    raise ValueError(f"Nicht unterstützter Vergleich: {type(op).__name__}")
+                result = part if result is None else np.logical_and(result, part)
+                left = right
+            return result
+        if isinstance(node, ast.Name):
+            if node.id in self.columns:
+                return self.columns[node.id]
+            if node.id in ("true", "false"):
+                return node.id == "true"
+            raise ValueError(f"Unbekanntes Feld im Filter: {node.id}")
+        if isinstance(node, ast.Constant):
+            return node.value
+        if isinstance(node, (ast.List, ast.Tuple)):
+            return [self._eval(element) for element in node.elts]
+        raise ValueError(f"Nicht unterstützter Filterausdruck: {ast.dump(node)}")
+
+class LocalCollection:
+    def __init__(self, name: str, path: Path, fields: List[Dict[str, Any]], index: Optional[Dict[str, Any]] = None):
+        """Collection im Prozess: Vektoren als Matrix im Format des Vektorfelds, skalare Felder als typisierte Arrays.
+
+        Quantisierte Vektoren (float16, int8) werden für die Distanzberechnung
+        blockweise nach float32 zurückgewandelt.
+        """
+        self.name = name
+        self.path = Path(path)
+        self.fields = fields
+        vector_field = next(field for field in fields if field["type"].upper() in VECTOR_FIELD_TYPES.values())
+        self.dim = vector_field["dim"]
+        self.quantizer = VectorQuantizer.for_field_type(vector_field["type"])
+        self.index = index or choose_index(0, normalized=INDEX_CONFIG["normalize"])
+        self.ids = np.empty(0, dtype=np.int64)
+        self.vectors = np.empty((0, self.dim), dtype=self.quantizer.dtype)
+        self.columns: Dict[str, np.ndarray] = {
+            field["name"]: _empty_column(field["type"].upper(), 0) for field in self._scalar_fields()
+        }
+        # PCA-Projektion, wenn das Vektorfeld kleiner als die Embeddings ist (im Collection-Verzeichnis gespeichert)
+        self.projection: Optional[PCAProjection] = None
+        # IVF-Index: Clusterzentren und Cluster je Zeile
+        self.centroids: Optional[np.ndarray] = None
+        self.assignments: Optional[np.ndarray] = None
+        # Angehängte, noch nicht zusammengeführte Blöcke (ids, vectors, columns)
+        self._pending: List[Tuple[np.ndarray, np.ndarray, Dict[str, np.ndarray]]] = []
+        self.dirty = False
+        self.lock = threading.RLock()
+
+    def _scalar_fields(self) -> List[Dict[str, Any]]:
+        return [field for field in self.fields if field["name"] != "id" and field["type"].upper() not in VECTOR_FIELD_TYPES.values()]
+
+    @property
+    def num_entities(self) -> int:
+        with self.lock:
+            return len(self.ids) + sum(len(ids) for ids, _, _ in self._pending)
+
+    def append(self, ids: np.ndarray, vectors: np.ndarray, columns: Dict[str, np.ndarray], upsert: bool = False) -> None:
+        """Hängt Datensätze an; bei upsert werden vorhandene Datensätze mit gleicher ID ersetzt."""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or vectors.shape[1] != self.dim:
+            raise ValueError(f"Vektor-Dimension stimmt nicht überein: {vectors.shape} != (*, {self.dim})")
+        with self.lock:
+            if not self.quantizer.calibrated and len(vectors):
+                self._calibrate(vectors)
+            if upsert:
+                self._consolidate()
+                self._keep(~np.isin(self.ids, ids))
+            self._pending.append((np.asarray(ids, dtype=np.int64), self.quantizer.quantize(vectors), columns))
+            self.dirty = True
+
+    def project(self, vectors: np.ndarray, fit: bool = False) -> np.ndarray:
+        """Projiziert Embeddings auf die Dimension des Vektorfelds; mit fit wird die Projektion beim ersten Block gelernt."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.shape[1] == self.dim:
+            return vectors
+        with self.lock:
+            projection = self.projection
+            if projection is None or projection.input_dim != vectors.shape[1]:
+                if not fit:
+                    raise ValueError(f"Keine Projektion von {vectors.shape[1]} auf {self.dim} Dimensionen für {self.name}")
+                projection = self.projection = fit_projection(
+                    self.name, vectors, self.dim,
+                    metric_type=self.index["metric_type"],
+                    normalize=INDEX_CONFIG["normalize"],
+                    k=PROJECTION_CONFIG["recall_k"],
+                    sample_size=PROJECTION_CONFIG["recall_sample"],
+                    min_recall=PROJECTION_CONFIG["min_recall"]
+                )
+                self.dirty = True
+        return projection.transform(vectors)
+
+    def _calibrate(self, vectors: np.ndarray) -> None:
+        """Kalibriert den Quantisierer am ersten Block und prüft den Recall gegen float32 (Lock muss gehalten werden)."""
+        recall = self.quantizer.calibrate(
+            vectors, self.index["metric_type"], k=QUANTIZATION_CONFIG["recall_k"], sample_size=QUANTIZATION_CONFIG["recall_sample"]
+        )
+        message = f"Recall@{QUANTIZATION_CONFIG['recall_k']} von {self.name} mit {self.quantizer.mode} gegenüber float32: {recall:.3f}"
+        if recall < QUANTIZATION_CONFIG["min_recall"]:
+            logger.warning(f"{message} (unter {QUANTIZATION_CONFIG['min_recall']})")
+        else:
+            logger.info(message)
+
+    def delete(self, expr: str) -> int:
+        """Löscht alle Datensätze, auf die der Filterausdruck zutrifft; liefert deren Anzahl."""
+        with self.lock:
+            self._consolidate()
+            mask = self.filter_mask(expr)
+            self._keep(~mask)
+            self.dirty = True
+            return int(mask.sum())
+
+    def _keep(self, keep: np.ndarray) -> None:
+        """Behält nur die markierten Zeilen (Lock muss gehalten werden)."""
+        if keep.all():
+            return
+        self.ids = self.ids[keep]
+        self.vectors = self.vectors[keep]
+        self.columns = {name: column[keep] for name, column in self.columns.items()}
+        if self.assignments is not None:
+            self.assignments = self.assignments[keep]
+
+    def _consolidate(self) -> None:
+        """Führt angehängte Blöcke mit den bestehenden Arrays zusammen (Lock muss gehalten werden)."""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        self.ids = np.concatenate([self.ids] + [ids for ids, _, _ in pending])
+        new_vectors = np.concatenate([vectors for _, vectors, _ in pending])
+        self.vectors = np.concatenate([self.vectors, new_vectors])
+        self.columns = {
+            name: np.concatenate([column] + [columns[name] for _, _, columns in pending])
+            for name, column in self.columns.items()
+        }
+        if self.centroids is not None:
+            # Neue Zeilen dem nächsten Clusterzentrum zuordnen, statt den Index neu aufzubauen
+            self.assignments = np.concatenate([self.assignments, self._assign(new_vectors)])
+
+    def filter_mask(self, expr: Optional[str]) -> Optional[np.ndarray]:
+        """Wertet einen Filterausdruck aus (None, wenn kein Filter gesetzt ist)."""
+        if not expr:
+            return None
+        with self.lock:
+            self._consolidate()
+            return _FilterCompiler({"id": self.ids, **self.columns}).mask(expr)
+
+    def build_index(self, index: Dict[str, Any]) -> None:
+        """Baut den Index auf: FLAT ohne Struktur, alle übrigen Typen als IVF mit k-Means-Clustern."""
+        with self.lock:
+            self._consolidate()
+            self.index = index
+            self.dirty = True
+            if index["index_type"] == "FLAT" or not len(self.ids):
+                self.centroids = None
+                self.assignments = None
+                return
+            nlist = min(len(self.ids), int(index["params"].get("nlist", 4 * math.sqrt(len(self.ids)))))
+            self.centroids = self._kmeans(nlist)
+            self.assignments = self._assign(self.vectors)
+
+    def _kmeans(self, nlist: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+        """Lernt Clusterzentren mit k-Means auf einer Stichprobe der Vektoren."""
+        rng = np.random.default_rng(seed)
+        sample_size = min(len(self.vectors), max(nlist * 40, 10000))
+        sample = self.quantizer.dequantize(self.vectors[rng.choice(len(self.vectors), sample_size, replace=False)])
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+        for _ in range(iterations):
+            labels = self._nearest_centroids(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=nlist)
+            filled = counts > 0
+            # Leere Cluster behalten ihr bisheriges Zentrum
+            centroids[filled] = sums[filled] / counts[filled, None]
+        return centroids
+
+    @staticmethod
+    def _nearest_centroids(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        # ||x - c||² = ||x||² - 2 x·c + ||c||²; ||x||² ist je Zeile konstant
+        scores = vectors @ centroids.T * -2.0 + (centroids * centroids).sum(axis=1)
+        return scores.argmin(axis=1).astype(np.int32)
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        """Ordnet Vektoren blockweise ihrem nächsten Clusterzentrum zu."""
+        return np.concatenate([
+            self._nearest_centroids(self.quantizer.dequantize(vectors[start:start + _CHUNK_ROWS]), self.centroids)
+            for start in range(0, len(vectors), _CHUNK_ROWS)
+        ] or [np.empty(0, dtype=np.int32)])
+
+    def search(self, queries: np.ndarray, limit: int, filter_expr: Optional[str] = None,
+               params: Optional[Dict[str, Any]] = None) -> List[List[Tuple[int, float]]]:
+        """Sucht die limit nächsten Datensätze je Anfragevektor; liefert (ID, Distanz) je Treffer."""
+        with self.lock:
+            self._consolidate()
+            metric_type = self.index["metric_type"]
+            queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+            if metric_type == "IP":
+                queries = normalize_rows(queries)
+            allowed = self.filter_mask(filter_expr)
+
+            results = []
+            for query in queries:
+                if self.centroids is not None:
+                    # Nur die Cluster der nprobe nächsten Zentren durchsuchen
+                    nprobe = int((params or {}).get("nprobe", 16))
+                    probes = np.argsort(((self.centroids - query) ** 2).sum(axis=1))[:nprobe]
+                    rows = np.flatnonzero(np.isin(self.assignments, probes))
+                else:
+                    rows = None
+                if allowed is not None:
+                    rows = np.flatnonzero(allowed) if rows is None else rows[allowed[rows]]
+                results.append(self._exact(query, rows, limit, metric_type))
+            return results
+
+    def _exact(self, query: np.ndarray, rows: Optional[np.ndarray], limit: int, metric_type: str) -> List[Tuple[int, float]]:
+        """Exakte Suche über alle bzw. die angegebenen Zeilen, blockweise."""
+        total = len(self.ids) if rows is None else len(rows)
+        best_keys = np.empty(0, dtype=np.float32)
+        best_rows = np.empty(0, dtype=np.int64)
+        for start in range(0, total, _CHUNK_ROWS):
+            chunk_rows = np.arange(start, min(total, start + _CHUNK_ROWS)) if rows is None else rows[start:start + _CHUNK_ROWS]
+            vectors = self.quantizer.dequantize(self.vectors[chunk_rows])
+            if metric_type == "IP":
+                # Größeres inneres Produkt ist besser; Schlüssel zum Sortieren negieren
+                keys = -(vectors @ query)
+            else:
+                diff = vectors - query
+                keys = np.einsum("ij,ij->i", diff, diff)
+            keys = np.concatenate([best_keys, keys])
+            candidates = np.concatenate([best_rows, chunk_rows])
+            if len(keys) > limit:
+                top = np.argpartition(keys, limit)[:limit]
+                keys, candidates = keys[top], candidates[top]
+            best_keys, best_rows = keys, candidates
+
+        order = np.argsort(best_keys, kind="stable")
+        sign = -1.0 if metric_type == "IP" else 1.0
+        return [(int(self.ids[row]), float(sign * key)) for row, key in zip(best_rows[order], best_keys[order])]
+
+    def save(self) -> None:
+        """Schreibt die Collection atomar in ihr Verzeichnis (nur nach Änderungen)."""
+        with self.lock:
+            if not self.dirty:
+                return
+            self._consolidate()
+            tmp_path = self.path.with_name(self.path.name + ".tmp")
+            if tmp_path.exists():
+                shutil.rmtree(tmp_path)
+            tmp_path.mkdir(parents=True)
+
+            np.save(tmp_path / "ids.npy", self.ids)
+            np.save(tmp_path / "vectors.npy", np.asarray(self.vectors))
+            if self.projection is not None:
+                self.projection.save(tmp_path / "projection.npz")
+            if self.centroids is not None:
+                np.save(tmp_path / "centroids.npy", self.centroids)
+                np.save(tmp_path / "assignments.npy", self.assignments)
+            for field in self._scalar_fields():
+                name, field_type = field["name"], field["type"].upper()
+                column = self.columns[name]
+                if field_type == "JSON":
+                    column = np.array([json.dumps(value, ensure_ascii=False) for value in column], dtype=str)
+                elif field_type not in _FIELD_DTYPES:
+                    column = np.array(column.tolist(), dtype=str)
+                # Ohne Pickle speichern: Strings als Unicode-Arrays
+                np.save(tmp_path / f"col_{name}.npy", column, allow_pickle=False)
+            with open(tmp_path / "meta.json", "w", encoding="utf-8") as f:
+                json.dump({
+                    "version": 1,
+                    "fields": self.fields,
+                    "index": self.index,
+                    "quantization": self.quantizer.to_dict(),
+                    "count": len(self.ids)
+                }, f, indent=2)
+
+            # Altes Verzeichnis erst nach vollständigem Schreiben ersetzen
+            old_path = self.path.with_name(self.path.name + ".old")
+            if self.path.exists():
+                self.path.rename(old_path)
+            tmp_path.rename(self.path)
+            if old_path.exists():
+                shutil.rmtree(old_path)
+            self.dirty = False
+
+    @classmethod
+    def open(cls, name: str, path: Path) -> "LocalCollection":
+        """Öffnet eine gespeicherte Collection; die Vektoren werden per Memory-Mapping gelesen."""
+        with open(path / "meta.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        collection = cls(name, path, meta["fields"], meta["index"])
+        if meta.get("quantization"):
+            collection.quantizer = VectorQuantizer.from_dict(meta["quantization"])
+        collection.ids = np.load(path / "ids.npy")
+        collection.vectors = np.load(path / "vectors.npy", mmap_mode="r")
+        if (path / "projection.npz").exists():
+            collection.projection = PCAProjection.load(path / "projection.npz")
+        if (path / "centroids.npy").exists():
+            collection.centroids = np.load(path / "centroids.npy")
+            collection.assignments = np.load(path / "assignments.npy")
+        for field in collection._scalar_fields():
+            name, field_type = field["name"], field["type"].upper()
+            column = np.load(path / f"col_{name}.npy", allow_pickle=False)
+            if field_type == "JSON":
+                values = np.empty(len(column), dtype=object)
+                values[:] = [json.loads(value) for value in column.tolist()]
+                column = values
+            elif field_type not in _FIELD_DTYPES:
+                column = column.astype(object)
+            collection.columns[name] = column
+        return collection
+
+class LocalVectorStore:
+    # Eingefügte Datensätze liegen bis flush() nur im Speicher
+    durable_inserts = False
+
+    def __init__(self, root_dir: Path):
+        """Eingebetteter Vektorspeicher mit derselben Schnittstelle wie MilvusClient, ohne Server.
+
+        Jede Collection liegt als Verzeichnis mit NumPy-Dateien unter root_dir.
+        Gesucht wird exakt (FLAT) oder über einen IVF-Index; Filterausdrücke
+        auf typisierten Feldern werden unterstützt (Vergleiche, in, and/or/not).
+        """
+        self.root_dir = Path(root_dir)
+        self.root_dir.mkdir(parents=True, exist_ok=True)
+        self._collections: Dict[str, LocalCollection] = {}
+        self._lock = threading.Lock()
+        # Embeddings wiederholter Anfragetexte, angelegt mit dem Modell der ersten Textsuche
+        self.query_cache: Optional[QueryEmbeddingCache] = None
+        logger.info(f"Lokaler Vektorspeicher in {self.root_dir} initialisiert")
+
+    def _get_collection(self, collection_name: str) -> Optional[LocalCollection]:
+        """Liefert eine Collection, beim ersten Zugriff von der Platte geladen (None, wenn sie nicht existiert)."""
+        with self._lock:
+            collection = self._collections.get(collection_name)
+            if collection is None and (self.root_dir / collection_name / "meta.json").exists():
+                collection = LocalCollection.open(collection_name, self.root_dir / collection_name)
+                self._collections[collection_name] = collection
+            return collection
+
+    def has_collection(self, collection_name: str) -> bool:
+        return self._get_collection(collection_name) is not None
+
+    def create_collection(self, collection_name: str, fields: Optional[List[Dict[str, Any]]] = None, retry_count: int = 0,
+                          expected_rows: int = 0) -> None:
+        """Erstellt eine neue Collection (retry_count nur für die Kompatibilität mit MilvusClient)."""
+        if self._get_collection(collection_name) is not None:
+            logger.info(f"Collection {collection_name} existiert bereits")
+            return
+        if fields is None:
+            fields = default_schema(collection_name)
+        index = self._choose_index(expected_rows)
+        collection = LocalCollection(collection_name, self.root_dir / collection_name, fields, index)
+        collection.dirty = True
+        collection.save()
+        with self._lock:
+            self._collections[collection_name] = collection
+        logger.success(f"Collection {collection_name} erfolgreich erstellt ({index['index_type']})")
+
+    def _choose_index(self, row_count: int) -> Dict[str, Any]:
+        """Wählt den Index wie MilvusClient; HNSW und IVF_SQ8 werden lokal als IVF_FLAT umgesetzt."""
+        index = choose_index(
+            row_count,
+            target_recall=INDEX_CONFIG["target_recall"],
+            flat_threshold=INDEX_CONFIG["flat_threshold"],
+            sq8_threshold=INDEX_CONFIG["sq8_threshold"],
+            normalized=INDEX_CONFIG["normalize"]
+        )
+        if index["index_type"] not in ("FLAT", "IVF_FLAT"):
+            nlist = int(min(65536, max(16, 4 * math.sqrt(row_count))))
+            index = {"index_type": "IVF_FLAT", "metric_type": index["metric_type"], "params": {"nlist": nlist}}
+        return index
+
+    def upsert_data(self, collection_name: str, data: Union[RecordBatch, List[Dict[str, Any]]]) -> None:
+        """Fügt Daten ein oder ersetzt vorhandene Datensätze mit gleicher ID."""
+        self.insert_data(collection_name, data, upsert=True)
+
+    def insert_data(self, collection_name: str, data: Union[RecordBatch, List[Dict[str, Any]]], upsert: bool = False) -> None:
+        """Fügt einen RecordBatch oder eine Liste von Dicts ein (bei upsert=True werden vorhandene IDs ersetzt).
+
+        Fehlt die Collection, wird ein Fehler ausgelöst, damit der Auftrag als fehlgeschlagen gilt.
+        """
+        collection = self._get_collection(collection_name)
+        if collection is None:
+            raise ValueError(f"Collection {collection_name} existiert nicht")
+
+        if isinstance(data, RecordBatch):
+            if data.vectors is None:
+                logger.warning(f"Überspringe Block ohne Vektoren ({len(data)} Datensätze)")
+                return
+            ids, vectors, columns = data.ids, data.vectors, self._batch_columns(collection, data)
+        else:
+            rows = [item for item in data if item.get("vector") is not None]
+            if not rows:
+                logger.warning("Keine gültigen Datensätze zum Einfügen gefunden")
+                return
+            ids = np.array([item["id"] for item in rows], dtype=np.int64)
+            vectors = np.array([np.asarray(item["vector"], dtype=np.float32) for item in rows])
+            columns = self._row_columns(collection, rows)
+
+        collection.append(ids, collection.project(vectors, fit=True), columns, upsert=upsert)
+        logger.debug(f"{len(ids)} Datensätze in {collection_name} eingefügt")
+
+    def submit_batch(self, collection_name: str, batch: RecordBatch, upsert: bool = False) -> Future:
+        """Fügt einen RecordBatch sofort ein und liefert ein abgeschlossenes Future (Schnittstelle wie MilvusClient)."""
+        self.insert_data(collection_name, batch, upsert=upsert)
+        return completed_future(len(batch) if batch.vectors is not None else 0)
+
+    def _batch_columns(self, collection: LocalCollection, batch: RecordBatch) -> Dict[str, np.ndarray]:
+        """Bildet die Spalten eines RecordBatch auf die Felder der Collection ab."""
+        names = {field["name"] for field in collection.fields}
+        # Spalten ohne eigenes Feld werden wie bei Milvus im JSON-Feld metadata abgelegt
+        extra_columns = [name for name in batch.columns if name not in names]
+        columns: Dict[str, np.ndarray] = {}
+        for field in collection._scalar_fields():
+            name, field_type = field["name"], field["type"].upper()
+            if name == "source_file":
+                column = _empty_column("VARCHAR", len(batch))
+                column[:] = batch.source_file or ""
+            elif field_type == "JSON":
+                column = np.empty(len(batch), dtype=object)
+                column[:] = batch.row_values(extra_columns)
+            elif name in batch.columns:
+                column = _coerce_column(field_type, batch.columns[name], batch.valid[name])
+            else:
+                column = _empty_column(field_type, len(batch))
+            columns[name] = column
+        return columns
+
+    def _row_columns(self, collection: LocalCollection, rows: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+        """Bildet zeilenbasierte Datensätze auf die Felder der Collection ab."""
+        columns: Dict[str, np.ndarray] = {}
+        for field in collection._scalar_fields():
+            name, field_type = field["name"], field["type"].upper()
+            column = _empty_column(field_type, len(rows))
+            for i, item in enumerate(rows):
+                value = item.get(name)
+                if value is None:
+                    continue
+                try:
+                    column[i] = value
+                except (TypeError, ValueError):
+                    # Wert passt nicht zum Feldtyp: Standardwert behalten
+                    continue
+            columns[name] = column
+        return columns
+
+    def search(self, collection_name: str, vector: List[float],
+               limit: int = 10, filter_expr: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Führt eine Vektorsuche in der Collection durch."""
+        try:
+            return self._search_collection(collection_name, [vector], limit, filter_expr)[0]
+        except Exception as e:
+            logger.error(f"Fehler bei der Suche in {collection_name}: {str(e)}")
+            return []
+
+    def search_many(self, vectors: Union[np.ndarray, List[List[float]]], collection_names: Optional[List[str]] = None,
+                    limit: int = 10, filter_expr: Optional[str] = None) -> List[List[Dict[str, Any]]]:
+        """Sucht mehrere Anfragevektoren in mehreren Collections und liefert je Anfrage die global besten Treffer."""
+        if collection_names is None:
+            collection_names = list(COLLECTION_CONFIGS)
+        vectors = list(vectors)
+        if not vectors:
+            return []
+
+        merged: List[List[Dict[str, Any]]] = [[] for _ in vectors]
+        for collection_name in collection_names:
+            try:
+                results = self._search_collection(collection_name, vectors, limit, filter_expr)
+            except Exception as e:
+                logger.error(f"Fehler bei der Suche in {collection_name}: {str(e)}")
+                continue
+            for query_hits, hits in zip(merged, results):
+                query_hits.extend(hits)
+        return [heapq.nsmallest(limit, hits, key=rank_distance) for hits in merged]
+
+    def search_text(self, texts: List[str], embedding_model, collection_names: Optional[List[str]] = None,
+                    limit: int = 10, filter_expr: Optional[str] = None) -> List[List[Dict[str, Any]]]:
+        """Sucht Anfragetexte wie search_many; die Texte werden über den Anfrage-Cache eingebettet."""
+        with self._lock:
+            if self.query_cache is None or self.query_cache.embedding_model is not embedding_model:
+                if self.query_cache is not None:
+                    METRICS.remove_collector(self.query_cache.collect)
+                self.query_cache = QueryEmbeddingCache(embedding_model, SEARCH_CONFIG["query_cache_size"])
+                METRICS.add_collector(self.query_cache.collect)
+            query_cache = self.query_cache
+        return self.search_many(query_cache.encode(texts), collection_names, limit, filter_expr)
+
+    def _search_collection(self, collection_name: str, vectors: List[Any], limit: int,
+                           filter_expr: Optional[str]) -> List[List[Dict[str, Any]]]:
+        """Sucht mehrere Vektoren in einer Collection; Trefferformat wie bei MilvusClient."""
+        collection = self._get_collection(collection_name)
+        if collection is None:
+            logger.error(f"Collection {collection_name} existiert nicht")
+            return [[] for _ in vectors]
+
+        params = search_params_for(collection.index, limit, INDEX_CONFIG["target_recall"])
+        metric_type = params["metric_type"]
+        results = collection.search(collection.project(vectors), limit, filter_expr, params["params"])
+        return [
+            [
+                {
+                    "id": record_id,
+                    "distance": distance,
+                    "score": distance,
+                    "metric_type": metric_type,
+                    "collection": collection_name
+                }
+                for record_id, distance in hits
+            ]
+            for hits in results
+        ]
+
+    def tune_index(self, collection_name: str) -> None:
+        """Baut den Index neu auf, wenn er nicht mehr zur Anzahl der Datensätze passt, und speichert die Collection."""
+        collection = self._get_collection(collection_name)
+        if collection is None:
+            logger.warning(f"Collection {collection_name} existiert nicht")
+            return
+        wanted = self._choose_index(collection.num_entities)
+        # Neu zugeordnete Zeilen verschlechtern die Cluster nur langsam; neu aufbauen erst bei deutlicher Abweichung
+        if needs_rebuild(collection.index, wanted) or (wanted["index_type"] != "FLAT" and collection.centroids is None):
+            logger.info(f"Baue Index von {collection_name} für {collection.num_entities} Datensätze neu auf: {wanted}")
+            collection.build_index(wanted)
+        collection.save()
+
+    def delete_file_records(self, collection_name: str, source_file: str) -> None:
+        """Löscht alle Datensätze einer Quelldatei aus einer Collection."""
+        collection = self._get_collection(collection_name)
+        if collection is None:
+            logger.warning(f"Collection {collection_name} existiert nicht")
+            return
+        deleted = collection.delete(f"source_file == {json.dumps(source_file)}")
+        collection.save()
+        logger.info(f"{deleted} Datensätze aus {source_file} in {collection_name} gelöscht")
+
+    def delete_collection(self, collection_name: str) -> None:
+        """Löscht eine Collection samt ihrem Verzeichnis."""
+        with self._lock:
+            self._collections.pop(collection_name, None)
+        path = self.root_dir / collection_name
+        if path.exists():
+            shutil.rmtree(path)
+            logger.info(f"Collection {collection_name} gelöscht")
+
+    def flush(self) -> None:
+        """Speichert alle geänderten Collections."""
+        with self._lock:
+            collections = list(self._collections.values())
+        for collection in collections:
+            collection.save()
+
+    def close(self) -> None:
+        """Speichert alle Änderungen."""
+        if self.query_cache is not None:
+            METRICS.remove_collector(self.query_cache.collect)
+        self.flush()
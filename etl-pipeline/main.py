@@ -1,16 +1,76 @@
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import Callable, List, Dict, Any, Optional, Tuple
 from loguru import logger
 import fnmatch
-from config import COLLECTION_CONFIGS, DATA_DIR, LOG_CONFIG
+import os
+import re
+from config import (
+    CHECKPOINT_CONFIG, COLLECTION_CONFIGS, COLLECTION_PRECEDENCE, DATA_DIR, DATA_SCHEMA_DIR, EMBEDDING_CACHE_CONFIG,
+    EMBEDDING_MODEL_NAME, ETL_CONFIG, INDEX_CONFIG, LOCAL_STORE_DIR, LOG_CONFIG, MANIFEST_FILE, METRICS_CONFIG, WATERMARK_FILE
+)
 from xml_processor import XMLProcessor
 from milvus_client import MilvusClient
-from sentence_transformers import SentenceTransformer
+from local_store import LocalVectorStore
+from parallel_parser import ParallelParser, ParseJob
+from pipeline import ETLPipeline
+from manifest import FileManifest, WatermarkStore
+from checkpoint import CheckpointStore
+from sources import find_sources, source_name
+from embedding_cache import EmbeddingCache
+from embedding_store import EmbeddingStore, open_embedding_store
+from metrics import MetricsExporter
+import argparse
 import sys
 
 def find_xml_files(data_dir: Path) -> List[Path]:
-    """Findet alle XML-Dateien im Verzeichnis."""
-    return list(data_dir.rglob("*.xml"))
+    """Findet alle XML-Dateien im Verzeichnis, auch als .xml.gz und in ZIP-Archiven (ohne sie zu entpacken)."""
+    return find_sources(data_dir)
+
+def build_file_matcher() -> Callable[[str], Optional[str]]:
+    """Kompiliert alle file_patterns zu einem Matcher, der einen Dateinamen genau einer Collection zuordnet."""
+    # Collections ohne explizite Rangfolge werden hinten angehängt
+    ordered = [name for name in COLLECTION_PRECEDENCE if name in COLLECTION_CONFIGS]
+    ordered += [name for name in COLLECTION_CONFIGS if name not in ordered]
+
+    alternatives = []
+    group_names = {}
+    for index, collection_name in enumerate(ordered):
+        patterns = COLLECTION_CONFIGS[collection_name]["file_patterns"]
+        group = f"c{index}"
+        group_names[group] = collection_name
+        alternatives.append(f"(?P<{group}>{'|'.join(fnmatch.translate(p) for p in patterns)})")
+
+    # Alternativen werden von links nach rechts geprüft, daher gewinnt die höchste Rangfolge.
+    # Wie fnmatch.fnmatch ohne Beachtung der Groß-/Kleinschreibung, wo das Dateisystem sie ignoriert (Windows)
+    flags = re.IGNORECASE if os.path.normcase("A") == "a" else 0
+    matcher = re.compile("|".join(alternatives), flags)
+
+    def match(file_name: str) -> Optional[str]:
+        result = matcher.match(file_name)
+        if result is None:
+            return None
+        return group_names[result.lastgroup]
+
+    return match
+
+def route_xml_files(data_dir: Path) -> Dict[str, List[Path]]:
+    """Durchsucht das Datenverzeichnis einmal und ordnet jede XML-Datei genau einer Collection zu."""
+    match = build_file_matcher()
+    routes: Dict[str, List[Path]] = {name: [] for name in COLLECTION_CONFIGS}
+
+    unmatched = 0
+    for xml_file in sorted(find_xml_files(data_dir)):
+        collection_name = match(source_name(xml_file))
+        if collection_name is None:
+            unmatched += 1
+            continue
+        routes[collection_name].append(xml_file)
+
+    for collection_name, files in routes.items():
+        logger.info(f"{len(files)} XML-Dateien für Collection {collection_name}")
+    if unmatched:
+        logger.warning(f"{unmatched} XML-Dateien passen zu keiner Collection")
+    return routes
 
 def cleanup_collections(milvus_client: MilvusClient) -> None:
     """Löscht alle existierenden Collections für einen Neustart."""
@@ -22,62 +82,344 @@ def cleanup_collections(milvus_client: MilvusClient) -> None:
         except Exception as e:
             logger.warning(f"Fehler beim Löschen der Collection {collection_name}: {str(e)}")
 
-def process_collection(collection_name: str, config: Dict[str, Any], milvus_client: MilvusClient, embedding_model) -> None:
-    """Verarbeitet eine einzelne Collection."""
-    logger.info(f"Starte Verarbeitung für Collection: {collection_name}")
-    
-    # Initialisiere XML Processor mit Embedding Model
-    xml_processor = XMLProcessor(embedding_model)
-    
-    # Finde alle XML-Dateien
-    xml_files = find_xml_files(DATA_DIR)
-    if not xml_files:
-        logger.warning(f"Keine XML-Dateien gefunden")
-        return
-    
-    logger.info(f"Gefundene XML-Dateien: {len(xml_files)}")
-    
-    # Verarbeite alle Dateien
-    for xml_file in xml_files:
+def open_embedding_cache(embedding_model) -> Optional[EmbeddingCache]:
+    """Öffnet den persistenten Embedding-Cache, falls aktiviert."""
+    if not EMBEDDING_CACHE_CONFIG["enabled"]:
+        return None
+    return EmbeddingCache(
+        EMBEDDING_CACHE_CONFIG["cache_file"],
+        EMBEDDING_MODEL_NAME,
+        embedding_model.get_sentence_embedding_dimension(),
+        max_entries=EMBEDDING_CACHE_CONFIG["max_entries"]
+    )
+
+def open_checkpoint(mode: str, resume: bool) -> Tuple[Optional[CheckpointStore], bool]:
+    """Öffnet den Checkpoint, falls aktiviert; liefert ihn und ob ein unterbrochener Lauf fortgesetzt wird."""
+    if not CHECKPOINT_CONFIG["enabled"]:
+        return None, False
+    checkpoint = CheckpointStore(CHECKPOINT_CONFIG["checkpoint_file"], DATA_DIR, fsync=CHECKPOINT_CONFIG["fsync"])
+    if resume and checkpoint.can_resume(mode):
+        logger.info("Setze unterbrochenen Lauf fort (--no-resume für einen Neustart)")
+        checkpoint.resume()
+        return checkpoint, True
+    if checkpoint.run is not None:
+        logger.warning(f"Checkpoint des unterbrochenen Laufs ({checkpoint.run.get('mode')}) wird verworfen")
+    checkpoint.discard()
+    return checkpoint, False
+
+def open_staging(stage: bool):
+    """Öffnet das Staging der geparsten Datensätze (erst hier importiert, pyarrow wird nur dafür benötigt)."""
+    if not stage:
+        return None
+    from staging import open_staging as open_staging_writer
+    return open_staging_writer(DATA_DIR)
+
+def process_files(jobs: List[ParseJob], milvus_client: MilvusClient, embedding_model,
+                  embedding_cache: Optional[EmbeddingCache] = None,
+                  watermarks: Optional[Dict[str, str]] = None,
+                  checkpoint: Optional[CheckpointStore] = None, staging=None,
+                  embedding_store: Optional[EmbeddingStore] = None) -> ETLPipeline:
+    """Parst die XML-Dateien parallel, bettet die Datensätze ein und speichert sie in Milvus (als Pipeline).
+
+    Mit watermarks (Delta-Modus) werden nur Datensätze geladen, die neuer als der
+    Watermark ihrer Collection sind, und per Upsert über ihre stabile ID ersetzt.
+    Mit checkpoint wird der Fortschritt je Datei vermerkt; laut Checkpoint
+    fertige Dateien werden übersprungen, angefangene ab dem nächsten Datensatz
+    fortgesetzt. Mit staging (siehe staging.py) werden die eingebetteten
+    Datensätze zusätzlich je Datei als Parquet- bzw. Arrow-Dateien abgelegt,
+    mit embedding_store ihre Embeddings je Collection als memory-gemappte Matrix.
+    Liefert die Pipeline mit gespeicherten Datensätzen, fehlgeschlagenen
+    Aufträgen und den neuesten Änderungszeitpunkten je Collection.
+    """
+    update_field = ETL_CONFIG["update_field"]
+    record_options: Dict[str, Dict[str, Any]] = {}
+    for collection_name, config in COLLECTION_CONFIGS.items():
+        options: Dict[str, Any] = {
+            "key_field": config.get("key_field"),
+            "update_field": update_field,
+            "schema_file": str(DATA_SCHEMA_DIR / config["schema_file"])
+        }
+        if watermarks is not None and watermarks.get(collection_name):
+            options["min_update"] = watermarks[collection_name]
+        record_options[collection_name] = options
+
+    # Embeddings werden im Hauptprozess erzeugt, die Worker parsen nur
+    xml_processor = XMLProcessor(
+        embedding_model,
+        batch_size=ETL_CONFIG["embedding_batch_size"],
+        embedding_cache=embedding_cache,
+        normalize=INDEX_CONFIG["normalize"]
+    )
+    parser = ParallelParser(
+        num_workers=ETL_CONFIG["parse_workers"],
+        batch_size=ETL_CONFIG["insert_batch_size"],
+        queue_size=ETL_CONFIG["parse_queue_size"],
+        data_dir=DATA_DIR,
+        record_options=record_options,
+        split_bytes=ETL_CONFIG["split_bytes"]
+    )
+
+    # Stelle sicher, dass alle Ziel-Collections existieren
+    for collection_name in sorted({collection_name for collection_name, _ in jobs}):
+        milvus_client.create_collection(collection_name)
+
+    pending = jobs
+    if checkpoint is not None:
+        # Seit dem Abbruch geänderte Dateien werden von vorn geladen
+        for job in checkpoint.stale_jobs(jobs):
+            logger.warning(f"{job[1].name} hat sich seit dem unterbrochenen Lauf geändert und wird neu geladen")
+            if watermarks is None:
+                milvus_client.delete_file_records(job[0], checkpoint.key(job))
+                if embedding_store is not None:
+                    embedding_store.remove_source(job[0], checkpoint.key(job))
+            checkpoint.reset(job)
+        checkpoint.commit()
+        pending = [job for job in jobs if not checkpoint.completed(job)]
+        if len(pending) < len(jobs):
+            logger.info(f"{len(jobs) - len(pending)} Dateien laut Checkpoint bereits vollständig geladen")
+        parser.start_offsets = checkpoint.begin(pending)
+        if staging is not None:
+            # Ab der Mitte fortgesetzte Dateien lassen sich nicht vollständig stagen
+            for job in pending:
+                if job[1] in parser.start_offsets:
+                    logger.warning(f"{job[1].name} wird fortgesetzt und deshalb in diesem Lauf nicht gestagt")
+                    staging.skip(job)
+
+    # Parsen, Embedding und Insert laufen überlappend in eigenen Stufen
+    pipeline = ETLPipeline(
+        milvus_client, xml_processor, parser,
+        queue_size=ETL_CONFIG["stage_queue_size"],
+        upsert=watermarks is not None,
+        checkpoint=checkpoint,
+        interval_records=CHECKPOINT_CONFIG["interval_records"],
+        flush_interval_records=CHECKPOINT_CONFIG["flush_interval_records"],
+        staging=staging,
+        embedding_store=embedding_store,
+        insert_window=ETL_CONFIG["insert_window"]
+    )
+    if not jobs:
+        logger.warning("Keine XML-Dateien zu verarbeiten")
+        return pipeline
+    if checkpoint is not None:
+        # Die im Checkpoint vermerkten Datensätze zählen mit
+        pipeline.totals = {job: checkpoint.records(job) for job in jobs if checkpoint.records(job)}
+    try:
+        totals = pipeline.run(pending)
+    finally:
+        if staging is not None:
+            staging.close()
+
+    # Vektorindex an die neue Anzahl Datensätze anpassen
+    for collection_name in sorted({collection_name for collection_name, _ in totals}):
         try:
-            # Prüfe ob die Datei dem Pattern entspricht
-            if not any(fnmatch.fnmatch(xml_file.name, pattern) for pattern in config['file_patterns']):
-                continue
-                
-            logger.info(f"Verarbeite {xml_file.name}...")
-            processed_data = xml_processor.process_xml(xml_file)
-            if processed_data:
-                logger.info(f"Verarbeitete {len(processed_data)} Datensätze aus {xml_file.name}")
-                # Speichere in Milvus
-                milvus_client.insert_data(collection_name, processed_data)
-                logger.success(f"Daten aus {xml_file.name} in {collection_name} gespeichert")
-        except Exception as e:
-            logger.error(f"Fehler bei der Verarbeitung von {xml_file.name}: {str(e)}")
+            milvus_client.tune_index(collection_name)
+        except Exception:
+            # Die Daten sind gespeichert, die Suche funktioniert auch mit dem bisherigen Index
+            logger.warning(f"Index von {collection_name} bleibt unverändert")
+
+    for (collection_name, xml_file), total in totals.items():
+        logger.success(f"{total} Datensätze aus {xml_file.name} in {collection_name} gespeichert")
+    if embedding_cache is not None:
+        logger.info(f"Embedding-Cache: {embedding_cache.stats()}")
+    if isinstance(milvus_client, MilvusClient):
+        logger.info(f"Inserts: {milvus_client.insert_engine.stats()}")
+    return pipeline
+
+def advance_watermarks(watermark_store: WatermarkStore, pipeline: ETLPipeline) -> None:
+    """Setzt die Watermarks der Collections vor, deren Dateien vollständig geladen wurden."""
+    failed_collections = {collection_name for collection_name, _ in pipeline.failed_jobs}
+    for collection_name, latest in pipeline.max_updates.items():
+        if collection_name in failed_collections:
+            logger.warning(f"Watermark für {collection_name} bleibt wegen Fehlern unverändert")
             continue
+        watermark_store.advance(collection_name, latest)
+    watermark_store.save()
+
+def all_jobs(routes: Dict[str, List[Path]]) -> List[ParseJob]:
+    """Erstellt die Parse-Aufträge für alle zugeordneten Dateien."""
+    return [
+        (collection_name, xml_file)
+        for collection_name in COLLECTION_CONFIGS
+        for xml_file in routes[collection_name]
+    ]
+
+def run_full(routes: Dict[str, List[Path]], milvus_client: MilvusClient, embedding_model, manifest: FileManifest,
+             watermark_store: WatermarkStore, embedding_cache: Optional[EmbeddingCache] = None,
+             checkpoint: Optional[CheckpointStore] = None, resume: bool = False, staging=None,
+             embedding_store: Optional[EmbeddingStore] = None) -> ETLPipeline:
+    """Lädt alle Dateien neu, nachdem alle Collections gelöscht wurden.
+
+    Bei der Fortsetzung eines unterbrochenen Laufs bleiben die Collections erhalten.
+    """
+    if not resume:
+        # Bereinige existierende Collections
+        cleanup_collections(milvus_client)
+        # Erst nach der Bereinigung beginnt der Lauf, den ein Checkpoint fortsetzen kann
+        if checkpoint is not None:
+            checkpoint.start("full")
+        if staging is not None:
+            staging.clear()
+        if embedding_store is not None:
+            for collection_name in COLLECTION_CONFIGS:
+                embedding_store.reset(collection_name)
+    manifest.clear()
+    watermark_store.clear()
+
+    # Alle Dateien aller Collections teilen sich einen Parse-Pool
+    jobs = all_jobs(routes)
+    fingerprints = {xml_file: manifest.fingerprint(xml_file) for _, xml_file in jobs}
+    pipeline = process_files(jobs, milvus_client, embedding_model, embedding_cache, checkpoint=checkpoint,
+                             staging=staging, embedding_store=embedding_store)
+
+    for job in jobs:
+        if job not in pipeline.failed_jobs:
+            manifest.record(job[1], job[0], fingerprints[job[1]])
+    manifest.save()
+    advance_watermarks(watermark_store, pipeline)
+    return pipeline
+
+def run_incremental(routes: Dict[str, List[Path]], milvus_client: MilvusClient, embedding_model, manifest: FileManifest,
+                    watermark_store: WatermarkStore, embedding_cache: Optional[EmbeddingCache] = None,
+                    checkpoint: Optional[CheckpointStore] = None, resume: bool = False, staging=None,
+                    embedding_store: Optional[EmbeddingStore] = None) -> ETLPipeline:
+    """Lädt nur neue oder geänderte Dateien und entfernt die Datensätze gelöschter Dateien."""
+    if checkpoint is not None and not resume:
+        checkpoint.start("incremental")
+    to_load, to_delete = manifest.plan(routes)
+
+    # Datensätze geänderter und entfernter Dateien löschen
+    for key, previous in to_delete:
+        try:
+            # Bei der Fortsetzung sind die alten Datensätze bereits gelöscht, die vorhandenen stammen aus diesem Lauf
+            if checkpoint is None or not checkpoint.has_progress(key):
+                milvus_client.delete_file_records(previous["collection"], key)
+                if embedding_store is not None:
+                    embedding_store.remove_source(previous["collection"], key)
+            manifest.remove(key)
+            if staging is not None:
+                staging.remove(key)
+        except Exception as e:
+            logger.error(f"Fehler beim Entfernen der Datensätze aus {key}: {str(e)}")
+
+    jobs = [(collection_name, xml_file) for collection_name, xml_file, _ in to_load]
+    pipeline = process_files(jobs, milvus_client, embedding_model, embedding_cache, checkpoint=checkpoint,
+                             staging=staging, embedding_store=embedding_store)
 
-def main():
-    """Hauptfunktion der ETL-Pipeline."""
-    logger.info("Starte ETL-Pipeline")
+    for collection_name, xml_file, fingerprint in to_load:
+        if (collection_name, xml_file) not in pipeline.failed_jobs:
+            manifest.record(xml_file, collection_name, fingerprint)
+    manifest.save()
+    advance_watermarks(watermark_store, pipeline)
+    return pipeline
+
+def run_delta(routes: Dict[str, List[Path]], milvus_client: MilvusClient, embedding_model,
+              watermark_store: WatermarkStore, embedding_cache: Optional[EmbeddingCache] = None,
+              checkpoint: Optional[CheckpointStore] = None, resume: bool = False,
+              embedding_store: Optional[EmbeddingStore] = None) -> ETLPipeline:
+    """Lädt nur Datensätze, die seit dem letzten Lauf aktualisiert wurden, per Upsert."""
+    if checkpoint is not None and not resume:
+        checkpoint.start("delta")
+    watermarks = {collection_name: watermark_store.get(collection_name) or "" for collection_name in COLLECTION_CONFIGS}
+    pipeline = process_files(all_jobs(routes), milvus_client, embedding_model, embedding_cache, watermarks=watermarks,
+                             checkpoint=checkpoint, embedding_store=embedding_store)
+    advance_watermarks(watermark_store, pipeline)
+    return pipeline
+
+def main(mode: str = "full", local: bool = False, resume: bool = True, stage: bool = False):
+    """Hauptfunktion der ETL-Pipeline (mode: full, incremental oder delta).
+
+    Mit local=True werden die Daten in den lokalen Vektorspeicher statt nach Milvus geschrieben.
+    Ein unterbrochener Lauf desselben Modus wird fortgesetzt, außer mit resume=False.
+    Mit stage=True werden die geparsten Datensätze samt Embeddings zusätzlich gestagt
+    (nur full und incremental; im Delta-Modus wären die Dateien unvollständig).
+    """
+    logger.info(f"Starte ETL-Pipeline (Modus: {mode})")
+    # Fortschritt, Prometheus-Endpunkt und JSON-Snapshot der Metriken
+    exporter = MetricsExporter(**METRICS_CONFIG)
     
-    # Initialisiere Embedding Model
+    # Initialisiere Embedding Model (erst hier importiert, damit Parse-Worker es nicht laden)
     logger.info("Lade Embedding Model...")
-    embedding_model = SentenceTransformer('all-mpnet-base-v2')
+    from sentence_transformers import SentenceTransformer
+    embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+    embedding_cache = open_embedding_cache(embedding_model)
     
-    # Initialisiere Milvus Client
-    milvus_client = MilvusClient()
+    # Initialisiere Milvus Client bzw. den lokalen Vektorspeicher
+    milvus_client = LocalVectorStore(LOCAL_STORE_DIR) if local else MilvusClient()
     
-    # Bereinige existierende Collections
-    cleanup_collections(milvus_client)
-    
-    # Verarbeite jede Collection
-    for collection_name, config in COLLECTION_CONFIGS.items():
-        try:
-            process_collection(collection_name, config, milvus_client, embedding_model)
-        except Exception as e:
-            logger.error(f"Fehler bei der Verarbeitung von Collection {collection_name}: {str(e)}")
+    # Ordne alle Dateien in einem Durchlauf den Collections zu
+    routes = route_xml_files(DATA_DIR)
+    manifest = FileManifest(MANIFEST_FILE, DATA_DIR)
+    watermark_store = WatermarkStore(WATERMARK_FILE)
+    checkpoint, resuming = open_checkpoint(mode, resume)
+    if stage and mode == "delta":
+        logger.warning("Im Delta-Modus wird nicht gestagt")
+        stage = False
+    staging = open_staging(stage)
+    embedding_store = open_embedding_store()
+
+    try:
+        if mode == "incremental":
+            pipeline = run_incremental(routes, milvus_client, embedding_model, manifest, watermark_store, embedding_cache,
+                                       checkpoint, resuming, staging, embedding_store)
+        elif mode == "delta":
+            pipeline = run_delta(routes, milvus_client, embedding_model, watermark_store, embedding_cache,
+                                 checkpoint, resuming, embedding_store)
+        else:
+            pipeline = run_full(routes, milvus_client, embedding_model, manifest, watermark_store, embedding_cache,
+                                checkpoint, resuming, staging, embedding_store)
+        if checkpoint is not None:
+            if pipeline.failed_jobs:
+                # Der nächste Lauf setzt die fehlgeschlagenen Dateien ab ihrem letzten Checkpoint fort
+                logger.warning(f"Checkpoint bleibt wegen {len(pipeline.failed_jobs)} fehlgeschlagener Dateien erhalten")
+            else:
+                checkpoint.finish()
+    except Exception as e:
+        logger.error(f"Fehler bei der Verarbeitung der XML-Dateien: {str(e)}")
+    finally:
+        milvus_client.close()
+        if checkpoint is not None:
+            checkpoint.close()
+        if embedding_cache is not None:
+            embedding_cache.close()
+        if embedding_store is not None:
+            embedding_store.close()
+        exporter.close()
     
     logger.info("ETL-Pipeline abgeschlossen")
 
+def parse_args() -> argparse.Namespace:
+    """Liest die Kommandozeilenargumente."""
+    parser = argparse.ArgumentParser(description="ETL-Pipeline für MaStR XML-Daten nach Milvus")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--incremental",
+        action="store_const", dest="mode", const="incremental",
+        help="Nur neue oder geänderte Dateien laden (laut Manifest), statt alle Collections neu aufzubauen"
+    )
+    mode.add_argument(
+        "--delta",
+        action="store_const", dest="mode", const="delta",
+        help="Nur Datensätze laden, die neuer als der Watermark (DatumLetzteAktualisierung) ihrer Collection sind"
+    )
+    parser.add_argument(
+        "--local",
+        action="store_true",
+        help="In den lokalen Vektorspeicher (state/local_store) statt nach Milvus laden, z.B. für Testläufe ohne Server"
+    )
+    parser.add_argument(
+        "--no-resume",
+        action="store_false", dest="resume",
+        help="Einen unterbrochenen Lauf nicht fortsetzen, sondern neu beginnen (der Checkpoint wird verworfen)"
+    )
+    parser.add_argument(
+        "--stage",
+        action="store_true",
+        help="Geparste Datensätze samt Embeddings zusätzlich als Parquet-/Arrow-Dateien ablegen (state/staging, "
+             "laden mit staging.py)"
+    )
+    parser.set_defaults(mode="full")
+    return parser.parse_args()
+
 if __name__ == "__main__":
     # Entferne alle bestehenden Handler
     logger.remove()
@@ -88,8 +430,10 @@ if __name__ == "__main__":
             handler["sink"] = sys.stdout
         logger.add(**handler)
     
+    args = parse_args()
+
     try:
-        main()
+        main(mode=args.mode, local=args.local, resume=args.resume, stage=args.stage)
     except Exception as e:
         logger.error(f"Kritischer Fehler in der ETL-Pipeline: {str(e)}")
         sys.exit(1) 
\ No newline at end of file
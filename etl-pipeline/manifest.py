@@ -0,0 +1,136 @@
+import json
+import os
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+from loguru import logger
+from sources import content_hash, source_stat
+
+def source_key(xml_file: Path, data_dir: Optional[Path] = None) -> str:
+    """Liefert den stabilen Schlüssel einer Quelldatei (Pfad relativ zum Datenverzeichnis)."""
+    xml_file = Path(xml_file)
+    if data_dir is not None:
+        try:
+            return xml_file.relative_to(data_dir).as_posix()
+        except ValueError:
+            pass
+    return xml_file.as_posix()
+
+class FileManifest:
+    def __init__(self, manifest_file: Path, data_dir: Path):
+        """Lädt das Manifest der bereits geladenen Quelldateien."""
+        self.manifest_file = Path(manifest_file)
+        self.data_dir = data_dir
+        self.files: Dict[str, Dict[str, Any]] = {}
+        if self.manifest_file.exists():
+            try:
+                with open(self.manifest_file, "r", encoding="utf-8") as f:
+                    self.files = json.load(f).get("files", {})
+                logger.info(f"Manifest geladen: {len(self.files)} Dateien")
+            except Exception as e:
+                logger.warning(f"Manifest {self.manifest_file} konnte nicht gelesen werden: {str(e)}")
+                self.files = {}
+
+    def fingerprint(self, xml_file: Path, previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Ermittelt Größe, Änderungszeit und Inhalts-Hash einer Datei (auch eines Archiv-Mitglieds)."""
+        fingerprint: Dict[str, Any] = source_stat(xml_file)
+        # Unveränderte Größe und Änderungszeit: Hash aus dem Manifest übernehmen statt neu zu lesen
+        if previous and previous.get("size") == fingerprint["size"] and previous.get("mtime") == fingerprint["mtime"]:
+            fingerprint["sha256"] = previous["sha256"]
+        else:
+            fingerprint["sha256"] = content_hash(xml_file)
+        return fingerprint
+
+    def plan(self, routes: Dict[str, List[Path]]) -> Tuple[List[Tuple[str, Path, Dict[str, Any]]], List[Tuple[str, Dict[str, Any]]]]:
+        """Vergleicht die gefundenen Dateien mit dem Manifest.
+
+        Liefert die neuen oder geänderten Dateien (Collection, Pfad, Fingerprint)
+        und die Einträge, deren Datensätze gelöscht werden müssen (Schlüssel, alter Eintrag).
+        """
+        to_load: List[Tuple[str, Path, Dict[str, Any]]] = []
+        to_delete: List[Tuple[str, Dict[str, Any]]] = []
+        seen = set()
+        unchanged = 0
+
+        for collection_name, xml_files in routes.items():
+            for xml_file in xml_files:
+                key = source_key(xml_file, self.data_dir)
+                seen.add(key)
+                previous = self.files.get(key)
+                fingerprint = self.fingerprint(xml_file, previous)
+
+                if previous and previous["sha256"] == fingerprint["sha256"] and previous["collection"] == collection_name:
+                    unchanged += 1
+                    # Nur die Änderungszeit hat sich geändert
+                    previous.update(fingerprint)
+                    continue
+
+                if previous:
+                    # Geänderte Datei: alte Datensätze werden vor dem Neuladen ersetzt
+                    to_delete.append((key, previous))
+                to_load.append((collection_name, xml_file, fingerprint))
+
+        # Entfernte Dateien
+        for key, previous in self.files.items():
+            if key not in seen:
+                to_delete.append((key, previous))
+
+        logger.info(f"Inkrementeller Abgleich: {len(to_load)} neue/geänderte, {unchanged} unveränderte, "
+                    f"{len(to_delete)} zu ersetzende/entfernte Dateien")
+        return to_load, to_delete
+
+    def record(self, xml_file: Path, collection_name: str, fingerprint: Dict[str, Any]) -> None:
+        """Vermerkt eine erfolgreich geladene Datei."""
+        self.files[source_key(xml_file, self.data_dir)] = {**fingerprint, "collection": collection_name}
+
+    def remove(self, key: str) -> None:
+        """Entfernt eine Datei aus dem Manifest."""
+        self.files.pop(key, None)
+
+    def clear(self) -> None:
+        """Leert das Manifest (z.B. vor einem vollständigen Neuladen)."""
+        self.files = {}
+
+    def save(self) -> None:
+        """Schreibt das Manifest atomar auf die Platte."""
+        self.manifest_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.manifest_file.with_suffix(".tmp")
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "files": self.files}, f, indent=2, sort_keys=True)
+        os.replace(tmp_file, self.manifest_file)
+        logger.info(f"Manifest gespeichert: {len(self.files)} Dateien")
+
+class WatermarkStore:
+    def __init__(self, watermark_file: Path):
+        """Lädt die höchsten geladenen Änderungszeitpunkte je Collection."""
+        self.watermark_file = Path(watermark_file)
+        self.watermarks: Dict[str, str] = {}
+        if self.watermark_file.exists():
+            try:
+                with open(self.watermark_file, "r", encoding="utf-8") as f:
+                    self.watermarks = json.load(f).get("watermarks", {})
+                logger.info(f"Watermarks geladen: {self.watermarks}")
+            except Exception as e:
+                logger.warning(f"Watermarks {self.watermark_file} konnten nicht gelesen werden: {str(e)}")
+                self.watermarks = {}
+
+    def get(self, collection_name: str) -> Optional[str]:
+        """Liefert den Watermark einer Collection (None, wenn noch nie geladen)."""
+        return self.watermarks.get(collection_name)
+
+    def advance(self, collection_name: str, latest: str) -> None:
+        """Setzt den Watermark einer Collection vor, niemals zurück."""
+        if latest and latest > self.watermarks.get(collection_name, ""):
+            self.watermarks[collection_name] = latest
+
+    def clear(self) -> None:
+        """Setzt alle Watermarks zurück (z.B. vor einem vollständigen Neuladen)."""
+        self.watermarks = {}
+
+    def save(self) -> None:
+        """Schreibt die Watermarks atomar auf die Platte."""
+        self.watermark_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.watermark_file.with_suffix(".tmp")
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "watermarks": self.watermarks}, f, indent=2, sort_keys=True)
+        os.replace(tmp_file, self.watermark_file)
+        logger.info(f"Watermarks gespeichert: {self.watermarks}")
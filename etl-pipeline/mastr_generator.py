@@ -0,0 +1,302 @@
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence
+import numpy as np
+from loguru import logger
+from config import COLLECTION_CONFIGS, ETL_CONFIG
+
+# Datensätze, die gemeinsam erzeugt und geschrieben werden
+_CHUNK_SIZE = 10_000
+
+class FieldSpec(NamedTuple):
+    """Ein Feld eines synthetischen Datensatzes.
+
+    values erzeugt n Rohwerte als Strings, fill ist der Anteil der Datensätze,
+    in denen das Feld vorkommt (MaStR lässt leere Felder im Export weg).
+    """
+    tag: str
+    xsd_type: str
+    values: Callable[[np.random.Generator, int], List[str]]
+    fill: float = 1.0
+
+class CollectionTemplate(NamedTuple):
+    """Aufbau des MaStR-Exports einer Collection: Wurzel, Datensatz-Element und Felder."""
+    root: str
+    element: str
+    fields: Sequence[FieldSpec]
+
+def _dates(first_year: int, last_year: int) -> Callable[[np.random.Generator, int], List[str]]:
+    """Gleichverteilte Tage (YYYY-MM-DD) zwischen dem 1.1. von first_year und dem 31.12. von last_year."""
+    start = np.datetime64(f"{first_year}-01-01")
+    days = int((np.datetime64(f"{last_year + 1}-01-01") - start).astype(int))
+    return lambda rng, n: (start + rng.integers(0, days, n)).astype(str).tolist()
+
+def _datetimes(first_year: int, last_year: int) -> Callable[[np.random.Generator, int], List[str]]:
+    """Zeitpunkte mit sieben Nachkommastellen wie in DatumLetzteAktualisierung."""
+    start = np.datetime64(f"{first_year}-01-01T00:00:00")
+    seconds = int((np.datetime64(f"{last_year + 1}-01-01T00:00:00") - start).astype(int))
+
+    def generate(rng: np.random.Generator, n: int) -> List[str]:
+        stamps = (start + rng.integers(0, seconds, n)).astype(str)
+        fractions = rng.integers(0, 10_000_000, n)
+        return [f"{stamp}.{fraction:07d}" for stamp, fraction in zip(stamps.tolist(), fractions.tolist())]
+    return generate
+
+def _decimals(median: float, sigma: float, digits: int = 3) -> Callable[[np.random.Generator, int], List[str]]:
+    """Log-normalverteilte Dezimalzahlen (z.B. Leistungen in kW: viele kleine, wenige große Anlagen)."""
+    return lambda rng, n: np.char.mod(f"%.{digits}f", rng.lognormal(np.log(median), sigma, n)).tolist()
+
+def _codes(values: Sequence[str], weights: Optional[Sequence[float]] = None) -> Callable[[np.random.Generator, int], List[str]]:
+    """Katalogwerte (MaStR speichert Auswahlfelder als Zahlencodes) mit optionaler Gewichtung."""
+    p = None if weights is None else np.asarray(weights, dtype=float) / sum(weights)
+    return lambda rng, n: np.asarray(values)[rng.choice(len(values), n, p=p)].tolist()
+
+def _bools(p_true: float) -> Callable[[np.random.Generator, int], List[str]]:
+    """Wahrheitswerte als 1/0 wie im MaStR-Export."""
+    return lambda rng, n: np.where(rng.random(n) < p_true, "1", "0").tolist()
+
+def _numbers(prefix: str) -> Callable[[np.random.Generator, int], List[str]]:
+    """Zufällige MaStR-Nummern aus Präfix und zwölf Ziffern (z.B. SEE123456789012)."""
+    return lambda rng, n: [f"{prefix}{number:012d}" for number in rng.integers(0, 10 ** 12, n).tolist()]
+
+def _hex_keys(prefix: str, length: int) -> Callable[[np.random.Generator, int], List[str]]:
+    """Zufällige Schlüssel aus Präfix und Hexadezimalziffern (z.B. Anlagenschlüssel)."""
+    def generate(rng: np.random.Generator, n: int) -> List[str]:
+        digits = rng.integers(0, 16, (n, length))
+        return [prefix + "".join(row) for row in np.asarray(list("0123456789ABCDEF"))[digits].tolist()]
+    return generate
+
+def _names(prefixes: Sequence[str], places: Sequence[str]) -> Callable[[np.random.Generator, int], List[str]]:
+    """Bezeichnungen aus Präfix und Ort (z.B. "Windpark Lichtenau")."""
+    def generate(rng: np.random.Generator, n: int) -> List[str]:
+        first = rng.choice(len(prefixes), n)
+        second = rng.choice(len(places), n)
+        return [f"{prefixes[i]} {places[j]}" for i, j in zip(first.tolist(), second.tolist())]
+    return generate
+
+_PLACES = [
+    "Lichtenau", "Neuenkirchen", "Altenberg", "Bergheim", "Hohenwarth", "Krummhörn", "Wittstock", "Emden",
+    "Zschornewitz", "Schönefeld", "Bad Berleburg", "Reußenköge", "Feldheim", "Brandis", "Weißenfels", "Sonnenfeld"
+]
+
+def _eeg_fields(capacity_median: float, capacity_sigma: float) -> List[FieldSpec]:
+    """Gemeinsame Felder aller EEG-Anlagen (Anlagen*Eeg*-Exporte)."""
+    return [
+        FieldSpec("Registrierungsdatum", "xs:date", _dates(2019, 2025)),
+        FieldSpec("DatumLetzteAktualisierung", "xs:dateTime", _datetimes(2019, 2025)),
+        FieldSpec("EegInbetriebnahmedatum", "xs:date", _dates(2000, 2025), 0.97),
+        FieldSpec("AnlagenschluesselEeg", "xs:string", _hex_keys("E", 32), 0.9),
+        FieldSpec("AnlagenkennzifferAnlagenregister", "xs:string", _numbers("AR"), 0.3),
+        FieldSpec("InstallierteLeistung", "xs:decimal", _decimals(capacity_median, capacity_sigma)),
+        # 35: in Betrieb, 31: in Planung, 37: vorübergehend stillgelegt, 38: endgültig stillgelegt
+        FieldSpec("AnlageBetriebsstatus", "xs:int", _codes(["35", "31", "37", "38"], [0.9, 0.04, 0.02, 0.04]), 0.95),
+        FieldSpec("VerknuepfteEinheitenMaStRNummern", "xs:string", _numbers("SEE")),
+        FieldSpec("InanspruchnahmeZahlungNachEeg", "xs:boolean", _bools(0.85), 0.6),
+        FieldSpec("NetzbetreiberpruefungStatus", "xs:int", _codes(["2954", "2955"], [0.8, 0.2]), 0.8)
+    ]
+
+# Aufbau der Exporte je Collection; das Schlüsselfeld (key_field) ergänzt generate_file
+COLLECTION_TEMPLATES: Dict[str, CollectionTemplate] = {
+    "solar_anlagen": CollectionTemplate("AnlagenEegSolar", "AnlageEegSolar", _eeg_fields(9.8, 1.1) + [
+        FieldSpec("AnlageEegSolarLeistungsbegrenzung", "xs:int", _codes(["802", "803", "804", "805"]), 0.4),
+        FieldSpec("ZugeordneteGebotsmenge", "xs:decimal", _decimals(750.0, 0.8), 0.02),
+        FieldSpec("Zuschlagnummer", "xs:string", _hex_keys("SOL", 10), 0.02),
+        FieldSpec("AusschreibungZuschlag", "xs:boolean", _bools(0.05), 0.3)
+    ]),
+    "wind_anlagen": CollectionTemplate("AnlagenEegWind", "AnlageEegWind", _eeg_fields(2300.0, 0.5) + [
+        FieldSpec("PrototypAnlage", "xs:boolean", _bools(0.02), 0.7),
+        FieldSpec("PilotAnlage", "xs:boolean", _bools(0.01), 0.5),
+        FieldSpec("VerhaeltnisErtragsschaetzungReferenzertrag", "xs:decimal", _decimals(0.85, 0.15), 0.3),
+        FieldSpec("VerhaeltnisReferenzertragErtrag5Jahre", "xs:decimal", _decimals(0.8, 0.2), 0.2),
+        FieldSpec("Zuschlagnummer", "xs:string", _hex_keys("WIN", 10), 0.35),
+        FieldSpec("AusschreibungZuschlag", "xs:boolean", _bools(0.4), 0.6)
+    ]),
+    "biomasse_anlagen": CollectionTemplate("AnlagenEegBiomasse", "AnlageEegBiomasse", _eeg_fields(500.0, 0.9) + [
+        FieldSpec("AusschliesslicheVerwendungBiomasse", "xs:boolean", _bools(0.9), 0.8),
+        FieldSpec("BiogasInanspruchnahmeFlexiPraemie", "xs:boolean", _bools(0.5), 0.6),
+        FieldSpec("BiogasDatumInanspruchnahmeFlexiPraemie", "xs:date", _dates(2012, 2025), 0.3),
+        FieldSpec("BiogasGaserzeugungskapazitaet", "xs:decimal", _decimals(1100.0, 0.7), 0.4),
+        FieldSpec("BiomethanErstmaligerEinsatz", "xs:date", _dates(2008, 2025), 0.1),
+        FieldSpec("Zuschlagnummer", "xs:string", _hex_keys("BIO", 10), 0.05)
+    ]),
+    "wasser_anlagen": CollectionTemplate("AnlagenEegWasser", "AnlageEegWasser", _eeg_fields(90.0, 1.5) + [
+        FieldSpec("ErtuechtigungIds", "xs:string", _numbers("ERT"), 0.05)
+    ]),
+    "geothermie_anlagen": CollectionTemplate(
+        "AnlagenEegGeothermieGrubengasDruckentspannung", "AnlageEegGeothermieGrubengasDruckentspannung",
+        _eeg_fields(1400.0, 0.8)
+    ),
+    "netzanschlusspunkte": CollectionTemplate("Netzanschlusspunkte", "Netzanschlusspunkt", [
+        FieldSpec("DatumLetzteAktualisierung", "xs:dateTime", _datetimes(2019, 2025)),
+        FieldSpec("NetzanschlusspunktBezeichnung", "xs:string", _names(["NAP", "Umspannwerk", "Trafostation"], _PLACES), 0.7),
+        FieldSpec("LokationMaStRNummer", "xs:string", _numbers("SEL")),
+        # 2786: Stromerzeugungslokation, 2787: Stromverbrauchslokation, 2788/2789: Gas
+        FieldSpec("Lokationtyp", "xs:int", _codes(["2786", "2787", "2788", "2789"], [0.85, 0.1, 0.03, 0.02])),
+        FieldSpec("NetzMaStRNummer", "xs:string", _numbers("SNE")),
+        FieldSpec("Messlokation", "xs:string", _hex_keys("DE", 31), 0.6),
+        # 350-356: Höchst- bis Niederspannung
+        FieldSpec("Spannungsebene", "xs:int", _codes([str(code) for code in range(350, 357)], [1, 2, 3, 6, 10, 18, 60]), 0.9),
+        FieldSpec("MaximaleEinspeiseleistung", "xs:decimal", _decimals(30.0, 1.6), 0.8),
+        FieldSpec("MaximaleAusspeiseleistung", "xs:decimal", _decimals(15.0, 1.4), 0.3),
+        FieldSpec("Nettoengpassleistung", "xs:decimal", _decimals(25.0, 1.6), 0.2),
+        FieldSpec("Netzanschlusskapazitaet", "xs:decimal", _decimals(40.0, 1.5), 0.3),
+        FieldSpec("Gasqualitaet", "xs:int", _codes(["1077", "1078"]), 0.03),
+        FieldSpec("NetzanschlusspunktOderBilanzierungsgebiet", "xs:boolean", _bools(0.05), 0.2)
+    ]),
+    "netze": CollectionTemplate("Netze", "Netz", [
+        FieldSpec("DatumLetzteAktualisierung", "xs:dateTime", _datetimes(2019, 2025)),
+        FieldSpec("Bezeichnung", "xs:string", _names(["Stromnetz", "Gasnetz", "Verteilnetz", "Arealnetz"], _PLACES)),
+        # 2: Strom, 3: Gas
+        FieldSpec("Sparte", "xs:int", _codes(["2", "3"], [0.7, 0.3])),
+        FieldSpec("KundenAngeschlossen", "xs:boolean", _bools(0.95)),
+        FieldSpec("GeschlossenesVerteilnetz", "xs:boolean", _bools(0.1)),
+        FieldSpec("Marktgebiet", "xs:string", _codes(["THE", "NCG", "GASPOOL"], [0.8, 0.1, 0.1]), 0.3),
+        # 1400-1415: Bundesländer
+        FieldSpec("Bundesland", "xs:int", _codes([str(code) for code in range(1400, 1416)]), 0.9)
+    ])
+}
+
+# Präfix der generierten Schlüssel je Schlüsselfeld
+_KEY_PREFIXES = {
+    "EegMaStRNummer": "EEG",
+    "NetzanschlusspunktMastrNummer": "SAN",
+    "MastrNummer": "SNE"
+}
+
+def parse_count(value: str) -> int:
+    """Liest eine Anzahl wie 10000, 10k oder 10M."""
+    value = value.strip().lower().replace("_", "")
+    factor = {"k": 1_000, "m": 1_000_000}.get(value[-1:], 1)
+    count = int(float(value[:-1] if factor > 1 else value) * factor)
+    if count <= 0:
+        raise argparse.ArgumentTypeError(f"Anzahl muss positiv sein: {value}")
+    return count
+
+def _template_fields(collection_name: str) -> List[FieldSpec]:
+    """Felder einer Collection, beginnend mit dem fachlichen Schlüssel."""
+    key_field = COLLECTION_CONFIGS[collection_name]["key_field"]
+    return [FieldSpec(key_field, "xs:string", None)] + list(COLLECTION_TEMPLATES[collection_name].fields)
+
+def write_schema(collection_name: str, schema_dir: Path) -> Path:
+    """Schreibt eine zur generierten XML passende XSD unter dem Namen aus COLLECTION_CONFIGS."""
+    template = COLLECTION_TEMPLATES[collection_name]
+    path = Path(schema_dir) / COLLECTION_CONFIGS[collection_name]["schema_file"]
+    path.parent.mkdir(parents=True, exist_ok=True)
+    elements = "\n".join(
+        f'              <xs:element name="{field.tag}" type="{field.xsd_type}" minOccurs="{0 if field.fill < 1 else 1}"/>'
+        for field in _template_fields(collection_name)
+    )
+    path.write_text(
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema" elementFormDefault="qualified">\n'
+        f'  <xs:element name="{template.root}">\n'
+        '    <xs:complexType>\n'
+        '      <xs:sequence>\n'
+        f'        <xs:element name="{template.element}" minOccurs="0" maxOccurs="unbounded">\n'
+        '          <xs:complexType>\n'
+        '            <xs:sequence>\n'
+        f'{elements}\n'
+        '            </xs:sequence>\n'
+        '          </xs:complexType>\n'
+        '        </xs:element>\n'
+        '      </xs:sequence>\n'
+        '    </xs:complexType>\n'
+        '  </xs:element>\n'
+        '</xs:schema>\n',
+        encoding="utf-8"
+    )
+    return path
+
+def generate_file(collection_name: str, path: Path, records: int, first_key: int = 0, seed: int = 0,
+                  encoding: str = "utf-16") -> int:
+    """Schreibt records synthetische Datensätze einer Collection im Aufbau des MaStR-Gesamtdatenexports.
+
+    Die Schlüssel sind fortlaufend ab first_key und damit über mehrere Dateien
+    eindeutig. Geschrieben wird blockweise, der Speicherbedarf hängt nicht von
+    records ab. Wie der Gesamtdatenexport ist die Datei standardmäßig UTF-16-kodiert.
+    """
+    template = COLLECTION_TEMPLATES[collection_name]
+    fields = _template_fields(collection_name)
+    key_prefix = _KEY_PREFIXES.get(fields[0].tag, "KEY")
+    rng = np.random.default_rng([seed, first_key])
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(path, "w", encoding=encoding) as f:
+        f.write(f'<?xml version="1.0" encoding="{encoding}"?>\n<{template.root}>\n')
+        for start in range(0, records, _CHUNK_SIZE):
+            n = min(_CHUNK_SIZE, records - start)
+            keys = range(first_key + start, first_key + start + n)
+            columns = [[f"<{fields[0].tag}>{key_prefix}{key:012d}</{fields[0].tag}>" for key in keys]]
+            for field in fields[1:]:
+                present = rng.random(n) < field.fill
+                values = field.values(rng, n)
+                columns.append([
+                    f"<{field.tag}>{value}</{field.tag}>" if ok else ""
+                    for value, ok in zip(values, present.tolist())
+                ])
+            f.write("".join(
+                f"  <{template.element}>{''.join(row)}</{template.element}>\n" for row in zip(*columns)
+            ))
+        f.write(f"</{template.root}>\n")
+    return records
+
+def generate_dataset(output_dir: Path, records: int, collections: Optional[List[str]] = None,
+                     records_per_file: int = 100_000, seed: int = 0, encoding: str = "utf-16") -> Dict[str, object]:
+    """Erzeugt XML-Dateien und XSDs für mehrere Collections und beschreibt sie in dataset.json.
+
+    records gilt je Collection. Die Dateien liegen wie im Datenverzeichnis der
+    Pipeline im data_dir der Collection und heißen wie die Teile des
+    Gesamtdatenexports (z.B. AnlagenEegSolar_1.xml), sodass route_xml_files
+    sie zuordnet. dataset.json wird zuletzt geschrieben und markiert einen
+    vollständigen Datensatz.
+    """
+    output_dir = Path(output_dir)
+    collections = collections or list(COLLECTION_TEMPLATES)
+    schema_dir = output_dir / "schema"
+    files: Dict[str, List[str]] = {}
+    for collection_name in collections:
+        write_schema(collection_name, schema_dir)
+        template = COLLECTION_TEMPLATES[collection_name]
+        data_dir = output_dir / "data" / COLLECTION_CONFIGS[collection_name]["data_dir"]
+        files[collection_name] = []
+        for part, start in enumerate(range(0, records, records_per_file), start=1):
+            path = data_dir / f"{template.root}_{part}.xml"
+            generate_file(collection_name, path, min(records_per_file, records - start), start, seed, encoding)
+            files[collection_name].append(str(path.relative_to(output_dir)))
+        logger.info(f"{records} Datensätze für {collection_name} in {len(files[collection_name])} Dateien erzeugt")
+
+    dataset = {
+        "records": records,
+        "records_per_file": records_per_file,
+        "seed": seed,
+        "encoding": encoding,
+        "update_field": ETL_CONFIG["update_field"],
+        "schema_dir": "schema",
+        "files": files
+    }
+    (output_dir / "dataset.json").write_text(json.dumps(dataset, indent=2), encoding="utf-8")
+    return dataset
+
+def parse_args() -> argparse.Namespace:
+    """Liest die Kommandozeilenargumente."""
+    parser = argparse.ArgumentParser(description="Erzeugt synthetische MaStR-XML-Dateien für Tests und Benchmarks")
+    parser.add_argument("output_dir", type=Path, help="Zielverzeichnis (data/, schema/ und dataset.json)")
+    parser.add_argument("--records", type=parse_count, default=10_000, help="Datensätze je Collection, z.B. 10k oder 10M")
+    parser.add_argument(
+        "--collections", nargs="+", choices=sorted(COLLECTION_TEMPLATES), default=None,
+        help="Zu erzeugende Collections (Standard: alle)"
+    )
+    parser.add_argument("--records-per-file", type=parse_count, default=100_000, help="Datensätze je XML-Datei")
+    parser.add_argument("--seed", type=int, default=0, help="Startwert des Zufallsgenerators")
+    parser.add_argument("--encoding", default="utf-16", choices=["utf-16", "utf-8"], help="Zeichenkodierung der XML-Dateien")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    try:
+        generate_dataset(args.output_dir, args.records, args.collections, args.records_per_file, args.seed, args.encoding)
+    except KeyboardInterrupt:
+        logger.warning("Abgebrochen")
+        sys.exit(1)
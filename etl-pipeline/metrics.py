@@ -0,0 +1,372 @@
+import json
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from loguru import logger
+
+# Obergrenzen der Histogramm-Buckets in Sekunden
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+# Art und Beschreibung der Metriken der ETL (für # HELP / # TYPE im Prometheus-Format)
+METRIC_DEFINITIONS: Dict[str, Tuple[str, str]] = {
+    "etl_stage_seconds": ("histogram", "Dauer einer Pipeline-Stufe (parse, convert, embed, insert) je Block in Sekunden"),
+    "etl_records_total": ("counter", "Verarbeitete Datensätze je Stufe"),
+    "etl_bytes_total": ("counter", "Verarbeitete Bytes je Stufe (parse: XML-Dateien, insert: Nutzdaten)"),
+    "etl_files_total": ("counter", "Vollständig geparste XML-Dateien"),
+    "etl_queue_depth": ("gauge", "Wartende Blöcke je Queue zwischen den Stufen"),
+    "etl_milvus_call_seconds": ("histogram", "Dauer der Milvus-Aufrufe je Operation in Sekunden"),
+    "etl_milvus_call_errors_total": ("counter", "Fehlgeschlagene Milvus-Aufrufe je Operation"),
+    "process_resident_memory_bytes": ("gauge", "Aktueller Speicherbedarf (RSS) des Prozesses in Bytes"),
+    "process_peak_resident_memory_bytes": ("gauge", "Höchster Speicherbedarf (RSS) des Prozesses in Bytes")
+}
+
+# Label-Paare einer Zeitreihe, sortiert nach Namen
+Labels = Tuple[Tuple[str, str], ...]
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+def current_rss_bytes() -> Optional[int]:
+    """Aktueller Speicherbedarf (RSS) des Prozesses in Bytes, None wenn nicht messbar."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        return None
+
+def peak_rss_bytes() -> Optional[int]:
+    """Höchster Speicherbedarf (RSS) des Prozesses in Bytes, None wenn nicht messbar."""
+    try:
+        import resource
+    except ImportError:
+        resource = None
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux meldet KiB, macOS Bytes
+        return peak if sys.platform == "darwin" else peak * 1024
+    try:
+        import psutil
+        # Windows: höchstes Working Set
+        return psutil.Process().memory_info().peak_wset
+    except (ImportError, AttributeError):
+        return None
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        """Zählt Messwerte je Bucket (nicht kumuliert) sowie Anzahl und Summe."""
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Schätzt ein Quantil als Obergrenze des Buckets, in dem es liegt (None über dem größten Bucket)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return None
+
+class MetricsRegistry:
+    def __init__(self):
+        """Zähler, Messwerte und Histogramme der ETL, threadsicher und ohne Abhängigkeiten.
+
+        Jede Zeitreihe wird über Metrikname und Labels (z.B. stage="parse")
+        angesprochen. Collectoren werden vor jedem Export aufgerufen und setzen
+        Messwerte, die nur zum Zeitpunkt des Exports interessieren (Queue-Tiefen, RSS).
+        """
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._gauges: Dict[Tuple[str, Labels], float] = {}
+        self._histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self._collectors: List[Callable[["MetricsRegistry"], None]] = []
+
+    def inc(self, name: str, value: float = 1.0, **labels: Any) -> None:
+        """Erhöht einen Zähler."""
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, **labels: Any) -> None:
+        """Setzt einen Messwert."""
+        with self._lock:
+            self._gauges[(name, _labels(labels))] = value
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        """Trägt einen Messwert (z.B. eine Dauer in Sekunden) in ein Histogramm ein."""
+        key = (name, _labels(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, errors: Optional[str] = None, **labels: Any) -> Iterator[None]:
+        """Misst die Dauer des Blocks; bei einer Ausnahme wird zusätzlich der Zähler errors erhöht."""
+        started = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            if errors is not None:
+                self.inc(errors, **labels)
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def counter(self, name: str, **labels: Any) -> float:
+        """Liefert den Stand eines Zählers (0, wenn er noch nicht erhöht wurde)."""
+        with self._lock:
+            return self._counters.get((name, _labels(labels)), 0.0)
+
+    def gauge(self, name: str, **labels: Any) -> Optional[float]:
+        with self._lock:
+            return self._gauges.get((name, _labels(labels)))
+
+    def add_collector(self, collector: Callable[["MetricsRegistry"], None]) -> None:
+        """Registriert eine Funktion, die vor jedem Export Messwerte setzt."""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def remove_collector(self, collector: Callable[["MetricsRegistry"], None]) -> None:
+        with self._lock:
+            if collector in self._collectors:
+                self._collectors.remove(collector)
+
+    def collect(self) -> None:
+        """Ruft die Collectoren auf; ein fehlerhafter Collector verhindert den Export nicht."""
+        with self._lock:
+            collectors = list(self._collectors)
+        for collector in collectors:
+            try:
+                collector(self)
+            except Exception as e:
+                logger.warning(f"Fehler beim Erfassen von Metriken: {str(e)}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Liefert alle Metriken als JSON-fähiges Dict; Zähler mit mittlerer Rate seit dem Start."""
+        self.collect()
+        now = time.time()
+        uptime = max(now - self.started, 1e-9)
+        with self._lock:
+            counters: Dict[str, List[Dict[str, Any]]] = {}
+            for (name, labels), value in sorted(self._counters.items()):
+                counters.setdefault(name, []).append({"labels": dict(labels), "value": value, "rate": value / uptime})
+            gauges: Dict[str, List[Dict[str, Any]]] = {}
+            for (name, labels), value in sorted(self._gauges.items()):
+                gauges.setdefault(name, []).append({"labels": dict(labels), "value": value})
+            histograms: Dict[str, List[Dict[str, Any]]] = {}
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                histograms.setdefault(name, []).append({
+                    "labels": dict(labels),
+                    "count": histogram.count,
+                    "sum": histogram.sum,
+                    "mean": histogram.sum / histogram.count if histogram.count else None,
+                    "p50": histogram.quantile(0.5),
+                    "p95": histogram.quantile(0.95),
+                    "p99": histogram.quantile(0.99)
+                })
+        return {
+            "timestamp": now,
+            "uptime_seconds": now - self.started,
+            "counters": counters,
+            "gauges": gauges,
+            "histograms": histograms
+        }
+
+    def to_prometheus(self) -> str:
+        """Liefert alle Metriken im Textformat von Prometheus (Version 0.0.4)."""
+        self.collect()
+
+        def series(name: str, labels: Labels, extra: str = "") -> str:
+            pairs = [f'{key}="{value}"' for key, value in labels]
+            if extra:
+                pairs.append(extra)
+            return f"{name}{{{','.join(pairs)}}}" if pairs else name
+
+        lines: List[str] = []
+        described = set()
+
+        def describe(name: str, kind: str) -> None:
+            if name in described:
+                return
+            described.add(name)
+            help_text = METRIC_DEFINITIONS.get(name, (kind, name))[1]
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            for (name, labels), value in sorted(self._counters.items()):
+                describe(name, "counter")
+                lines.append(f"{series(name, labels)} {value}")
+            for (name, labels), value in sorted(self._gauges.items()):
+                describe(name, "gauge")
+                lines.append(f"{series(name, labels)} {value}")
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                describe(name, "histogram")
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    bucket = series(name + "_bucket", labels, f'le="{bound}"')
+                    lines.append(f"{bucket} {cumulative}")
+                bucket = series(name + "_bucket", labels, 'le="+Inf"')
+                lines.append(f"{bucket} {histogram.count}")
+                lines.append(f"{series(name + '_sum', labels)} {histogram.sum}")
+                lines.append(f"{series(name + '_count', labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+def _collect_process(registry: MetricsRegistry) -> None:
+    """Setzt den Speicherbedarf des Prozesses."""
+    rss = current_rss_bytes()
+    if rss is not None:
+        registry.set("process_resident_memory_bytes", rss)
+    peak = peak_rss_bytes()
+    if peak is not None:
+        registry.set("process_peak_resident_memory_bytes", peak)
+
+def milvus_call(operation: str, registry: Optional["MetricsRegistry"] = None):
+    """Misst Dauer und Fehler eines Milvus-Aufrufs (z.B. with milvus_call("insert"): ...)."""
+    return (registry or METRICS).timer("etl_milvus_call_seconds", errors="etl_milvus_call_errors_total",
+                                       operation=operation)
+
+# Gemeinsame Registry des Prozesses; Worker-Prozesse haben ihre eigene und melden über den Elternprozess
+METRICS = MetricsRegistry()
+METRICS.add_collector(_collect_process)
+
+class LogSampler:
+    def __init__(self, interval: float = 30.0):
+        """Lässt eine Log-Meldung höchstens einmal je interval Sekunden zu (statt je Datensatz)."""
+        self.interval = interval
+        self._next = time.monotonic() + interval
+        self._lock = threading.Lock()
+
+    def ready(self) -> bool:
+        """True, wenn seit der letzten zugelassenen Meldung interval Sekunden vergangen sind."""
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next:
+                return False
+            self._next = now + self.interval
+            return True
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry: MetricsRegistry = METRICS
+
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.to_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        # Abrufe durch Prometheus nicht protokollieren
+        pass
+
+class MetricsExporter:
+    def __init__(self, registry: MetricsRegistry = METRICS, port: int = 0, host: str = "0.0.0.0",
+                 snapshot_file: Optional[Path] = None, snapshot_interval: float = 60.0, log_interval: float = 30.0):
+        """Macht die Metriken während eines Laufs sichtbar.
+
+        port > 0 startet einen HTTP-Endpunkt /metrics im Prometheus-Format,
+        snapshot_file wird alle snapshot_interval Sekunden (und beim Beenden)
+        mit einem JSON-Snapshot überschrieben, und alle log_interval Sekunden
+        wird eine Fortschrittszeile mit den Raten seit der letzten Zeile protokolliert.
+        """
+        self.registry = registry
+        self.snapshot_file = Path(snapshot_file) if snapshot_file else None
+        self.snapshot_interval = snapshot_interval
+        self.log_interval = log_interval
+        self._server: Optional[ThreadingHTTPServer] = None
+        if port:
+            handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+            self._server = ThreadingHTTPServer((host, port), handler)
+            self._server.daemon_threads = True
+            threading.Thread(target=self._server.serve_forever, name="etl-metrics-http", daemon=True).start()
+            logger.info(f"Metriken unter http://{host}:{port}/metrics")
+        self._stop = threading.Event()
+        self._last_records: Dict[str, float] = {}
+        self._last_log = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="etl-metrics", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        next_snapshot = time.monotonic() + self.snapshot_interval
+        next_log = time.monotonic() + self.log_interval
+        while not self._stop.wait(1.0):
+            now = time.monotonic()
+            if self.log_interval > 0 and now >= next_log:
+                self.log_progress()
+                next_log = now + self.log_interval
+            if self.snapshot_file is not None and self.snapshot_interval > 0 and now >= next_snapshot:
+                self.write_snapshot()
+                next_snapshot = now + self.snapshot_interval
+
+    def log_progress(self) -> None:
+        """Protokolliert Datensätze und Raten je Stufe seit der letzten Fortschrittszeile, Queue-Tiefen und RSS."""
+        snapshot = self.registry.snapshot()
+        now = time.monotonic()
+        elapsed = max(now - self._last_log, 1e-9)
+        self._last_log = now
+        parts = []
+        for entry in snapshot["counters"].get("etl_records_total", []):
+            stage = entry["labels"].get("stage", "")
+            rate = (entry["value"] - self._last_records.get(stage, 0.0)) / elapsed
+            self._last_records[stage] = entry["value"]
+            parts.append(f"{stage} {entry['value']:,.0f} ({rate:,.0f}/s)")
+        queues = [f"{entry['labels'].get('queue')} {entry['value']:.0f}"
+                  for entry in snapshot["gauges"].get("etl_queue_depth", [])]
+        if queues:
+            parts.append(f"Queues: {', '.join(queues)}")
+        rss = snapshot["gauges"].get("process_resident_memory_bytes")
+        if rss:
+            parts.append(f"RSS {rss[0]['value'] / (1 << 20):,.0f} MB")
+        if parts:
+            logger.info(f"Fortschritt: {' | '.join(parts)}")
+
+    def write_snapshot(self) -> None:
+        """Schreibt den JSON-Snapshot atomar über eine temporäre Datei."""
+        try:
+            self.snapshot_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.snapshot_file.with_name(self.snapshot_file.name + ".tmp")
+            tmp_path.write_text(json.dumps(self.registry.snapshot(), indent=2), encoding="utf-8")
+            tmp_path.replace(self.snapshot_file)
+        except OSError as e:
+            logger.warning(f"Metrik-Snapshot konnte nicht geschrieben werden: {str(e)}")
+
+    def close(self) -> None:
+        """Beendet Endpunkt und Hintergrund-Thread und schreibt einen letzten Snapshot."""
+        self._stop.set()
+        self._thread.join()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        if self.log_interval > 0:
+            self.log_progress()
+        if self.snapshot_file is not None:
+            self.write_snapshot()
@@ -1,9 +1,50 @@
-from typing import Dict, Any, List, Optional
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import Dict, Any, List, Optional, Union
+import heapq
+import json
+import threading
+import time
+import numpy as np
 from pymilvus import connections, Collection, FieldSchema, CollectionSchema, DataType, utility, MilvusException
+from pymilvus.exceptions import DataTypeNotMatchException, ParamError
 from loguru import logger
-from config import MILVUS_CONFIG
+from config import (
+    MILVUS_CONFIG, COLLECTION_CONFIGS, COLLECTION_MANAGER_CONFIG, INDEX_CONFIG, INSERT_CONFIG, PROJECTION_CONFIG,
+    PROJECTION_DIR, QUANTIZATION_CONFIG, SEARCH_CONFIG
+)
+from collection_manager import CollectionManager
+from collection_schema import default_schema
+from index_tuning import choose_index, needs_rebuild, normalize_rows, rank_distance, search_params as search_params_for
+from insert_engine import InsertEngine, completed_future
+from metrics import METRICS, milvus_call
+from projection import ProjectionStore, fit_projection
+from quantization import VectorQuantizer, VECTOR_FIELD_TYPES
+from query_cache import QueryEmbeddingCache, SearchResultCache
+from record_batch import RecordBatch
+
+# Standardwerte fehlender Spalten je Milvus-Datentyp (entsprechen den default_values in create_collection)
+_DTYPE_DEFAULTS = {
+    DataType.INT64: 0,
+    DataType.DOUBLE: 0.0,
+    DataType.FLOAT: 0.0,
+    DataType.BOOL: False,
+    DataType.VARCHAR: ""
+}
+
+# Datentypen der Vektorfelder (float32 und quantisiert)
+_VECTOR_DTYPES = {getattr(DataType, field_type) for field_type in VECTOR_FIELD_TYPES.values()}
+
+# Collection-Property mit der Kalibrierung eines quantisierten Vektorfelds (int8-Skala, Recall)
+_QUANTIZATION_PROPERTY = "etl.quantization"
+
+def _is_retryable(error: Exception) -> bool:
+    """Fehler in den Eingabedaten werden nicht wiederholt, Netzwerk- und Serverfehler schon."""
+    return not isinstance(error, (ParamError, DataTypeNotMatchException))
 
 class MilvusClient:
+    # Bestätigte Inserts liegen im Log von Milvus und überstehen einen Absturz des ETL-Prozesses
+    durable_inserts = True
+
     def __init__(self):
         """Initialisiert die Verbindung zu Milvus."""
         try:
@@ -19,65 +60,34 @@ class MilvusClient:
             logger.error(f"Fehler bei der Initialisierung des Milvus Clients: {str(e)}")
             raise
 
+        # Collection-Handles und geladene Collections bleiben für die Lebensdauer des Clients erhalten
+        self.collections = CollectionManager(**COLLECTION_MANAGER_CONFIG)
+        self.insert_engine = InsertEngine(**INSERT_CONFIG)
+        # Parameter der Vektorindizes je Collection, aus Milvus gelesen
+        self._index_cache: Dict[str, Dict[str, Any]] = {}
+        # int8-Skalen und Recall quantisierter Collections; kalibriert wird beim ersten Insert,
+        # gespeichert in den Properties der Collection und hier nur zwischengespeichert
+        self._quantizers: Dict[str, VectorQuantizer] = {}
+        self._quantizer_lock = threading.Lock()
+        # PCA-Projektionen von Collections mit kleinerer Vektordimension; gelernt beim ersten Insert
+        self.projections = ProjectionStore(PROJECTION_DIR)
+        self._projection_lock = threading.Lock()
+        # Ergebnisse wiederholter Suchen; Schreibzugriffe auf eine Collection verwerfen ihre Einträge
+        self.result_cache = SearchResultCache(SEARCH_CONFIG["result_cache_size"], SEARCH_CONFIG["result_cache_ttl"])
+        METRICS.add_collector(self.result_cache.collect)
+        # Embeddings wiederholter Anfragetexte, angelegt mit dem Modell der ersten Textsuche
+        self.query_cache: Optional[QueryEmbeddingCache] = None
+        self._query_cache_lock = threading.Lock()
+        # Suchen über mehrere Collections laufen parallel
+        self._search_executor = ThreadPoolExecutor(max_workers=SEARCH_CONFIG["concurrency"], thread_name_prefix="milvus-search")
+
+    def _get_collection(self, collection_name: str) -> Optional[Collection]:
+        """Liefert das gecachte Handle einer Collection (None, wenn sie nicht existiert)."""
+        return self.collections.get(collection_name)
+
     def _get_default_schema(self, collection_name: str) -> List[Dict[str, Any]]:
         """Erstellt ein Standard-Schema für eine Collection basierend auf dem Kollektionstyp."""
-        base_fields = [
-            {
-                "name": "id",
-                "type": "INT64",
-                "is_primary": True
-            },
-            {
-                "name": "vector",
-                "type": "FLOAT_VECTOR",
-                "dim": 768
-            },
-            {
-                "name": "registrierungsdatum",
-                "type": "INT64"
-            },
-            {
-                "name": "datum_letzte_aktualisierung",
-                "type": "INT64"
-            },
-            {
-                "name": "eeg_inbetriebnahmedatum",
-                "type": "INT64"
-            },
-            {
-                "name": "eeg_mastr_nummer",
-                "type": "VARCHAR",
-                "max_length": 64
-            },
-            {
-                "name": "anlagenschluessel_eeg",
-                "type": "VARCHAR",
-                "max_length": 64
-            },
-            {
-                "name": "installierte_leistung",
-                "type": "FLOAT"
-            },
-            {
-                "name": "netzanschlusspunkt_id",
-                "type": "VARCHAR",
-                "max_length": 64
-            },
-            {
-                "name": "betreiber_id",
-                "type": "VARCHAR",
-                "max_length": 64
-            },
-            {
-                "name": "genehmigungsdatum",
-                "type": "INT64"
-            },
-            {
-                "name": "metadata",
-                "type": "JSON"
-            }
-        ]
-        return base_fields
+        return default_schema(collection_name)
 
     def _fix_field_type(self, error_msg: str, field_schemas: List[FieldSchema]) -> List[FieldSchema]:
         """Korrigiert Feldtypen basierend auf Fehlermeldungen."""
@@ -134,17 +144,24 @@ class MilvusClient:
             logger.error(f"Fehler bei der Typkorrektur: {str(e)}")
             return field_schemas
 
-    def create_collection(self, collection_name: str, fields: Optional[List[Dict[str, Any]]] = None, retry_count: int = 0) -> None:
-        """Erstellt eine neue Collection in Milvus."""
+    def create_collection(self, collection_name: str, fields: Optional[List[Dict[str, Any]]] = None, retry_count: int = 0,
+                          expected_rows: int = 0) -> None:
+        """Erstellt eine neue Collection in Milvus.
+
+        Der Vektorindex richtet sich nach expected_rows (siehe index_tuning.choose_index);
+        nach dem Laden passt tune_index ihn an die tatsächliche Größe an.
+        """
+        # Verwende Standard-Schema wenn keins angegeben
+        if fields is None:
+            fields = self._get_default_schema(collection_name)
+        # Index für Vektorsuche, passend zum Typ des Vektorfelds
+        vector_type = next((field["type"].upper() for field in fields if field["type"].upper().endswith("_VECTOR")), "FLOAT_VECTOR")
+        index_params = self._choose_index(expected_rows, vector_type)
         try:
             if utility.has_collection(collection_name):
                 logger.info(f"Collection {collection_name} existiert bereits")
                 return
 
-            # Verwende Standard-Schema wenn keins angegeben
-            if fields is None:
-                fields = self._get_default_schema(collection_name)
-
             field_schemas = []
             for field in fields:
                 field_type = field["type"].upper()
@@ -159,15 +176,16 @@ class MilvusClient:
 
                 # Only add nullable for regular fields
                 # (not primary key and not vector fields)
-                if not is_primary and field_type != "FLOAT_VECTOR":
+                if not is_primary and field_type not in VECTOR_FIELD_TYPES.values():
                     base_params["nullable"] = True
                 
-                if field_type == "FLOAT_VECTOR":
+                if field_type in VECTOR_FIELD_TYPES.values():
                     # Vector fields cannot be nullable and don't support default values
+                    # (FLOAT16_VECTOR / INT8_VECTOR for quantized storage)
                     field_schemas.append(
                         FieldSchema(
                             **base_params,
-                            dtype=DataType.FLOAT_VECTOR,
+                            dtype=getattr(DataType, field_type),
                             dim=field["dim"]
                         )
                     )
@@ -200,22 +218,17 @@ class MilvusClient:
                         )
                     )
 
-                # Enable dynamic fields for the collection
-                schema = CollectionSchema(
-                    fields=field_schemas,
-                    enable_dynamic_field=True,
-                    description=f"Collection for {collection_name} with dynamic fields enabled"
-                )
-                collection = Collection(name=collection_name, schema=schema)
-                
-                # Erstelle Index für Vektorsuche
-                index_params = {
-                    "metric_type": "L2",
-                    "index_type": "IVF_FLAT",
-                    "params": {"nlist": 1024}
-                }
+            # Enable dynamic fields for the collection
+            schema = CollectionSchema(
+                fields=field_schemas,
+                enable_dynamic_field=True,
+                description=f"Collection for {collection_name} with dynamic fields enabled"
+            )
+            collection = Collection(name=collection_name, schema=schema)
+            
+            with milvus_call("create_index"):
                 collection.create_index(field_name="vector", index_params=index_params)
-                logger.success(f"Collection {collection_name} erfolgreich erstellt und indexiert")
+            logger.success(f"Collection {collection_name} erfolgreich erstellt und indexiert ({index_params['index_type']})")
 
         except MilvusException as e:
             if retry_count < 3:  # Maximal 3 Versuche
@@ -234,12 +247,13 @@ class MilvusClient:
                         description=f"Collection for {collection_name} with dynamic fields enabled"
                     )
                     collection = Collection(name=collection_name, schema=schema)
-                    collection.create_index(field_name="vector", index_params=index_params)
+                    with milvus_call("create_index"):
+                        collection.create_index(field_name="vector", index_params=index_params)
                     logger.success(f"Collection {collection_name} erfolgreich mit korrigierten Typen erstellt")
                     return
                 else:
                     # Wenn keine Korrekturen gefunden wurden, versuche es erneut
-                    self.create_collection(collection_name, fields, retry_count + 1)
+                    self.create_collection(collection_name, fields, retry_count + 1, expected_rows)
             else:
                 logger.error(f"Fehler beim Erstellen der Collection {collection_name} nach mehreren Versuchen: {str(e)}")
                 raise
@@ -247,12 +261,171 @@ class MilvusClient:
             logger.error(f"Fehler beim Erstellen der Collection {collection_name}: {str(e)}")
             raise
 
-    def insert_data(self, collection_name: str, data: List[Dict[str, Any]]) -> None:
-        """Fügt Daten in eine Collection ein."""
+    def _choose_index(self, row_count: int, vector_type: str = "FLOAT_VECTOR") -> Dict[str, Any]:
+        """Wählt die Index-Parameter für eine Collection der angegebenen Größe und ihren Vektorfeld-Typ."""
+        return choose_index(
+            row_count,
+            target_recall=INDEX_CONFIG["target_recall"],
+            flat_threshold=INDEX_CONFIG["flat_threshold"],
+            sq8_threshold=INDEX_CONFIG["sq8_threshold"],
+            normalized=INDEX_CONFIG["normalize"],
+            vector_type=vector_type
+        )
+
+    @staticmethod
+    def _vector_field(collection: Collection) -> FieldSchema:
+        """Liefert das Vektorfeld einer Collection."""
+        return next(field for field in collection.schema.fields if field.dtype in _VECTOR_DTYPES)
+
+    def _project(self, collection_name: str, collection: Collection, vectors: Any, fit: bool = False) -> np.ndarray:
+        """Projiziert Embeddings auf die Dimension des Vektorfelds, falls diese kleiner ist.
+
+        Mit fit=True (Insert) wird die Projektion beim ersten Block gelernt,
+        ihr Recall gegen den vollen Raum gemessen und gespeichert; Suchen
+        verwenden danach dieselbe Projektion.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        dim = int(self._vector_field(collection).params.get("dim", vectors.shape[1]))
+        if vectors.shape[1] == dim:
+            return vectors
+
+        with self._projection_lock:
+            projection = self.projections.get(collection_name)
+            if projection is None or projection.input_dim != vectors.shape[1] or projection.output_dim != dim:
+                if not fit:
+                    raise ValueError(f"Keine Projektion von {vectors.shape[1]} auf {dim} Dimensionen für {collection_name}")
+                projection = fit_projection(
+                    collection_name, vectors, dim,
+                    metric_type=self._index_settings(collection_name, collection)["metric_type"],
+                    normalize=INDEX_CONFIG["normalize"],
+                    k=PROJECTION_CONFIG["recall_k"],
+                    sample_size=PROJECTION_CONFIG["recall_sample"],
+                    min_recall=PROJECTION_CONFIG["min_recall"]
+                )
+                self.projections.put(collection_name, projection)
+        return projection.transform(vectors)
+
+    def _quantizer(self, collection_name: str, collection: Collection, vectors: Optional[np.ndarray] = None) -> VectorQuantizer:
+        """Liefert den Quantisierer passend zum Vektorfeld einer Collection.
+
+        Beim ersten Insert in eine quantisierte Collection (vectors gesetzt) wird
+        er kalibriert: int8-Skala je Dimension und Recall-Prüfung gegen float32.
+        Skala und Recall werden als Property der Collection gespeichert, damit
+        spätere Läufe und Suchen von jedem Rechner aus dieselben Codes verwenden.
+        Ohne gespeicherte Skala werden Suchen und Inserts in eine nicht leere
+        int8-Collection abgelehnt, statt mit einer falschen Skala zu rechnen.
+        """
+        quantizer = VectorQuantizer.for_field_type(self._vector_field(collection).dtype.name)
+        if quantizer.mode == "float32":
+            return quantizer
+        with self._quantizer_lock:
+            stored = self._quantizers.get(collection_name) or self._stored_quantizer(collection)
+            if stored is not None and stored.mode == quantizer.mode:
+                self._quantizers[collection_name] = stored
+                return stored
+            if quantizer.mode == "int8" and (vectors is None or not len(vectors) or collection.num_entities > 0):
+                raise ValueError(f"Keine int8-Kalibrierung für Collection {collection_name} gespeichert")
+            if vectors is None or not len(vectors):
+                return quantizer
+
+            metric_type = self._index_settings(collection_name, collection)["metric_type"]
+            recall = quantizer.calibrate(
+                vectors, metric_type, k=QUANTIZATION_CONFIG["recall_k"], sample_size=QUANTIZATION_CONFIG["recall_sample"]
+            )
+            if recall < QUANTIZATION_CONFIG["min_recall"]:
+                logger.warning(f"Recall@{QUANTIZATION_CONFIG['recall_k']} von {collection_name} mit {quantizer.mode} "
+                               f"gegenüber float32: {recall:.3f} (unter {QUANTIZATION_CONFIG['min_recall']})")
+            else:
+                logger.info(f"Recall@{QUANTIZATION_CONFIG['recall_k']} von {collection_name} mit {quantizer.mode} "
+                            f"gegenüber float32: {recall:.3f}")
+            with milvus_call("set_properties"):
+                collection.set_properties({_QUANTIZATION_PROPERTY: json.dumps(quantizer.to_dict())})
+            self._quantizers[collection_name] = quantizer
+            return quantizer
+
+    @staticmethod
+    def _stored_quantizer(collection: Collection) -> Optional[VectorQuantizer]:
+        """Liest die beim ersten Insert gespeicherte Kalibrierung aus den Properties der Collection."""
+        with milvus_call("describe"):
+            properties = collection.describe().get("properties", {})
+        entry = properties.get(_QUANTIZATION_PROPERTY)
+        return VectorQuantizer.from_dict(json.loads(entry)) if entry else None
+
+    def _index_settings(self, collection_name: str, collection: Collection) -> Dict[str, Any]:
+        """Liest die in Milvus gespeicherten Parameter des Vektorindex (gecacht je Collection)."""
+        settings = self._index_cache.get(collection_name)
+        if settings is not None:
+            return settings
+
+        settings = {"index_type": "", "metric_type": "L2", "params": {}}
+        for index in collection.indexes:
+            if index.field_name != "vector":
+                continue
+            params = dict(index.params)
+            nested = params.pop("params", {})
+            # Je nach Server-Version sind die Build-Parameter verschachtelt, als JSON-String oder flach abgelegt
+            if isinstance(nested, str):
+                nested = json.loads(nested)
+            settings = {
+                "index_type": params.pop("index_type", ""),
+                "metric_type": params.pop("metric_type", "L2"),
+                "params": {**params, **nested}
+            }
+        self._index_cache[collection_name] = settings
+        return settings
+
+    def tune_index(self, collection_name: str) -> None:
+        """Baut den Vektorindex neu auf, wenn er nicht mehr zur Anzahl der Datensätze passt."""
+        try:
+            collection = self._get_collection(collection_name)
+            if collection is None:
+                logger.warning(f"Collection {collection_name} existiert nicht")
+                return
+
+            with milvus_call("flush"):
+                collection.flush()
+            row_count = collection.num_entities
+            current = self._index_settings(collection_name, collection)
+            wanted = self._choose_index(row_count, self._vector_field(collection).dtype.name)
+            if not needs_rebuild(current, wanted):
+                logger.info(f"Index von {collection_name} passt zu {row_count} Datensätzen: {current}")
+                return
+
+            logger.info(f"Baue Index von {collection_name} für {row_count} Datensätze neu auf: {current} -> {wanted}")
+            # Ein Index kann nur auf einer nicht geladenen Collection ersetzt werden; laufende Suchen werden abgewartet
+            with self.collections.exclusive(collection_name) as collection:
+                collection.drop_index()
+                with milvus_call("create_index"):
+                    collection.create_index(field_name="vector", index_params=wanted)
+                self._index_cache.pop(collection_name, None)
+            self.result_cache.invalidate(collection_name)
+            logger.success(f"Index von {collection_name} neu aufgebaut ({wanted['index_type']})")
+        except Exception as e:
+            logger.error(f"Fehler beim Anpassen des Index von {collection_name}: {str(e)}")
+            raise
+
+    def upsert_data(self, collection_name: str, data: Union[RecordBatch, List[Dict[str, Any]]]) -> None:
+        """Fügt Daten ein oder ersetzt vorhandene Datensätze mit gleicher ID."""
+        self.insert_data(collection_name, data, upsert=True)
+
+    def insert_data(self, collection_name: str, data: Union[RecordBatch, List[Dict[str, Any]]], upsert: bool = False) -> None:
+        """Fügt Daten in eine Collection ein (bei upsert=True werden vorhandene IDs ersetzt).
+
+        Ein RecordBatch wird spaltenweise eingefügt, Listen von Dicts zeilenweise.
+        Die Blöcke laufen über die Insert-Engine: mehrere gleichzeitig, mit
+        latenzabhängiger Größe und Wiederholung bei Fehlern. Schlägt ein Block
+        endgültig fehl, wird der Fehler weitergereicht; ebenso, wenn die Collection
+        nicht existiert, damit der Auftrag als fehlgeschlagen gilt.
+        """
+        collection = self._get_collection(collection_name)
+        if collection is None:
+            raise ValueError(f"Collection {collection_name} existiert nicht")
         try:
-            # Überprüfe ob Collection existiert
-            if not utility.has_collection(collection_name):
-                logger.error(f"Collection {collection_name} existiert nicht")
+            if isinstance(data, RecordBatch):
+                try:
+                    self._submit_batch(collection, data, upsert).result()
+                finally:
+                    self.result_cache.invalidate(collection_name)
                 return
 
             # Formatiere die Daten für Milvus-Insert
@@ -279,27 +452,25 @@ class MilvusClient:
                 logger.warning("Keine gültigen Datensätze zum Einfügen gefunden")
                 return
 
-            # Führe Insert in Batches durch
-            batch_size = 1000
-            for i in range(0, len(formatted_data), batch_size):
-                batch = formatted_data[i:i + batch_size]
-                
-                try:
-                    # Hole Collection
-                    collection = Collection(collection_name)
-                    
-                    # Führe Insert durch
-                    insert_result = collection.insert(batch)
-                    
-                    logger.info(f"Batch {i//batch_size + 1} erfolgreich eingefügt: {len(batch)} Datensätze")
-                    logger.debug(f"Insert Result: {insert_result}")
-                    
-                except MilvusException as e:
-                    logger.error(f"Fehler beim Einfügen von Batch {i//batch_size + 1}: {str(e)}")
-                    # Versuche den nächsten Batch trotz Fehler
-                    continue
+            # Projektion und Quantisierung wie beim spaltenweisen Insert
+            vectors = self._project(collection_name, collection, [item["vector"] for item in formatted_data], fit=True)
+            quantizer = self._quantizer(collection_name, collection, vectors)
+            codes = vectors.tolist() if quantizer.mode == "float32" else quantizer.quantize(vectors)
+            for item, code in zip(formatted_data, codes):
+                item["vector"] = code
+
+            def send(start: int, stop: int) -> Any:
+                rows = formatted_data[start:stop]
+                with milvus_call("upsert" if upsert else "insert"):
+                    return collection.upsert(rows) if upsert else collection.insert(rows)
 
-            logger.success(f"Insgesamt {len(formatted_data)} Datensätze in {collection_name} eingefügt")
+            # Vektoren als Python-Listen: grob 8 Byte pro Komponente, quantisiert im Speicherformat
+            row_bytes = len(formatted_data[0]["vector"]) * (8 if quantizer.mode == "float32" else quantizer.itemsize)
+            try:
+                self.insert_engine.run(send, len(formatted_data), row_bytes, retryable=_is_retryable)
+            finally:
+                self.result_cache.invalidate(collection_name)
+            logger.debug(f"{len(formatted_data)} Datensätze in {collection_name} eingefügt")
 
         except MilvusException as e:
             logger.error(f"Fehler beim Einfügen der Daten in {collection_name}: {str(e)}")
@@ -308,52 +479,241 @@ class MilvusClient:
             logger.error(f"Unerwarteter Fehler beim Einfügen der Daten: {str(e)}")
             raise
 
+    def submit_batch(self, collection_name: str, batch: RecordBatch, upsert: bool = False) -> Future:
+        """Startet den spaltenweisen Insert eines RecordBatch und liefert ein Future mit der Anzahl Datensätze.
+
+        Wartet nur, bis im Fenster der Insert-Engine Platz ist; die Blöcke
+        mehrerer Aufrufe sind gleichzeitig unterwegs. Fehler beim Insert enden
+        im Future, eine fehlende Collection löst sofort einen Fehler aus.
+        """
+        collection = self._get_collection(collection_name)
+        if collection is None:
+            raise ValueError(f"Collection {collection_name} existiert nicht")
+        future = self._submit_batch(collection, batch, upsert)
+        # Suchen, die während des Inserts begonnen haben, dürfen ihr Ergebnis nicht cachen
+        future.add_done_callback(lambda _: self.result_cache.invalidate(collection_name))
+        return future
+
+    def _submit_batch(self, collection: Collection, batch: RecordBatch, upsert: bool = False) -> Future:
+        """Fügt einen RecordBatch spaltenweise ein, ohne Datensätze zeilenweise umzuwandeln."""
+        if batch.vectors is None:
+            logger.warning(f"Überspringe Block ohne Vektoren ({len(batch)} Datensätze)")
+            return completed_future(0)
+        if not len(batch):
+            return completed_future(0)
+
+        batch = batch.with_vectors(self._project(collection.name, collection, batch.vectors, fit=True))
+        fields = collection.schema.fields
+        field_names = {field.name for field in fields}
+        # Spalten ohne eigenes Feld werden im JSON-Feld metadata abgelegt
+        extra_columns = [name for name in batch.columns if name not in field_names]
+        quantizer = self._quantizer(collection.name, collection, batch.vectors)
+
+        def send(start: int, stop: int) -> Any:
+            part = batch.slice(start, stop)
+            columns = [self._column_values(field, part, extra_columns, quantizer) for field in fields]
+            with milvus_call("upsert" if upsert else "insert"):
+                return collection.upsert(columns) if upsert else collection.insert(columns)
+
+        # Quantisierte Vektoren verkleinern die übertragene Datenmenge
+        row_bytes = (batch.nbytes - batch.vectors.nbytes * (1 - quantizer.itemsize / 4)) / len(batch)
+        future = self.insert_engine.submit(send, len(batch), row_bytes, retryable=_is_retryable)
+
+        def log_inserted(done: Future) -> None:
+            if done.exception() is None:
+                logger.debug(f"{len(batch)} Datensätze in {collection.name} eingefügt")
+
+        future.add_done_callback(log_inserted)
+        return future
+
+    def _column_values(self, field: FieldSchema, batch: RecordBatch, extra_columns: List[str],
+                       quantizer: Optional[VectorQuantizer] = None) -> Any:
+        """Liefert die Werte eines Schema-Felds für einen spaltenweisen Insert."""
+        if field.name == "id":
+            return batch.ids.tolist()
+        if field.dtype in _VECTOR_DTYPES:
+            if quantizer is None or quantizer.mode == "float32":
+                # Zusammenhängende float32-Matrix wird direkt übergeben
+                return batch.vectors
+            # FLOAT16_VECTOR und INT8_VECTOR erwarten ein Array je Zeile
+            return list(quantizer.quantize(batch.vectors))
+        if field.name == "source_file":
+            return [batch.source_file or ""] * len(batch)
+        if field.dtype == DataType.JSON:
+            return batch.row_values(extra_columns)
+
+        column = batch.columns.get(field.name)
+        default = _DTYPE_DEFAULTS.get(field.dtype)
+        if column is None:
+            return [default] * len(batch)
+        if field.dtype == DataType.VARCHAR:
+            if column.dtype == object:
+                return column.tolist()
+            # Typisierte Spalte in einem älteren VARCHAR-Feld
+            return [str(value) if valid else "" for value, valid in zip(column.tolist(), batch.valid[field.name])]
+        if column.dtype == object:
+            # String-Spalte passt nicht zu einem typisierten Feld
+            return [default] * len(batch)
+        return column.tolist()
+
     def search(self, collection_name: str, vector: List[float], 
                limit: int = 10, filter_expr: Optional[str] = None) -> List[Dict[str, Any]]:
-        """Führt eine Vektorsuche in der Collection durch."""
+        """Führt eine Vektorsuche in der Collection durch.
+
+        Die Collection wird nur beim ersten Zugriff geladen und bleibt danach
+        geladen; freigegeben wird sie erst, wenn das Speicherbudget des
+        Collection-Managers überschritten ist.
+        """
         try:
-            if not utility.has_collection(collection_name):
-                logger.error(f"Collection {collection_name} existiert nicht")
-                return []
+            return self._search_collection(collection_name, [vector], limit, filter_expr)[0]
+        except Exception as e:
+            logger.error(f"Fehler bei der Suche in {collection_name}: {str(e)}")
+            return []
 
-            collection = Collection(collection_name)
-            collection.load()
+    def search_many(self, vectors: Union[np.ndarray, List[List[float]]], collection_names: Optional[List[str]] = None,
+                    limit: int = 10, filter_expr: Optional[str] = None) -> List[List[Dict[str, Any]]]:
+        """Sucht mehrere Anfragevektoren gleichzeitig in mehreren Collections.
 
-            search_params = {
-                "metric_type": "L2",
-                "params": {"nprobe": 10}
-            }
+        Je Collection wird eine Suche mit allen Vektoren gestellt; die Suchen
+        laufen parallel. Liefert je Anfragevektor die global besten limit
+        Treffer über alle Collections, jeder Treffer mit seiner Collection.
+        Fehlt eine Collection oder schlägt ihre Suche fehl, fließen nur die
+        übrigen Collections in das Ergebnis ein.
+        """
+        if collection_names is None:
+            collection_names = list(COLLECTION_CONFIGS)
+        vectors = list(vectors)
+        if not vectors:
+            return []
 
-            results = collection.search(
-                data=[vector],
-                anns_field="vector",
-                param=search_params,
-                limit=limit,
-                expr=filter_expr
-            )
+        futures = {
+            self._search_executor.submit(self._search_collection, collection_name, vectors, limit, filter_expr): collection_name
+            for collection_name in collection_names
+        }
+        merged: List[List[Dict[str, Any]]] = [[] for _ in vectors]
+        for future in as_completed(futures):
+            collection_name = futures[future]
+            try:
+                results = future.result()
+            except Exception as e:
+                logger.error(f"Fehler bei der Suche in {collection_name}: {str(e)}")
+                continue
+            for query_hits, hits in zip(merged, results):
+                query_hits.extend(hits)
+
+        # Bester Treffer zuerst, über alle Collections (IP und L2 vergleichbar gemacht)
+        return [heapq.nsmallest(limit, hits, key=rank_distance) for hits in merged]
+
+    def search_text(self, texts: List[str], embedding_model, collection_names: Optional[List[str]] = None,
+                    limit: int = 10, filter_expr: Optional[str] = None) -> List[List[Dict[str, Any]]]:
+        """Sucht Anfragetexte wie search_many; die Texte werden über den Anfrage-Cache eingebettet."""
+        with self._query_cache_lock:
+            if self.query_cache is None or self.query_cache.embedding_model is not embedding_model:
+                if self.query_cache is not None:
+                    METRICS.remove_collector(self.query_cache.collect)
+                self.query_cache = QueryEmbeddingCache(embedding_model, SEARCH_CONFIG["query_cache_size"])
+                METRICS.add_collector(self.query_cache.collect)
+            query_cache = self.query_cache
+        return self.search_many(query_cache.encode(texts), collection_names, limit, filter_expr)
+
+    def _search_collection(self, collection_name: str, vectors: List[Any], limit: int,
+                           filter_expr: Optional[str]) -> List[List[Dict[str, Any]]]:
+        """Sucht mehrere Vektoren in einer Collection; liefert je Vektor die Treffer mit Collection-Namen.
+
+        Bereits gecachte Ergebnisse werden übernommen, nur die übrigen Vektoren
+        gehen an Milvus.
+        """
+        keys = [self.result_cache.key(collection_name, vector, limit, filter_expr) for vector in vectors]
+        results: List[Optional[List[Dict[str, Any]]]] = [self.result_cache.get(key) for key in keys]
+        missing = [i for i, hits in enumerate(results) if hits is None]
+        if not missing:
+            return results
+
+        generation = self.result_cache.generation(collection_name)
+        started = time.monotonic()
+        fresh = self._search_loaded(collection_name, [vectors[i] for i in missing], limit, filter_expr)
+        if fresh is None:
+            return [hits or [] for hits in results]
 
-            hits = []
-            for hit in results[0]:
-                hits.append({
+        # Suchdauer je Vektor, für die Schätzung der eingesparten Zeit
+        seconds = (time.monotonic() - started) / len(missing)
+        for i, hits in zip(missing, fresh):
+            results[i] = hits
+            self.result_cache.put(keys[i], hits, generation, seconds)
+        return results
+
+    def _search_loaded(self, collection_name: str, vectors: List[Any], limit: int,
+                       filter_expr: Optional[str]) -> Optional[List[List[Dict[str, Any]]]]:
+        """Führt die Suche in der geladenen Collection aus (None, wenn sie nicht existiert)."""
+        with self.collections.loaded(collection_name) as collection:
+            if collection is None:
+                logger.error(f"Collection {collection_name} existiert nicht")
+                return None
+
+            # nprobe bzw. ef passend zum gespeicherten Index und Ziel-Recall
+            index = self._index_settings(collection_name, collection)
+            search_params = search_params_for(index, limit, INDEX_CONFIG["target_recall"])
+            metric_type = search_params["metric_type"]
+            vectors = self._project(collection_name, collection, vectors)
+            if metric_type == "IP":
+                # Inneres Produkt entspricht dem L2-Ranking nur für normierte Anfragevektoren
+                vectors = normalize_rows(np.asarray(vectors, dtype=np.float32))
+            # Anfrage im Format des Vektorfelds; die Faktoren rechnen Distanzen auf Codes in float32-Distanzen um
+            quantizer = self._quantizer(collection_name, collection)
+            factors = [1.0] * len(vectors)
+            if quantizer.mode != "float32":
+                codes, factors = quantizer.quantize_query(vectors, metric_type)
+                vectors = list(codes)
+                factors = factors.tolist()
+
+            with milvus_call("search"):
+                results = collection.search(
+                    data=vectors,
+                    anns_field="vector",
+                    param=search_params,
+                    limit=limit,
+                    expr=filter_expr
+                )
+
+        return [
+            [
+                {
                     "id": hit.id,
-                    "distance": hit.distance,
-                    "score": hit.score
-                })
+                    "distance": hit.distance * factor,
+                    "score": hit.score * factor,
+                    "metric_type": metric_type,
+                    "collection": collection_name
+                }
+                for hit in hits
+            ]
+            for hits, factor in zip(results, factors)
+        ]
 
-            return hits
+    def delete_file_records(self, collection_name: str, source_file: str) -> None:
+        """Löscht alle Datensätze einer Quelldatei aus einer Collection."""
+        try:
+            collection = self._get_collection(collection_name)
+            if collection is None:
+                logger.warning(f"Collection {collection_name} existiert nicht")
+                return
 
+            # json.dumps liefert einen korrekt maskierten String-Literal für den Filterausdruck
+            with milvus_call("delete"):
+                collection.delete(expr=f"source_file == {json.dumps(source_file)}")
+            self.result_cache.invalidate(collection_name)
+            logger.info(f"Datensätze aus {source_file} in {collection_name} gelöscht")
         except Exception as e:
-            logger.error(f"Fehler bei der Suche in {collection_name}: {str(e)}")
-            return []
-        finally:
-            try:
-                collection.release()
-            except:
-                pass
+            logger.error(f"Fehler beim Löschen der Datensätze aus {source_file} in {collection_name}: {str(e)}")
+            raise
 
     def delete_collection(self, collection_name: str) -> None:
         """Löscht eine Collection."""
         try:
+            self.collections.forget(collection_name)
+            self._index_cache.pop(collection_name, None)
+            self.result_cache.invalidate(collection_name)
+            self._quantizers.pop(collection_name, None)
+            self.projections.drop(collection_name)
             if utility.has_collection(collection_name):
                 utility.drop_collection(collection_name)
                 logger.info(f"Collection {collection_name} gelöscht")
@@ -361,6 +721,14 @@ class MilvusClient:
             logger.error(f"Fehler beim Löschen der Collection {collection_name}: {str(e)}")
             raise 
 
+    def close(self) -> None:
+        """Beendet die Insert- und Such-Threads."""
+        METRICS.remove_collector(self.result_cache.collect)
+        if self.query_cache is not None:
+            METRICS.remove_collector(self.query_cache.collect)
+        self.insert_engine.close()
+        self._search_executor.shutdown(wait=True)
+
     def __del__(self):
         """Schließt die Verbindung zu Milvus."""
         try:
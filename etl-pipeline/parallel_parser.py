@@ -0,0 +1,251 @@
+import multiprocessing
+import queue
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Any, Iterator, List, Optional, Set, Tuple
+from loguru import logger
+from xml_processor import XMLProcessor
+from xml_splitter import FilePart, split_xml_file
+from manifest import source_key
+from sources import archive_member, source_stat
+from record_batch import RecordBatch
+from metrics import METRICS
+
+# Ein Parse-Auftrag: Ziel-Collection und XML-Datei
+ParseJob = Tuple[str, Path]
+
+# Ein geparster Block: Auftrag und spaltenorientierte Datensätze ohne Vektoren
+# (None markiert das vollständig geparste Ende einer Datei)
+ParsedBatch = Tuple[ParseJob, Optional[RecordBatch]]
+
+# Eine Arbeitseinheit der Worker: Index des Auftrags und Byte-Bereich der Datei (None: die ganze Datei)
+ParseTask = Tuple[int, Optional[FilePart]]
+
+# Ergebnis-Queue der Worker, wird beim Start jedes Worker-Prozesses gesetzt
+_result_queue = None
+
+def _init_worker(result_queue) -> None:
+    """Initialisiert einen Worker-Prozess mit der gemeinsamen Ergebnis-Queue."""
+    global _result_queue
+    _result_queue = result_queue
+
+def _parse_file(task_index: int, xml_file: str, source_file: str, batch_size: int, options: Dict[str, Any],
+                start_offset: int = 0, part: Optional[FilePart] = None) -> int:
+    """Parst eine XML-Datei (oder einen Bereich davon) im Worker und schickt die Datensätze blockweise an den Elternprozess."""
+    # Worker parsen nur, das Embedding-Modell wird hier nicht benötigt
+    xml_processor = XMLProcessor(None)
+    count = 0
+    try:
+        for batch in xml_processor.iter_record_batches(xml_file, batch_size, source_file, start_offset=start_offset,
+                                                       part=part, **options):
+            _result_queue.put(("batch", task_index, batch))
+            count += len(batch)
+        _result_queue.put(("done", task_index, count))
+    except Exception as e:
+        _result_queue.put(("error", task_index, str(e)))
+    return count
+
+class ParallelParser:
+    def __init__(self, num_workers: int = 1, batch_size: int = 1000, queue_size: int = 16, data_dir: Optional[Path] = None,
+                 record_options: Optional[Dict[str, Dict[str, Any]]] = None, start_offsets: Optional[Dict[Path, int]] = None,
+                 split_bytes: int = 0):
+        """Parst mehrere XML-Dateien parallel in einem Prozess-Pool.
+
+        Dateien, die allein mehr als den Anteil eines Prozesses an allen Dateien
+        ausmachen und größer als split_bytes sind, werden an Datensatz-Grenzen in
+        Byte-Bereiche geteilt und von mehreren Prozessen gleichzeitig geparst
+        (0 = nie teilen). Die Blöcke einer Datei werden trotzdem in der
+        Reihenfolge der Datei geliefert.
+        """
+        self.num_workers = max(1, num_workers)
+        self.batch_size = batch_size
+        # Begrenzt die Anzahl geparster Blöcke, die auf den Elternprozess warten
+        self.queue_size = queue_size
+        # Basis für die in den Datensätzen vermerkten Quelldatei-Schlüssel
+        self.data_dir = data_dir
+        # Zusätzliche Argumente für XMLProcessor.iter_record_batches je Collection (Schlüsselfeld, Watermark)
+        self.record_options = record_options or {}
+        # Bereits gespeicherte Datensatz-Elemente am Anfang einer Datei (aus dem Checkpoint), werden überlesen
+        self.start_offsets = start_offsets or {}
+        self.split_bytes = split_bytes
+        # Aufträge, deren Datei nicht vollständig geparst werden konnte
+        self.failed_jobs: Set[ParseJob] = set()
+        # Ergebnis-Queue der Worker während eines parallelen Laufs
+        self._result_queue = None
+
+    def queue_depth(self) -> Optional[int]:
+        """Anzahl geparster Blöcke, die auf den Elternprozess warten (None ohne parallelen Lauf)."""
+        if self._result_queue is None:
+            return None
+        try:
+            return self._result_queue.qsize()
+        except NotImplementedError:
+            # macOS unterstützt qsize() für multiprocessing-Queues nicht
+            return None
+
+    @staticmethod
+    def _file_done(xml_file: Path) -> None:
+        """Zählt eine vollständig geparste Datei und ihre Größe."""
+        METRICS.inc("etl_files_total")
+        try:
+            METRICS.inc("etl_bytes_total", source_stat(xml_file)["size"], stage="parse")
+        except OSError:
+            pass
+
+    def iter_batches(self, jobs: List[ParseJob]) -> Iterator[ParsedBatch]:
+        """Liefert geparste Blöcke aller Aufträge; innerhalb einer Datei bleibt die Reihenfolge erhalten.
+
+        Nach dem letzten Block einer vollständig geparsten Datei folgt (Auftrag, None).
+        """
+        if not jobs:
+            return
+        if self.num_workers == 1:
+            yield from self._iter_sequential(jobs)
+            return
+        tasks = self._plan_tasks(jobs)
+        if len(tasks) == 1:
+            yield from self._iter_sequential(jobs)
+            return
+
+        # "spawn" verhält sich auf allen Plattformen gleich und erbt keine Threads des Elternprozesses
+        context = multiprocessing.get_context("spawn")
+        result_queue = self._result_queue = context.Queue(maxsize=self.queue_size)
+        workers = min(self.num_workers, len(tasks))
+        logger.info(f"Starte paralleles Parsen von {len(jobs)} Dateien ({len(tasks)} Bereiche) mit {workers} Prozessen")
+
+        # Letzter Bereich je Auftrag; die Bereiche eines Auftrags liegen in tasks hintereinander
+        last_task = {job_index: task_index for task_index, (job_index, _) in enumerate(tasks)}
+        # Nächster Bereich je Auftrag, dessen Blöcke direkt weitergereicht werden
+        current = {job_index: task_index for task_index, (job_index, _) in reversed(list(enumerate(tasks)))}
+        # Blöcke späterer Bereiche, bis die früheren Bereiche derselben Datei fertig sind
+        buffered: Dict[int, List[RecordBatch]] = {}
+        finished: Set[int] = set()
+        counts: Dict[int, int] = {}
+        # Höchstens so viele Bereiche gleichzeitig in Arbeit oder zwischengespeichert, das begrenzt den Speicher
+        window = 2 * workers
+        outstanding = 0
+        released = 0
+
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=_init_worker, initargs=(result_queue,)) as executor:
+            futures = []
+            try:
+                while released < len(tasks):
+                    while len(futures) < len(tasks) and outstanding < window:
+                        futures.append(self._submit(executor, jobs, tasks, len(futures)))
+                        outstanding += 1
+                    try:
+                        kind, task_index, payload = result_queue.get(timeout=1.0)
+                    except queue.Empty:
+                        self._check_workers(futures)
+                        continue
+
+                    job_index = tasks[task_index][0]
+                    job = jobs[job_index]
+                    if kind == "batch":
+                        if job in self.failed_jobs:
+                            continue
+                        if task_index == current[job_index]:
+                            yield job, payload
+                        else:
+                            buffered.setdefault(task_index, []).append(payload)
+                        continue
+
+                    if kind == "done":
+                        counts[job_index] = counts.get(job_index, 0) + payload
+                    else:
+                        self.failed_jobs.add(job)
+                        logger.error(f"Fehler bei der Verarbeitung von {job[1].name}: {payload}")
+                    finished.add(task_index)
+
+                    # Fertige Bereiche in der Reihenfolge der Datei freigeben
+                    while current[job_index] in finished:
+                        done_index = current[job_index]
+                        finished.discard(done_index)
+                        outstanding -= 1
+                        released += 1
+                        if done_index == last_task[job_index]:
+                            if job not in self.failed_jobs:
+                                self._file_done(job[1])
+                                logger.info(f"{job[1].name} geparst: {counts.get(job_index, 0)} Datensätze")
+                                yield job, None
+                            break
+                        current[job_index] = done_index + 1
+                        for batch in buffered.pop(done_index + 1, []):
+                            if job not in self.failed_jobs:
+                                yield job, batch
+            finally:
+                # Bei vorzeitigem Abbruch die Queue leeren, damit blockierte Worker sich beenden können
+                for future in futures:
+                    future.cancel()
+                while not all(future.done() for future in futures):
+                    try:
+                        result_queue.get(timeout=0.1)
+                    except queue.Empty:
+                        pass
+                self._result_queue = None
+
+    def _submit(self, executor: ProcessPoolExecutor, jobs: List[ParseJob], tasks: List[ParseTask], task_index: int) -> Any:
+        """Übergibt einen Bereich an den Prozess-Pool."""
+        job_index, part = tasks[task_index]
+        collection_name, xml_file = jobs[job_index]
+        return executor.submit(_parse_file, task_index, str(xml_file), source_key(xml_file, self.data_dir),
+                               self.batch_size, self.record_options.get(collection_name, {}),
+                               self.start_offsets.get(xml_file, 0), part)
+
+    def _plan_tasks(self, jobs: List[ParseJob]) -> List[ParseTask]:
+        """Zerlegt die Aufträge in Arbeitseinheiten; große Dateien werden in Byte-Bereiche geteilt."""
+        sizes = []
+        for _, xml_file in jobs:
+            try:
+                sizes.append(source_stat(xml_file)["size"])
+            except OSError:
+                sizes.append(0)
+        # Dateien bis zum Anteil eines Prozesses werden bereits durch das Parsen mehrerer Dateien ausgelastet
+        share = sum(sizes) / self.num_workers
+
+        tasks: List[ParseTask] = []
+        for job_index, ((_, xml_file), size) in enumerate(zip(jobs, sizes)):
+            parts: List[FilePart] = []
+            if self.split_bytes and size > max(self.split_bytes, share) and self._splittable(xml_file):
+                part_bytes = max(1 << 20, min(self.split_bytes, size // self.num_workers))
+                try:
+                    parts = split_xml_file(xml_file, part_bytes)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"{xml_file.name} kann nicht geteilt werden, wird am Stück geparst: {str(e)}")
+                # Bereiche vor dem Checkpoint der Datei entfallen
+                start_offset = self.start_offsets.get(xml_file, 0)
+                parts = [part for part in parts if part.first_index + part.count > start_offset] or parts[-1:]
+            tasks.extend((job_index, part) for part in parts or [None])
+        return tasks
+
+    @staticmethod
+    def _splittable(xml_file: Path) -> bool:
+        """Nur unkomprimierte Dateien auf der Platte lassen sich an Byte-Positionen lesen."""
+        return archive_member(xml_file) is None and Path(xml_file).suffix.lower() != ".gz"
+
+    def _iter_sequential(self, jobs: List[ParseJob]) -> Iterator[ParsedBatch]:
+        """Parst die Aufträge nacheinander im aktuellen Prozess."""
+        xml_processor = XMLProcessor(None)
+        for job in jobs:
+            collection_name, xml_file = job
+            count = 0
+            try:
+                for batch in xml_processor.iter_record_batches(xml_file, self.batch_size, source_key(xml_file, self.data_dir),
+                                                               start_offset=self.start_offsets.get(xml_file, 0),
+                                                               **self.record_options.get(collection_name, {})):
+                    yield job, batch
+                    count += len(batch)
+                self._file_done(xml_file)
+                logger.info(f"{xml_file.name} geparst: {count} Datensätze")
+            except Exception as e:
+                self.failed_jobs.add(job)
+                logger.error(f"Fehler bei der Verarbeitung von {xml_file.name}: {str(e)}")
+                continue
+            yield job, None
+
+    def _check_workers(self, futures: List[Any]) -> None:
+        """Bricht ab, wenn ein Worker-Prozess unerwartet beendet wurde."""
+        for future in futures:
+            if future.done() and future.exception() is not None:
+                raise RuntimeError(f"Parse-Worker abgestürzt: {future.exception()}")
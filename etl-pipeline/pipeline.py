@@ -0,0 +1,281 @@
+import queue
+from collections import deque
+from concurrent.futures import Future
+import threading
+import time
+from typing import Deque, Dict, Any, Callable, List, Optional, Set, Tuple
+from loguru import logger
+from xml_processor import XMLProcessor
+from parallel_parser import ParallelParser, ParseJob
+from checkpoint import CheckpointStore
+from metrics import METRICS, MetricsRegistry
+
+# Markiert das Ende des Datenstroms zwischen zwei Stufen
+_END = object()
+
+# Gesendeter Block in Eingangsreihenfolge: Auftrag, Block und Future des Inserts
+# (Block und Future sind None beim Dateiende-Marker)
+_InFlight = Tuple[ParseJob, Any, Optional[Future]]
+
+class ETLPipeline:
+    def __init__(self, milvus_client, xml_processor: XMLProcessor, parser: ParallelParser, queue_size: int = 4,
+                 upsert: bool = False, checkpoint: Optional[CheckpointStore] = None, interval_records: int = 5000,
+                 flush_interval_records: int = 200_000, staging=None, embedding_store=None, insert_window: int = 8):
+        """Verbindet Parsen, Embedding und Insert über begrenzte Queues zu einer Pipeline.
+
+        Mit checkpoint wird der bestätigte Fortschritt je Datei alle
+        interval_records Datensätze dauerhaft vermerkt. Speicher, deren Inserts
+        erst mit flush() dauerhaft sind (lokaler Vektorspeicher), werden nur alle
+        flush_interval_records Datensätze gespeichert und danach vermerkt.
+        Mit staging (StagingWriter aus staging.py) werden die eingebetteten
+        Blöcke zusätzlich als Parquet- bzw. Arrow-Dateien abgelegt, mit
+        embedding_store (EmbeddingStore aus embedding_store.py) ihre Embeddings
+        an die memory-gemappte Matrix der Collection angehängt.
+        Bis zu insert_window Blöcke werden gesendet, bevor auf die Bestätigung
+        des ältesten gewartet wird; bestätigt wird in Eingangsreihenfolge.
+        """
+        self.milvus_client = milvus_client
+        self.xml_processor = xml_processor
+        self.parser = parser
+        # Upsert ersetzt vorhandene Datensätze mit gleicher (stabiler) ID
+        self.upsert = upsert
+        self.checkpoint = checkpoint
+        self.staging = staging
+        self.embedding_store = embedding_store
+        self.checkpoint_interval = interval_records if milvus_client.durable_inserts else flush_interval_records
+        self.insert_window = max(1, insert_window)
+        # Seit dem letzten Checkpoint gespeicherte Datensätze
+        self._unsaved = 0
+        # Neuester gespeicherter Änderungszeitpunkt je Collection
+        self.max_updates: Dict[str, str] = dict(checkpoint.max_updates()) if checkpoint is not None else {}
+        # Begrenzte Queues erzeugen Gegendruck: Ist Milvus langsam, warten Embedding und Parser
+        self.embed_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.insert_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._error: Optional[BaseException] = None
+        # Gespeicherte Datensätze je Datei, bei einer Fortsetzung einschließlich der im Checkpoint vermerkten
+        self.totals: Dict[ParseJob, int] = {}
+        # Aufträge, bei denen Datensätze verloren gingen
+        self.failed_jobs: Set[ParseJob] = set()
+
+    def _collect_queue_depths(self, registry: MetricsRegistry) -> None:
+        """Setzt die Füllstände der Queues zwischen den Stufen."""
+        registry.set("etl_queue_depth", self.embed_queue.qsize(), queue="embed")
+        registry.set("etl_queue_depth", self.insert_queue.qsize(), queue="insert")
+        parsed = self.parser.queue_depth()
+        if parsed is not None:
+            registry.set("etl_queue_depth", parsed, queue="parse")
+
+    def run(self, jobs: List[ParseJob]) -> Dict[ParseJob, int]:
+        """Führt alle Aufträge durch die Pipeline und liefert die gespeicherten Datensätze je Datei."""
+        METRICS.add_collector(self._collect_queue_depths)
+        try:
+            self._run(jobs)
+        finally:
+            METRICS.remove_collector(self._collect_queue_depths)
+
+        self.failed_jobs |= self.parser.failed_jobs
+        if self._error is not None:
+            raise self._error
+        return self.totals
+
+    def _run(self, jobs: List[ParseJob]) -> None:
+        """Startet Parse-, Embedding- und Insert-Stufe als Threads und wartet auf ihr Ende."""
+        stages = [
+            threading.Thread(target=self._run_stage, args=("parse", self._parse_stage, jobs), name="etl-parse", daemon=True),
+            threading.Thread(target=self._run_stage, args=("embed", self._embed_stage), name="etl-embed", daemon=True),
+            threading.Thread(target=self._run_stage, args=("insert", self._insert_stage), name="etl-insert", daemon=True)
+        ]
+        for stage in stages:
+            stage.start()
+        for stage in stages:
+            stage.join()
+
+    def _run_stage(self, name: str, stage: Callable[..., None], *args: Any) -> None:
+        """Führt eine Stufe aus und stoppt bei einem Fehler die gesamte Pipeline."""
+        try:
+            stage(*args)
+        except BaseException as e:
+            logger.error(f"Fehler in Pipeline-Stufe {name}: {str(e)}")
+            if self._error is None:
+                self._error = e
+            self._stop.set()
+
+    def _put(self, target: queue.Queue, item: Any) -> bool:
+        """Legt ein Element in die Queue und wartet dabei, solange die Pipeline läuft."""
+        while not self._stop.is_set():
+            try:
+                target.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, source: queue.Queue) -> Any:
+        """Holt das nächste Element aus der Queue oder _END, wenn die Pipeline gestoppt wurde."""
+        while not self._stop.is_set():
+            try:
+                return source.get(timeout=0.5)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _parse_stage(self, jobs: List[ParseJob]) -> None:
+        """Parst die XML-Dateien (im Prozess-Pool) und reicht die Blöcke an das Embedding weiter."""
+        batches = self.parser.iter_batches(jobs)
+        try:
+            for job, batch in batches:
+                # Parsen und Typisierung laufen in den Workern, die Dauer reist im Block mit
+                # (None markiert das Dateiende und wird für den Checkpoint durchgereicht)
+                stage_seconds = batch.stage_seconds if batch is not None else {}
+                for stage, seconds in stage_seconds.items():
+                    METRICS.observe("etl_stage_seconds", seconds, stage=stage)
+                    METRICS.inc("etl_records_total", len(batch), stage=stage)
+                if not self._put(self.embed_queue, (job, batch)):
+                    return
+        finally:
+            batches.close()
+            self._put(self.embed_queue, _END)
+
+    def _embed_stage(self) -> None:
+        """Bettet die geparsten Blöcke ein und reicht sie an den Insert weiter."""
+        try:
+            while True:
+                item = self._get(self.embed_queue)
+                if item is _END:
+                    return
+                job, batch = item
+                if batch is None:
+                    if self.staging is not None and job not in self.failed_jobs:
+                        self.staging.finish(job)
+                    # Dateiende-Marker an den Insert durchreichen
+                    if not self._put(self.insert_queue, item):
+                        return
+                    continue
+                texts = batch.texts
+                try:
+                    # Blöcke aus dem Staging bringen ihre Vektoren meist schon mit
+                    if batch.vectors is None:
+                        started = time.perf_counter()
+                        self.xml_processor.embed_batch(batch)
+                        METRICS.observe("etl_stage_seconds", time.perf_counter() - started, stage="embed")
+                        METRICS.inc("etl_records_total", len(batch), stage="embed")
+                except Exception as e:
+                    self.failed_jobs.add(job)
+                    logger.error(f"Fehler beim Embedding von {job[1].name}: {str(e)}")
+                    continue
+                if self.staging is not None:
+                    self.staging.write(job, batch, texts)
+                if self.embedding_store is not None:
+                    self.embedding_store.append(job[0], batch)
+                if not self._put(self.insert_queue, (job, batch)):
+                    return
+        finally:
+            self._put(self.insert_queue, _END)
+
+    def _insert_stage(self) -> None:
+        """Speichert die eingebetteten Blöcke in Milvus."""
+        try:
+            self._insert_loop()
+        finally:
+            # Auch beim Abbruch wurden die bis hierher bestätigten Datensätze gespeichert
+            if self.checkpoint is not None:
+                self._save_checkpoint()
+            elif self.embedding_store is not None:
+                self.embedding_store.commit()
+
+    def _insert_loop(self) -> None:
+        # Gesendete, noch nicht bestätigte Blöcke; die Insert-Engine sendet mehrere gleichzeitig
+        in_flight: Deque[_InFlight] = deque()
+        try:
+            while True:
+                item = self._get(self.insert_queue)
+                if item is _END:
+                    return
+                job, batch = item
+                if batch is None:
+                    # Das Dateiende wird erst nach allen Blöcken der Datei bestätigt
+                    in_flight.append((job, None, None))
+                elif self.checkpoint is not None and job in self.failed_jobs:
+                    # Der Checkpoint darf nicht über verlorene Datensätze hinweg fortschreiten
+                    continue
+                else:
+                    future = self._submit(job, batch)
+                    if future is None:
+                        continue
+                    in_flight.append((job, batch, future))
+                self._acknowledge(in_flight, self.insert_window)
+        finally:
+            # Auch beim Abbruch auf die gesendeten Blöcke warten, damit der Checkpoint sie erfasst
+            self._acknowledge(in_flight, 0)
+
+    def _submit(self, job: ParseJob, batch: Any) -> Optional[Future]:
+        """Sendet einen Block an den Vektorspeicher; liefert das Future des Inserts (None bei einem Fehler)."""
+        collection_name, xml_file = job
+        started = time.perf_counter()
+        try:
+            # Dateien eines fortgesetzten Laufs werden per Upsert gespeichert: Blöcke nach dem
+            # letzten Checkpoint (auch ohne jeden Checkpoint der Datei) können bereits gespeichert sein
+            upsert = self.upsert or (self.checkpoint is not None and self.checkpoint.resumed(job))
+            future = self.milvus_client.submit_batch(collection_name, batch, upsert=upsert)
+        except Exception as e:
+            self.failed_jobs.add(job)
+            logger.error(f"Fehler beim Speichern von {xml_file.name} in {collection_name}: {str(e)}")
+            return None
+
+        def observe(done: Future) -> None:
+            if done.exception() is None:
+                METRICS.observe("etl_stage_seconds", time.perf_counter() - started, stage="insert")
+
+        future.add_done_callback(observe)
+        return future
+
+    def _acknowledge(self, in_flight: Deque[_InFlight], limit: int) -> None:
+        """Bestätigt abgeschlossene Blöcke in Eingangsreihenfolge und schreibt ihren Fortschritt fort.
+
+        Solange mehr als limit Blöcke unbestätigt sind, wird auf den ältesten
+        gewartet. Ein später gesendeter Block wird nie vor einem früheren
+        bestätigt, sodass der Checkpoint nur über lückenlos gespeicherte
+        Datensätze fortschreitet.
+        """
+        while in_flight:
+            job, batch, future = in_flight[0]
+            if future is not None and not future.done() and len(in_flight) <= limit:
+                return
+            in_flight.popleft()
+            collection_name, xml_file = job
+            if batch is None:
+                if self.checkpoint is not None and job not in self.failed_jobs:
+                    self.checkpoint.complete(job)
+                continue
+            try:
+                future.result()
+            except Exception as e:
+                self.failed_jobs.add(job)
+                logger.error(f"Fehler beim Speichern von {xml_file.name} in {collection_name}: {str(e)}")
+                continue
+            if self.checkpoint is not None and job in self.failed_jobs:
+                # Gespeichert, aber hinter verlorenen Datensätzen: die Datei wird beim Fortsetzen neu geladen
+                continue
+
+            METRICS.inc("etl_records_total", len(batch), stage="insert")
+            METRICS.inc("etl_bytes_total", batch.nbytes, stage="insert")
+            self.totals[job] = self.totals.get(job, 0) + len(batch)
+            if batch.max_update > self.max_updates.get(collection_name, ""):
+                self.max_updates[collection_name] = batch.max_update
+
+            if self.checkpoint is not None:
+                self.checkpoint.advance(job, batch.end_offset, len(batch), batch.max_update)
+                self._unsaved += len(batch)
+                if self._unsaved >= self.checkpoint_interval:
+                    self._save_checkpoint()
+
+    def _save_checkpoint(self) -> None:
+        """Schreibt den Checkpoint; nicht dauerhafte Speicher werden zuvor auf die Platte geschrieben."""
+        if not self.milvus_client.durable_inserts:
+            self.milvus_client.flush()
+        # Ein fortgesetzter Lauf bettet die Blöcke vor dem Checkpoint nicht erneut ein
+        if self.embedding_store is not None:
+            self.embedding_store.commit()
+        self.checkpoint.commit()
+        self._unsaved = 0
@@ -0,0 +1,147 @@
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+import numpy as np
+from loguru import logger
+from index_tuning import normalize_rows
+
+class PCAProjection:
+    def __init__(self, mean: np.ndarray, components: np.ndarray, explained_variance: float = 1.0,
+                 recall: Optional[float] = None, normalize: bool = True):
+        """Lineare Projektion der Embeddings auf die Hauptkomponenten einer Stichprobe.
+
+        mean: Mittelwert der Stichprobe, components: (Zieldimension x Eingangsdimension),
+        explained_variance: Anteil der erhaltenen Varianz, recall: gemessener
+        Recall der Nachbarsuche im projizierten gegenüber dem vollen Raum.
+        Mit normalize werden die projizierten Vektoren wieder auf Länge 1 gebracht.
+        """
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.components = np.asarray(components, dtype=np.float32)
+        self.explained_variance = float(explained_variance)
+        self.recall = recall
+        self.normalize = normalize
+
+    @classmethod
+    def fit(cls, vectors: np.ndarray, dim: int, normalize: bool = True) -> "PCAProjection":
+        """Lernt die Projektion auf dim Dimensionen per Singulärwertzerlegung.
+
+        Hat die Stichprobe weniger Zeilen als dim, werden die fehlenden
+        Komponenten mit Nullen aufgefüllt (die Dimension bleibt wie im Schema).
+        """
+        vectors = np.asarray(vectors, dtype=np.float64)
+        mean = vectors.mean(axis=0)
+        _, singular_values, components = np.linalg.svd(vectors - mean, full_matrices=False)
+        components = components[:dim]
+        if len(components) < dim:
+            components = np.vstack([components, np.zeros((dim - len(components), vectors.shape[1]))])
+        variance = singular_values ** 2
+        explained = float(variance[:dim].sum() / variance.sum()) if variance.sum() > 0 else 1.0
+        return cls(mean, components, explained, normalize=normalize)
+
+    @property
+    def input_dim(self) -> int:
+        return self.components.shape[1]
+
+    @property
+    def output_dim(self) -> int:
+        return self.components.shape[0]
+
+    def transform(self, vectors: np.ndarray) -> np.ndarray:
+        """Projiziert eine float32-Matrix in den Zielraum."""
+        projected = (np.asarray(vectors, dtype=np.float32) - self.mean) @ self.components.T
+        return normalize_rows(projected) if self.normalize else projected
+
+    def save(self, path: Path) -> None:
+        """Speichert die Projektion als .npz (atomar über eine temporäre Datei)."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                mean=self.mean,
+                components=self.components,
+                explained_variance=self.explained_variance,
+                recall=np.nan if self.recall is None else self.recall,
+                normalize=self.normalize
+            )
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> "PCAProjection":
+        with np.load(path, allow_pickle=False) as data:
+            recall = float(data["recall"])
+            return cls(
+                data["mean"],
+                data["components"],
+                float(data["explained_variance"]),
+                None if np.isnan(recall) else recall,
+                bool(data["normalize"])
+            )
+
+def projection_recall(vectors: np.ndarray, projection: PCAProjection, metric_type: str, k: int = 10,
+                      sample_size: int = 200, seed: int = 0) -> float:
+    """Anteil der Top-k-Nachbarn im vollen Raum, die auch im projizierten Raum gefunden werden."""
+    rng = np.random.default_rng(seed)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    k = min(k, len(vectors))
+    if k == 0:
+        return 1.0
+    rows = rng.choice(len(vectors), min(sample_size, len(vectors)), replace=False)
+
+    def top_k(space: np.ndarray) -> np.ndarray:
+        queries = space[rows]
+        scores = queries @ space.T
+        if metric_type != "IP":
+            scores = 2.0 * scores - (space * space).sum(axis=1)
+        return np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+    exact = top_k(vectors)
+    approx = top_k(projection.transform(vectors))
+    found = sum(len(np.intersect1d(e, a)) for e, a in zip(exact, approx))
+    return found / (len(rows) * k)
+
+def fit_projection(collection_name: str, vectors: np.ndarray, dim: int, metric_type: str, normalize: bool = True,
+                   k: int = 10, sample_size: int = 200, min_recall: float = 0.9) -> PCAProjection:
+    """Lernt die Projektion einer Collection, misst den Recall gegen den vollen Raum und protokolliert beides."""
+    projection = PCAProjection.fit(vectors, dim, normalize=normalize)
+    projection.recall = projection_recall(vectors, projection, metric_type, k=k, sample_size=sample_size)
+    message = (f"Projektion von {collection_name} auf {dim} Dimensionen aus {len(vectors)} Datensätzen: "
+               f"{projection.explained_variance:.1%} der Varianz, Recall@{k} {projection.recall:.3f}")
+    if len(vectors) < dim:
+        logger.warning(f"{message} (weniger Datensätze als Zieldimensionen)")
+    elif projection.recall < min_recall:
+        logger.warning(f"{message} (unter {min_recall})")
+    else:
+        logger.info(message)
+    return projection
+
+class ProjectionStore:
+    def __init__(self, projection_dir: Path):
+        """Projektionen je Collection als .npz-Dateien in projection_dir, beim ersten Zugriff geladen."""
+        self.projection_dir = Path(projection_dir)
+        self._projections: Dict[str, Optional[PCAProjection]] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, collection_name: str) -> Path:
+        return self.projection_dir / f"{collection_name}.npz"
+
+    def get(self, collection_name: str) -> Optional[PCAProjection]:
+        """Liefert die Projektion einer Collection (None, wenn keine gelernt wurde)."""
+        with self._lock:
+            if collection_name not in self._projections:
+                path = self._path(collection_name)
+                self._projections[collection_name] = PCAProjection.load(path) if path.exists() else None
+            return self._projections[collection_name]
+
+    def put(self, collection_name: str, projection: PCAProjection) -> None:
+        """Speichert die Projektion einer Collection."""
+        with self._lock:
+            projection.save(self._path(collection_name))
+            self._projections[collection_name] = projection
+
+    def drop(self, collection_name: str) -> None:
+        """Vergisst die Projektion einer Collection (z.B. nach dem Löschen)."""
+        with self._lock:
+            self._projections.pop(collection_name, None)
+            self._path(collection_name).unlink(missing_ok=True)
@@ -0,0 +1,163 @@
+from typing import Any, Dict, Optional, Tuple
+import numpy as np
+
+# Milvus-Feldtyp des Vektorfelds je Speicherformat
+VECTOR_FIELD_TYPES = {
+    "float32": "FLOAT_VECTOR",
+    "float16": "FLOAT16_VECTOR",
+    "int8": "INT8_VECTOR"
+}
+
+_DTYPES = {
+    "float32": np.float32,
+    "float16": np.float16,
+    "int8": np.int8
+}
+
+class VectorQuantizer:
+    def __init__(self, mode: str = "float32", scale: Optional[np.ndarray] = None, recall: Optional[float] = None):
+        """Wandelt float32-Embeddings in das Speicherformat einer Collection um und zurück.
+
+        float16 halbiert den Speicherbedarf ohne weitere Parameter. int8 viertelt
+        ihn und braucht eine Skala je Dimension (Code = Wert / Skala, gerundet auf
+        -127..127), die beim ersten Insert aus den Daten bestimmt und danach
+        beibehalten wird. recall ist das Ergebnis der Recall-Prüfung gegen float32.
+        """
+        if mode not in VECTOR_FIELD_TYPES:
+            raise ValueError(f"Unbekanntes Vektorformat {mode!r}, erlaubt: {', '.join(VECTOR_FIELD_TYPES)}")
+        self.mode = mode
+        self.scale = None if scale is None else np.asarray(scale, dtype=np.float32)
+        self.recall = recall
+
+    @classmethod
+    def for_field_type(cls, field_type: str) -> "VectorQuantizer":
+        """Erstellt einen (noch nicht kalibrierten) Quantisierer passend zum Milvus-Feldtyp des Vektorfelds."""
+        for mode, vector_type in VECTOR_FIELD_TYPES.items():
+            if vector_type == field_type.upper():
+                return cls(mode)
+        raise ValueError(f"Kein Vektorfeld-Typ: {field_type}")
+
+    @property
+    def field_type(self) -> str:
+        return VECTOR_FIELD_TYPES[self.mode]
+
+    @property
+    def dtype(self) -> Any:
+        return _DTYPES[self.mode]
+
+    @property
+    def itemsize(self) -> int:
+        """Bytes je Vektorkomponente im Speicherformat."""
+        return np.dtype(self.dtype).itemsize
+
+    @property
+    def calibrated(self) -> bool:
+        """float32 braucht keine Kalibrierung, die übrigen Formate nach der Recall-Prüfung."""
+        return self.mode == "float32" or self.recall is not None
+
+    def fit(self, vectors: np.ndarray, per_dimension: bool = True) -> None:
+        """Bestimmt die int8-Skala aus den Beträgen der Vektoren.
+
+        Mit per_dimension=False erhalten alle Dimensionen dieselbe Skala; nur
+        dann bleibt das L2-Ranking auf den Codes erhalten. Für das innere Produkt
+        wird die Skala je Dimension beim Quantisieren der Anfrage ausgeglichen.
+        """
+        if self.mode != "int8":
+            return
+        magnitudes = np.abs(np.asarray(vectors, dtype=np.float32)).max(axis=0)
+        if not per_dimension:
+            magnitudes = np.full_like(magnitudes, magnitudes.max())
+        # Konstante Null-Dimensionen bekommen eine beliebige, gültige Skala
+        self.scale = np.where(magnitudes > 0, magnitudes / 127.0, 1.0 / 127.0).astype(np.float32)
+
+    def _scale_for(self, dim: int) -> np.ndarray:
+        # Ohne Kalibrierung (leere Collection): Wertebereich normierter Vektoren annehmen
+        return self.scale if self.scale is not None else np.full(dim, 1.0 / 127.0, dtype=np.float32)
+
+    def quantize(self, vectors: np.ndarray) -> np.ndarray:
+        """Wandelt eine float32-Matrix in das Speicherformat um; int8-Werte außerhalb der Skala werden abgeschnitten."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.mode == "int8":
+            codes = np.rint(vectors / self._scale_for(vectors.shape[-1]))
+            return np.clip(codes, -127, 127).astype(np.int8)
+        return vectors.astype(self.dtype, copy=False)
+
+    def dequantize(self, codes: np.ndarray) -> np.ndarray:
+        """Wandelt gespeicherte Codes zurück in eine float32-Matrix (ohne Kopie bei float32)."""
+        vectors = np.asarray(codes).astype(np.float32, copy=False)
+        if self.mode == "int8":
+            return vectors * self._scale_for(vectors.shape[-1])
+        return vectors
+
+    def quantize_query(self, queries: np.ndarray, metric_type: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Bringt Anfragevektoren in das Format des Vektorfelds.
+
+        Liefert die Codes und je Anfrage einen Faktor, mit dem die auf den Codes
+        berechnete Distanz wieder der float32-Distanz entspricht. Bei int8 und
+        innerem Produkt wird die Anfrage mit der Skala gewichtet, sodass
+        <Anfrage-Code, Code> proportional zu <Anfrage, Vektor> ist.
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        factors = np.ones(len(queries), dtype=np.float32)
+        if self.mode != "int8":
+            return queries.astype(self.dtype, copy=False), factors
+        scale = self._scale_for(queries.shape[-1])
+        if metric_type == "IP":
+            weighted = queries * scale
+            factors = np.abs(weighted).max(axis=1) / 127.0
+            factors = np.where(factors > 0, factors, 1.0).astype(np.float32)
+            return np.clip(np.rint(weighted / factors[:, None]), -127, 127).astype(np.int8), factors
+        # L2 auf den Codes ist nur bei einheitlicher Skala ranggleich (siehe fit)
+        factors[:] = float(scale.mean()) ** 2
+        return self.quantize(queries), factors
+
+    def calibrate(self, vectors: np.ndarray, metric_type: str, k: int = 10, sample_size: int = 200) -> float:
+        """Kalibriert den Quantisierer am ersten Block einer Collection und prüft den Recall gegen float32."""
+        if self.mode == "int8" and self.scale is None:
+            self.fit(vectors, per_dimension=metric_type == "IP")
+        self.recall = recall_at_k(vectors, self, metric_type, k=k, sample_size=sample_size)
+        return self.recall
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "scale": None if self.scale is None else self.scale.tolist(),
+            "recall": self.recall
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "VectorQuantizer":
+        return cls(data["mode"], data.get("scale"), data.get("recall"))
+
+def _scores(vectors: np.ndarray, queries: np.ndarray, metric_type: str) -> np.ndarray:
+    """Ähnlichkeit jeder Anfrage zu jedem Vektor (größer ist besser), in float32 gerechnet."""
+    vectors = vectors.astype(np.float32)
+    queries = queries.astype(np.float32)
+    if metric_type == "IP":
+        return queries @ vectors.T
+    return 2.0 * queries @ vectors.T - (vectors * vectors).sum(axis=1)
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    return np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+def recall_at_k(vectors: np.ndarray, quantizer: VectorQuantizer, metric_type: str, k: int = 10,
+                sample_size: int = 200, max_rows: int = 20000, seed: int = 0) -> float:
+    """Anteil der float32-Top-k-Treffer, die auch die Suche auf den quantisierten Vektoren findet.
+
+    Als Anfragen dienen Stichproben aus den Vektoren selbst. Gesucht wird wie
+    auf dem Server direkt auf den Codes (int8 mit gewichteter Anfrage).
+    """
+    rng = np.random.default_rng(seed)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if len(vectors) > max_rows:
+        vectors = vectors[rng.choice(len(vectors), max_rows, replace=False)]
+    k = min(k, len(vectors))
+    if k == 0:
+        return 1.0
+    queries = vectors[rng.choice(len(vectors), min(sample_size, len(vectors)), replace=False)]
+
+    exact = _top_k(_scores(vectors, queries, metric_type), k)
+    query_codes, _ = quantizer.quantize_query(queries, metric_type)
+    approx = _top_k(_scores(quantizer.quantize(vectors), query_codes, metric_type), k)
+    found = sum(len(np.intersect1d(e, a)) for e, a in zip(exact, approx))
+    return found / (len(queries) * k)
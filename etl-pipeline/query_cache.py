@@ -0,0 +1,167 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from loguru import logger
+
+# Schlüssel eines Suchergebnisses: Collection, Hash des Anfragevektors, limit, Filterausdruck
+ResultKey = Tuple[str, bytes, int, Optional[str]]
+
+def _export_stats(registry, cache_name: str, stats: Dict[str, float]) -> None:
+    """Setzt die Zähler eines Caches als Messwerte etl_search_cache_<Zähler>{cache=...} in der Registry."""
+    for name, value in stats.items():
+        registry.set(f"etl_search_cache_{name}", value, cache=cache_name)
+
+class QueryEmbeddingCache:
+    def __init__(self, embedding_model, max_entries: int = 10000, batch_size: int = 32):
+        """LRU-Cache von Anfragetext zu Embedding vor dem Embedding-Modell."""
+        self.embedding_model = embedding_model
+        self.max_entries = max_entries
+        self.batch_size = batch_size
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # Durchschnittliche Encode-Dauer je Text, daraus wird die eingesparte Zeit geschätzt
+        self._encode_seconds = 0.0
+        self.saved_seconds = 0.0
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Liefert die Embeddings mehrerer Anfragetexte als float32-Matrix; nur unbekannte Texte gehen an das Modell."""
+        vectors: List[Optional[np.ndarray]] = [None] * len(texts)
+        with self._lock:
+            for i, text in enumerate(texts):
+                vector = self._entries.get(text)
+                if vector is not None:
+                    self._entries.move_to_end(text)
+                    vectors[i] = vector
+            hits = sum(vector is not None for vector in vectors)
+            self.hits += hits
+            self.misses += len(texts) - hits
+            self.saved_seconds += hits * self._encode_seconds
+
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            # Doppelte Anfragen im selben Aufruf nur einmal einbetten
+            unique_texts = list(dict.fromkeys(texts[i] for i in missing))
+            started = time.monotonic()
+            encoded = np.asarray(self.embedding_model.encode(
+                unique_texts,
+                batch_size=self.batch_size,
+                convert_to_numpy=True,
+                show_progress_bar=False
+            ), dtype=np.float32)
+            seconds = (time.monotonic() - started) / len(unique_texts)
+            by_text = dict(zip(unique_texts, encoded))
+            for i in missing:
+                vectors[i] = by_text[texts[i]]
+
+            with self._lock:
+                self._encode_seconds = seconds
+                for text, vector in by_text.items():
+                    self._entries[text] = vector
+                    self._entries.move_to_end(text)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+        if not vectors:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.stack(vectors)
+
+    def stats(self) -> Dict[str, float]:
+        """Liefert die Zähler des Caches."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "saved_seconds": self.saved_seconds
+        }
+
+    def collect(self, registry) -> None:
+        """Collector für metrics.METRICS (Trefferquote und eingesparte Encode-Zeit)."""
+        _export_stats(registry, "query_embedding", self.stats())
+
+class SearchResultCache:
+    def __init__(self, max_entries: int = 10000, ttl: float = 300.0):
+        """Cache von Suchergebnissen mit Ablaufzeit, der bei Schreibzugriffen auf eine Collection geleert wird."""
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # Schlüssel -> (Ablaufzeitpunkt, Suchdauer, Treffer), in LRU-Reihenfolge
+        self._entries: "OrderedDict[ResultKey, Tuple[float, float, List[Dict[str, Any]]]]" = OrderedDict()
+        # Wird bei jedem Schreibzugriff erhöht; Ergebnisse älterer Suchen werden nicht mehr gespeichert
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.invalidations = 0
+        self.saved_seconds = 0.0
+
+    @staticmethod
+    def key(collection_name: str, vector: Any, limit: int, filter_expr: Optional[str]) -> ResultKey:
+        """Berechnet den Cache-Schlüssel einer Suche."""
+        digest = hashlib.blake2b(np.asarray(vector, dtype=np.float32).tobytes(), digest_size=16).digest()
+        return collection_name, digest, limit, filter_expr
+
+    def generation(self, collection_name: str) -> int:
+        """Liefert den Schreibstand einer Collection (vor der Suche abfragen und an put übergeben)."""
+        with self._lock:
+            return self._generations.get(collection_name, 0)
+
+    def get(self, key: ResultKey) -> Optional[List[Dict[str, Any]]]:
+        """Liefert eine Kopie der gespeicherten Treffer oder None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[key]
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.saved_seconds += entry[1]
+            return [dict(hit) for hit in entry[2]]
+
+    def put(self, key: ResultKey, hits: List[Dict[str, Any]], generation: int, seconds: float) -> None:
+        """Speichert Treffer, sofern die Collection seit Beginn der Suche nicht verändert wurde."""
+        with self._lock:
+            if self._generations.get(key[0], 0) != generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, seconds, [dict(hit) for hit in hits])
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, collection_name: str) -> None:
+        """Verwirft alle Ergebnisse einer Collection (nach Insert, Löschen usw.)."""
+        with self._lock:
+            self._generations[collection_name] = self._generations.get(collection_name, 0) + 1
+            stale = [key for key in self._entries if key[0] == collection_name]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += 1
+        if stale:
+            logger.debug(f"Suchergebnis-Cache: {len(stale)} Einträge für {collection_name} verworfen")
+
+    def stats(self) -> Dict[str, float]:
+        """Liefert die Zähler des Caches."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "invalidations": self.invalidations,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "saved_seconds": self.saved_seconds
+        }
+
+    def collect(self, registry) -> None:
+        """Collector für metrics.METRICS (Trefferquote und eingesparte Suchzeit)."""
+        _export_stats(registry, "search_result", self.stats())
@@ -0,0 +1,210 @@
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+from xsd_types import CONVERTERS
+
+# Datentyp und Standardwert je Feldart; die Standardwerte entsprechen den
+# default_values des Milvus-Schemas
+_KIND_DTYPES: Dict[str, Tuple[Any, Any]] = {
+    "int": (np.int64, 0),
+    "date": (np.int64, 0),
+    "datetime": (np.int64, 0),
+    "decimal": (np.float64, 0.0),
+    "bool": (np.bool_, False)
+}
+
+# Feldarten, die für Felder ohne XSD-Angabe der Reihe nach probiert werden
+_INFERRED_KINDS = ("int", "decimal", "bool", "date")
+
+def _fits(kind: str, values: List[str]) -> bool:
+    """Prüft, ob sich alle Werte einer Spalte in die Feldart umwandeln lassen."""
+    if kind in ("int", "decimal") and any(len(value) > 1 and value[0] == "0" and value[1].isdigit() for value in values):
+        # Führende Nullen (z.B. Postleitzahlen) gehen bei Zahlen verloren
+        return False
+    if kind == "date" and any(len(value) != 10 for value in values):
+        return False
+    convert = CONVERTERS[kind]
+    try:
+        for value in values:
+            convert(value)
+    except (ValueError, KeyError):
+        return False
+    return True
+
+def infer_kind(values: List[str]) -> str:
+    """Erkennt die Feldart einer Spalte ohne XSD-Angabe (int, decimal, bool, date, sonst string)."""
+    return next((kind for kind in _INFERRED_KINDS if _fits(kind, values)), "string")
+
+class RecordBatch:
+    def __init__(self, ids: np.ndarray, columns: Dict[str, np.ndarray], valid: Dict[str, np.ndarray],
+                 texts: Optional[List[str]], source_file: Optional[str] = None, max_update: str = "",
+                 vectors: Optional[np.ndarray] = None):
+        """Spaltenorientierter Block von Datensätzen.
+
+        ids: stabile INT64-IDs, columns: ein typisiertes Array je Feld (Schlüssel ist
+        der kleingeschriebene Tag), valid: Maske der tatsächlich gesetzten Werte,
+        texts: Embedding-Texte (werden nach dem Embedding freigegeben), vectors:
+        zusammenhängende float32-Matrix der Embeddings.
+        """
+        self.ids = ids
+        self.columns = columns
+        self.valid = valid
+        self.texts = texts
+        self.source_file = source_file
+        # Neuester Änderungszeitpunkt (ISO-String) im Block, für Watermarks
+        self.max_update = max_update
+        self.vectors = vectors
+        # Dauer der Stufen, die den Block erzeugt haben (parse, convert), für die Metriken
+        self.stage_seconds: Dict[str, float] = {}
+        # Anzahl der bis einschließlich dieses Blocks gelesenen Datensatz-Elemente der Quelldatei, für Checkpoints
+        self.end_offset = 0
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def nbytes(self) -> int:
+        """Ungefähre Größe der Nutzdaten des Blocks in Bytes."""
+        size = self.ids.nbytes
+        if self.vectors is not None:
+            size += self.vectors.nbytes
+        for column in self.columns.values():
+            if column.dtype == object:
+                size += sum(len(value) for value in column)
+            else:
+                size += column.nbytes
+        return size
+
+    def slice(self, start: int, stop: int) -> "RecordBatch":
+        """Liefert einen Teilblock (Sichten auf dieselben Arrays, ohne Kopie)."""
+        return RecordBatch(
+            self.ids[start:stop],
+            {name: column[start:stop] for name, column in self.columns.items()},
+            {name: mask[start:stop] for name, mask in self.valid.items()},
+            self.texts[start:stop] if self.texts is not None else None,
+            source_file=self.source_file,
+            max_update=self.max_update,
+            vectors=self.vectors[start:stop] if self.vectors is not None else None
+        )
+
+    def with_vectors(self, vectors: np.ndarray) -> "RecordBatch":
+        """Liefert denselben Block mit anderen Vektoren (z.B. projiziert), ohne die Spalten zu kopieren."""
+        return RecordBatch(
+            self.ids, self.columns, self.valid, self.texts,
+            source_file=self.source_file,
+            max_update=self.max_update,
+            vectors=vectors
+        )
+
+    def row_values(self, names: List[str]) -> List[Dict[str, Any]]:
+        """Baut je Zeile ein Dict der gesetzten Werte der angegebenen Spalten (z.B. für JSON-Felder)."""
+        rows: List[Dict[str, Any]] = [{} for _ in range(len(self))]
+        for name in names:
+            column = self.columns[name].tolist()
+            for i in np.flatnonzero(self.valid[name]):
+                rows[i][name] = column[i]
+        return rows
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        """Wandelt den Block in zeilenbasierte Datensätze um (für zeilenbasierte Schnittstellen)."""
+        records = self.row_values(list(self.columns))
+        for i, record in enumerate(records):
+            record["id"] = int(self.ids[i])
+            if self.vectors is not None:
+                record["vector"] = self.vectors[i]
+            if self.source_file is not None:
+                record["source_file"] = self.source_file
+        return records
+
+class RecordBatchBuilder:
+    def __init__(self, field_kinds: Dict[str, str], source_file: Optional[str] = None, update_field: Optional[str] = None):
+        """Sammelt Rohwerte spaltenweise und baut daraus typisierte RecordBatches."""
+        # Feldart je kleingeschriebenem Tag (aus der XSD)
+        self.field_kinds = {tag.lower(): kind for tag, kind in field_kinds.items()}
+        # Für Felder ohne XSD-Angabe erkannte Feldarten; sie gelten ab dem ersten
+        # Block mit Werten für alle weiteren Blöcke, damit der Typ einer Spalte stabil bleibt
+        self.inferred_kinds: Dict[str, str] = {}
+        self.source_file = source_file
+        self.update_field = update_field
+        self._reset()
+
+    def _reset(self) -> None:
+        self._ids: List[int] = []
+        self._texts: List[str] = []
+        self._columns: Dict[str, List[Optional[str]]] = {}
+        self._max_update = ""
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, record_id: int, text: str, fields: List[Tuple[str, str]]) -> None:
+        """Fügt einen Datensatz aus (Tag, Rohwert)-Paaren hinzu."""
+        row = len(self._ids)
+        self._ids.append(record_id)
+        self._texts.append(text)
+        for tag, value in fields:
+            if tag == self.update_field and value > self._max_update:
+                self._max_update = value
+            name = tag.lower()
+            column = self._columns.get(name)
+            if column is None:
+                # Neue Spalte: für alle bisherigen Zeilen fehlt der Wert
+                column = self._columns[name] = [None] * row
+            elif len(column) > row:
+                # Doppelter Tag im selben Datensatz: der erste Wert gilt
+                continue
+            column.append(value)
+        for column in self._columns.values():
+            if len(column) == row:
+                column.append(None)
+
+    def build(self) -> RecordBatch:
+        """Konvertiert die gesammelten Rohwerte spaltenweise und leert den Builder."""
+        columns: Dict[str, np.ndarray] = {}
+        valid: Dict[str, np.ndarray] = {}
+        for name, values in self._columns.items():
+            columns[name], valid[name] = self._convert_column(self._kind(name, values), values)
+
+        batch = RecordBatch(
+            np.array(self._ids, dtype=np.int64),
+            columns,
+            valid,
+            self._texts,
+            source_file=self.source_file,
+            max_update=self._max_update
+        )
+        self._reset()
+        return batch
+
+    def _kind(self, name: str, values: List[Optional[str]]) -> str:
+        """Feldart einer Spalte: aus der XSD oder beim ersten Block mit Werten aus den Werten erkannt."""
+        kind = self.field_kinds.get(name) or self.inferred_kinds.get(name)
+        if kind is not None:
+            return kind
+        present = [value for value in values if value is not None]
+        if not present:
+            return "string"
+        kind = self.inferred_kinds[name] = infer_kind(present)
+        return kind
+
+    def _convert_column(self, kind: str, values: List[Optional[str]]) -> Tuple[np.ndarray, np.ndarray]:
+        """Konvertiert eine Spalte in ein typisiertes Array samt Maske der gültigen Werte."""
+        mask = np.fromiter((value is not None for value in values), dtype=bool, count=len(values))
+        if kind not in _KIND_DTYPES:
+            column = np.empty(len(values), dtype=object)
+            column[:] = [value if value is not None else "" for value in values]
+            return column, mask
+
+        dtype, default = _KIND_DTYPES[kind]
+        convert = CONVERTERS[kind]
+        converted = []
+        for i, value in enumerate(values):
+            if value is None:
+                converted.append(default)
+                continue
+            try:
+                converted.append(convert(value))
+            except (ValueError, KeyError):
+                # Wert passt nicht zum Schema: als fehlend markieren
+                converted.append(default)
+                mask[i] = False
+        return np.array(converted, dtype=dtype), mask
@@ -0,0 +1,99 @@
+import gzip
+import hashlib
+import zipfile
+from contextlib import contextmanager
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+# Quelldateien werden direkt aus ZIP-Archiven (Gesamtdatenexport) und .xml.gz-Dateien gelesen,
+# ohne sie vorher zu entpacken. Ein Archiv-Mitglied wird als Pfad unterhalb des Archivs
+# adressiert, z.B. data/Gesamtdatenexport.zip/AnlagenEegSolar_1.xml.
+
+def archive_member(source: Path) -> Optional[Tuple[Path, str]]:
+    """Liefert ZIP-Archiv und Mitgliedsname einer Quelle (None für Dateien auf der Platte)."""
+    source = Path(source)
+    for parent in source.parents:
+        if parent.suffix.lower() == ".zip" and parent.is_file():
+            return parent, source.relative_to(parent).as_posix()
+    return None
+
+@lru_cache(maxsize=16)
+def _zip_members(archive: str, mtime_ns: int) -> Dict[str, zipfile.ZipInfo]:
+    """Liest das Inhaltsverzeichnis eines ZIP-Archivs (je Stand des Archivs nur einmal)."""
+    with zipfile.ZipFile(archive) as zf:
+        return {info.filename: info for info in zf.infolist() if not info.is_dir()}
+
+def _member_info(archive: Path, member: str) -> zipfile.ZipInfo:
+    members = _zip_members(str(archive), archive.stat().st_mtime_ns)
+    if member not in members:
+        raise FileNotFoundError(f"{member} nicht in {archive} enthalten")
+    return members[member]
+
+def find_sources(data_dir: Path) -> List[Path]:
+    """Findet alle XML-Quellen: *.xml, *.xml.gz und die XML-Mitglieder von ZIP-Archiven."""
+    sources = list(data_dir.rglob("*.xml")) + list(data_dir.rglob("*.xml.gz"))
+    for archive in data_dir.rglob("*.zip"):
+        if not archive.is_file():
+            continue
+        try:
+            members = _zip_members(str(archive), archive.stat().st_mtime_ns)
+        except zipfile.BadZipFile:
+            continue
+        sources.extend(archive / name for name in members if name.lower().endswith(".xml"))
+    return sources
+
+def source_name(source: Path) -> str:
+    """Dateiname der XML-Datei, nach dem die Quelle einer Collection zugeordnet wird (ohne .gz)."""
+    name = Path(source).name
+    return name[:-3] if name.lower().endswith(".gz") else name
+
+@contextmanager
+def open_source(source: Path) -> Iterator[BinaryIO]:
+    """Öffnet eine Quelle als Bytestrom; Archiv-Mitglieder und .gz werden beim Lesen entpackt.
+
+    Jeder Aufruf öffnet das Archiv neu, sodass mehrere Prozesse oder Threads
+    verschiedene Mitglieder desselben Archivs gleichzeitig lesen können.
+    """
+    member = archive_member(source)
+    if member is not None:
+        archive, name = member
+        with zipfile.ZipFile(archive) as zf, zf.open(name) as stream:
+            yield stream
+    elif Path(source).suffix.lower() == ".gz":
+        with gzip.open(source, "rb") as stream:
+            yield stream
+    else:
+        with open(source, "rb") as stream:
+            yield stream
+
+def source_stat(source: Path) -> Dict[str, int]:
+    """Größe (entpackt bei Archiv-Mitgliedern) und Änderungszeit in Nanosekunden einer Quelle."""
+    member = archive_member(source)
+    if member is None:
+        stat = Path(source).stat()
+        return {"size": stat.st_size, "mtime": stat.st_mtime_ns}
+    info = _member_info(*member)
+    return {"size": info.file_size, "mtime": int(datetime(*info.date_time).timestamp()) * 1_000_000_000}
+
+def file_hash(xml_file: Path, chunk_size: int = 1 << 20) -> str:
+    """Berechnet den SHA-256-Hash einer Datei blockweise."""
+    digest = hashlib.sha256()
+    with open(xml_file, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def content_hash(source: Path) -> str:
+    """Inhalts-Hash einer Quelle für das Manifest.
+
+    Für Archiv-Mitglieder wird die im ZIP-Verzeichnis gespeicherte CRC-32
+    verwendet, damit das Mitglied dafür nicht entpackt werden muss; .gz-Dateien
+    werden komprimiert gehasht.
+    """
+    member = archive_member(source)
+    if member is None:
+        return file_hash(source)
+    info = _member_info(*member)
+    return f"crc32:{info.CRC:08x}"
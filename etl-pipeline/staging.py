@@ -0,0 +1,473 @@
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set
+import numpy as np
+import pyarrow as pa
+import pyarrow.ipc
+import pyarrow.parquet as pq
+from loguru import logger
+from config import (
+    COLLECTION_CONFIGS, DATA_SCHEMA_DIR, EMBEDDING_MODEL_NAME, ETL_CONFIG, INDEX_CONFIG, LOCAL_STORE_DIR, LOG_CONFIG,
+    STAGING_CONFIG
+)
+from xsd_types import load_field_kinds
+from record_batch import RecordBatch
+from manifest import source_key
+from parallel_parser import ParseJob, ParsedBatch
+
+# Geparste und typisierte Datensätze werden je Quelldatei als Parquet- oder
+# Arrow-Datei unter <Staging-Verzeichnis>/<Collection>/ abgelegt, mit Embedding-Text
+# und Vektor. Ein Ladebefehl (python staging.py) speichert sie ohne erneutes
+# Parsen im Vektorspeicher; bei einem anderen Modell werden nur die Texte neu eingebettet.
+
+STAGING_SUFFIXES = {"parquet": ".parquet", "arrow": ".arrow"}
+
+# Spalten neben den Feldern (Feldnamen sind kleingeschriebene Tags und beginnen nie mit "_")
+ID_COLUMN = "_id"
+TEXT_COLUMN = "_text"
+VECTOR_COLUMN = "_vector"
+
+_KIND_TYPES = {
+    "int": pa.int64(),
+    "date": pa.int64(),
+    "datetime": pa.int64(),
+    "decimal": pa.float64(),
+    "bool": pa.bool_()
+}
+
+def _column_type(column: np.ndarray) -> pa.DataType:
+    return pa.string() if column.dtype == object else pa.from_numpy_dtype(column.dtype)
+
+def _file_stem(key: str) -> str:
+    """Dateiname der Staging-Dateien einer Quelle (der Schlüssel enthält Unterverzeichnisse und Archive)."""
+    return key.replace("/", "__")
+
+class StagingIndex:
+    def __init__(self, stage_dir: Path):
+        """Verzeichnis der gestagten Quelldateien (staging.json im Staging-Verzeichnis)."""
+        self.stage_dir = Path(stage_dir)
+        self.index_file = self.stage_dir / "staging.json"
+        self.files: Dict[str, Dict[str, Any]] = {}
+        if self.index_file.exists():
+            try:
+                with open(self.index_file, "r", encoding="utf-8") as f:
+                    self.files = json.load(f).get("files", {})
+            except Exception as e:
+                logger.warning(f"Staging-Verzeichnis {self.index_file} konnte nicht gelesen werden: {str(e)}")
+                self.files = {}
+
+    def paths(self, key: str) -> List[Path]:
+        return [self.stage_dir / part for part in self.files.get(key, {}).get("parts", [])]
+
+    def record(self, key: str, entry: Dict[str, Any]) -> None:
+        """Vermerkt eine vollständig gestagte Quelldatei und entfernt deren ältere Teile."""
+        old_parts = set(self.files.get(key, {}).get("parts", [])) - set(entry["parts"])
+        self.files[key] = entry
+        self.save()
+        for part in old_parts:
+            (self.stage_dir / part).unlink(missing_ok=True)
+
+    def remove(self, key: str) -> None:
+        """Entfernt eine Quelldatei samt ihren Staging-Dateien."""
+        for path in self.paths(key):
+            path.unlink(missing_ok=True)
+        if self.files.pop(key, None) is not None:
+            self.save()
+
+    def clear(self) -> None:
+        """Entfernt alle gestagten Dateien (z.B. vor einem vollständigen Lauf)."""
+        for key in list(self.files):
+            for path in self.paths(key):
+                path.unlink(missing_ok=True)
+        self.files = {}
+        self.save()
+
+    def save(self) -> None:
+        """Schreibt das Verzeichnis atomar auf die Platte."""
+        self.stage_dir.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.index_file.with_suffix(".tmp")
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "files": self.files}, f, indent=2, sort_keys=True)
+        os.replace(tmp_file, self.index_file)
+
+class _StagedFile:
+    def __init__(self, stage_dir: Path, collection_name: str, key: str, fields: Dict[str, pa.DataType],
+                 file_format: str, compression: Optional[str]):
+        """Staging-Dateien einer Quelldatei, die gerade geschrieben werden.
+
+        Das Schema steht mit dem ersten Block fest (alle Felder der XSD plus die
+        Spalten des Blocks). Bringt ein späterer Block eine unbekannte Spalte mit,
+        beginnt eine weitere Datei mit erweitertem Schema.
+        """
+        self.stage_dir = stage_dir
+        self.collection_name = collection_name
+        self.key = key
+        self.fields = dict(fields)
+        self.file_format = file_format
+        self.compression = compression
+        self.parts: List[str] = []
+        self.rows = 0
+        self.max_update = ""
+        self.dim: Optional[int] = None
+        self._schema: Optional[pa.Schema] = None
+        self._writer = None
+        self._sink = None
+
+    def _open_part(self) -> None:
+        self.close()
+        part = f"{self.collection_name}/{_file_stem(self.key)}.{len(self.parts)}{STAGING_SUFFIXES[self.file_format]}"
+        path = self.stage_dir / (part + ".tmp")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if self.file_format == "arrow":
+            # Unkomprimiert, damit sich die Datei beim Laden ohne Kopie per Memory-Mapping lesen lässt
+            self._sink = pa.OSFile(str(path), "wb")
+            self._writer = pa.ipc.new_file(self._sink, self._schema)
+        else:
+            self._writer = pq.ParquetWriter(str(path), self._schema, compression=self.compression)
+        self.parts.append(part)
+
+    def write(self, batch: RecordBatch, texts: Optional[List[str]]) -> None:
+        new_fields = {name: _column_type(column) for name, column in batch.columns.items() if name not in self.fields}
+        dim = batch.vectors.shape[1] if batch.vectors is not None else None
+        if self._schema is None or new_fields or dim != self.dim:
+            self.fields.update(new_fields)
+            self.dim = dim
+            schema = [pa.field(ID_COLUMN, pa.int64(), nullable=False), pa.field(TEXT_COLUMN, pa.string())]
+            if dim is not None:
+                schema.append(pa.field(VECTOR_COLUMN, pa.list_(pa.float32(), dim)))
+            schema += [pa.field(name, field_type) for name, field_type in sorted(self.fields.items())]
+            self._schema = pa.schema(schema)
+            self._open_part()
+
+        size = len(batch)
+        arrays = [pa.array(batch.ids, pa.int64()), pa.array(texts, pa.string()) if texts is not None else pa.nulls(size, pa.string())]
+        if dim is not None:
+            values = pa.array(np.ascontiguousarray(batch.vectors, dtype=np.float32).reshape(-1), pa.float32())
+            arrays.append(pa.FixedSizeListArray.from_arrays(values, dim))
+        for field in self._schema:
+            if field.name.startswith("_"):
+                continue
+            if field.name not in batch.columns:
+                arrays.append(pa.nulls(size, field.type))
+                continue
+            column, valid = batch.columns[field.name], batch.valid[field.name]
+            arrays.append(pa.array(column, field.type, mask=~valid, from_pandas=False))
+        record_batch = pa.RecordBatch.from_arrays(arrays, schema=self._schema)
+        if self.file_format == "arrow":
+            self._writer.write_batch(record_batch)
+        else:
+            # Eine Row Group je Block, so liest der Ladebefehl wieder Blöcke derselben Größe
+            self._writer.write_table(pa.Table.from_batches([record_batch]), row_group_size=size)
+        self.rows += size
+        if batch.max_update > self.max_update:
+            self.max_update = batch.max_update
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._sink is not None:
+            self._sink.close()
+            self._sink = None
+
+    def commit(self) -> None:
+        """Schließt die Dateien und gibt ihnen ihren endgültigen Namen."""
+        self.close()
+        for part in self.parts:
+            os.replace(self.stage_dir / (part + ".tmp"), self.stage_dir / part)
+
+    def discard(self) -> None:
+        self.close()
+        for part in self.parts:
+            (self.stage_dir / (part + ".tmp")).unlink(missing_ok=True)
+
+class StagingWriter:
+    def __init__(self, stage_dir: Path, file_format: str = "parquet", compression: Optional[str] = "zstd",
+                 model_name: str = "", schema_files: Optional[Dict[str, str]] = None, data_dir: Optional[Path] = None):
+        """Schreibt die eingebetteten Blöcke eines Laufs je Quelldatei als Parquet- oder Arrow-Dateien.
+
+        Eine Quelldatei wird erst mit ihrem Dateiende-Marker ins Verzeichnis
+        übernommen; bis dahin liegen ihre Dateien unter einem temporären Namen.
+        Unvollständig gestagte Quelldateien (Fehler, Abbruch) werden verworfen,
+        ältere vollständige Stände bleiben dann erhalten.
+        """
+        if file_format not in STAGING_SUFFIXES:
+            raise ValueError(f"Unbekanntes Staging-Format {file_format} (erlaubt: {', '.join(STAGING_SUFFIXES)})")
+        self.index = StagingIndex(stage_dir)
+        self.file_format = file_format
+        self.compression = compression
+        self.model_name = model_name
+        self.data_dir = data_dir
+        # Feldtypen je Collection aus der XSD, damit alle Blöcke einer Datei dasselbe Schema haben
+        self.schema_files = schema_files or {}
+        self._field_types: Dict[str, Dict[str, pa.DataType]] = {}
+        self._open: Dict[ParseJob, _StagedFile] = {}
+        # Aufträge, die nicht vollständig gestagt werden können (Fortsetzung mitten in der Datei, Schreibfehler)
+        self._skipped: Set[ParseJob] = set()
+
+    def key(self, job: ParseJob) -> str:
+        return source_key(job[1], self.data_dir)
+
+    def skip(self, job: ParseJob) -> None:
+        """Stagt die Datei eines Auftrags in diesem Lauf nicht."""
+        self._skipped.add(job)
+
+    def _fields(self, collection_name: str) -> Dict[str, pa.DataType]:
+        if collection_name not in self._field_types:
+            schema_file = self.schema_files.get(collection_name)
+            kinds = load_field_kinds(schema_file) if schema_file else {}
+            self._field_types[collection_name] = {
+                tag.lower(): _KIND_TYPES.get(kind, pa.string()) for tag, kind in kinds.items()
+            }
+        return self._field_types[collection_name]
+
+    def write(self, job: ParseJob, batch: RecordBatch, texts: Optional[List[str]]) -> None:
+        """Hängt einen eingebetteten Block an die Staging-Datei seiner Quelldatei an."""
+        if job in self._skipped:
+            return
+        staged = self._open.get(job)
+        if staged is None:
+            staged = self._open[job] = _StagedFile(self.index.stage_dir, job[0], self.key(job), self._fields(job[0]),
+                                                   self.file_format, self.compression)
+        try:
+            staged.write(batch, texts)
+        except Exception as e:
+            # Ein Fehler beim Staging hält den Lauf nicht auf, die Datei wird nur nicht gestagt
+            logger.error(f"Fehler beim Staging von {job[1].name}: {str(e)}")
+            self._skipped.add(job)
+            self._open.pop(job).discard()
+
+    def finish(self, job: ParseJob) -> None:
+        """Übernimmt eine vollständig geschriebene Quelldatei ins Staging-Verzeichnis."""
+        staged = self._open.pop(job, None)
+        if staged is None:
+            return
+        try:
+            staged.commit()
+            self.index.record(staged.key, {
+                "collection": staged.collection_name,
+                "parts": staged.parts,
+                "rows": staged.rows,
+                "max_update": staged.max_update,
+                "model": self.model_name if staged.dim is not None else None,
+                "dim": staged.dim,
+                "normalized": INDEX_CONFIG["normalize"]
+            })
+            logger.info(f"{staged.rows} Datensätze aus {job[1].name} gestagt")
+        except Exception as e:
+            logger.error(f"Fehler beim Staging von {job[1].name}: {str(e)}")
+            staged.discard()
+
+    def remove(self, key: str) -> None:
+        self.index.remove(key)
+
+    def clear(self) -> None:
+        self.index.clear()
+
+    def close(self) -> None:
+        """Verwirft die Dateien unvollständig gestagter Quelldateien."""
+        for job, staged in self._open.items():
+            logger.warning(f"{job[1].name} wurde nicht vollständig gestagt und wird verworfen")
+            staged.discard()
+        self._open = {}
+
+def _read_column(column: pa.Array) -> np.ndarray:
+    """Liest eine Feldspalte als NumPy-Array; numerische Spalten ohne fehlende Werte ohne Kopie."""
+    if pa.types.is_string(column.type) or pa.types.is_large_string(column.type):
+        return column.fill_null("").to_numpy(zero_copy_only=False)
+    if pa.types.is_boolean(column.type):
+        # Arrow speichert Wahrheitswerte als Bits, hier ist eine Kopie nötig
+        return column.fill_null(False).to_numpy(zero_copy_only=False)
+    if column.null_count:
+        column = column.fill_null(0)
+    return column.to_numpy()
+
+def to_record_batch(record_batch: pa.RecordBatch, source_file: Optional[str], max_update: str = "",
+                    with_vectors: bool = True) -> RecordBatch:
+    """Baut aus einem gestagten Arrow-Block einen RecordBatch (Feldspalten ohne Werte entfallen).
+
+    Werden die Vektoren übernommen, bleiben die Texte ungelesen.
+    """
+    names = record_batch.schema.names
+    vectors = None
+    if with_vectors and VECTOR_COLUMN in names:
+        vector_column = record_batch.column(VECTOR_COLUMN)
+        dim = vector_column.type.list_size
+        # Die Werte der Vektorspalte liegen zusammenhängend: Sicht als Matrix ohne Kopie
+        vectors = vector_column.flatten().to_numpy().reshape(-1, dim)
+    columns: Dict[str, np.ndarray] = {}
+    valid: Dict[str, np.ndarray] = {}
+    for name in names:
+        if name.startswith("_"):
+            continue
+        column = record_batch.column(name)
+        if column.null_count == len(column):
+            continue
+        columns[name] = _read_column(column)
+        valid[name] = column.is_valid().to_numpy(zero_copy_only=False)
+    return RecordBatch(
+        record_batch.column(ID_COLUMN).to_numpy(),
+        columns,
+        valid,
+        record_batch.column(TEXT_COLUMN).to_pylist() if vectors is None else None,
+        source_file=source_file,
+        max_update=max_update,
+        vectors=vectors
+    )
+
+def iter_staged_file(path: Path, batch_size: int = 0) -> Iterator[pa.RecordBatch]:
+    """Liest eine Staging-Datei per Memory-Mapping blockweise (Parquet: eine Row Group je Block)."""
+    if path.suffix == STAGING_SUFFIXES["arrow"]:
+        with pa.memory_map(str(path), "r") as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                yield reader.get_batch(i)
+        return
+    parquet_file = pq.ParquetFile(str(path), memory_map=True)
+    if batch_size:
+        yield from parquet_file.iter_batches(batch_size=batch_size)
+        return
+    for i in range(parquet_file.num_row_groups):
+        yield from parquet_file.read_row_group(i).to_batches()
+
+class StagedReader:
+    def __init__(self, index: StagingIndex, model_name: str = "", reembed: bool = False, batch_size: int = 0):
+        """Liefert gestagte Blöcke mit derselben Schnittstelle wie der ParallelParser.
+
+        Vektoren werden übernommen, wenn sie mit demselben Modell erzeugt wurden;
+        sonst (oder mit reembed) bleiben sie leer und die Pipeline bettet die
+        gestagten Texte neu ein. Die Aufträge sind (Collection, Quellschlüssel).
+        """
+        self.index = index
+        self.model_name = model_name
+        self.reembed = reembed
+        self.batch_size = batch_size
+        self.failed_jobs: Set[ParseJob] = set()
+
+    def queue_depth(self) -> Optional[int]:
+        return None
+
+    def jobs(self, collections: Optional[List[str]] = None) -> List[ParseJob]:
+        """Aufträge für alle gestagten Quelldateien der Collections (Standard: alle)."""
+        return [
+            (entry["collection"], Path(key))
+            for key, entry in sorted(self.index.files.items())
+            if collections is None or entry["collection"] in collections
+        ]
+
+    def needs_embedding(self, jobs: List[ParseJob]) -> bool:
+        return any(not self._reuse_vectors(self.index.files[job[1].as_posix()]) for job in jobs)
+
+    def _reuse_vectors(self, entry: Dict[str, Any]) -> bool:
+        return (not self.reembed and entry.get("model") == self.model_name
+                and entry.get("normalized", True) == INDEX_CONFIG["normalize"])
+
+    def iter_batches(self, jobs: List[ParseJob]) -> Iterator[ParsedBatch]:
+        for job in jobs:
+            key = job[1].as_posix()
+            entry = self.index.files[key]
+            with_vectors = self._reuse_vectors(entry)
+            count = 0
+            try:
+                for path in self.index.paths(key):
+                    for record_batch in iter_staged_file(path, self.batch_size):
+                        batch = to_record_batch(record_batch, key, entry.get("max_update", ""), with_vectors)
+                        count += len(batch)
+                        yield job, batch
+            except Exception as e:
+                self.failed_jobs.add(job)
+                logger.error(f"Fehler beim Lesen der Staging-Dateien von {key}: {str(e)}")
+                continue
+            logger.info(f"{key}: {count} gestagte Datensätze gelesen")
+            yield job, None
+
+def open_staging(data_dir: Optional[Path] = None) -> StagingWriter:
+    """Öffnet das Staging-Verzeichnis aus STAGING_CONFIG zum Schreiben."""
+    return StagingWriter(
+        STAGING_CONFIG["dir"],
+        file_format=STAGING_CONFIG["format"],
+        compression=STAGING_CONFIG["compression"],
+        model_name=EMBEDDING_MODEL_NAME,
+        schema_files={name: str(DATA_SCHEMA_DIR / config["schema_file"]) for name, config in COLLECTION_CONFIGS.items()},
+        data_dir=data_dir
+    )
+
+def load_staged(milvus_client, collections: Optional[List[str]] = None, reembed: bool = False):
+    """Baut die Collections aus den gestagten Dateien neu auf, ohne die XML-Dateien zu parsen.
+
+    Die geladenen Collections werden vorher gelöscht. Liefert die Pipeline mit
+    gespeicherten Datensätzen und fehlgeschlagenen Aufträgen.
+    """
+    from xml_processor import XMLProcessor
+    from pipeline import ETLPipeline
+
+    reader = StagedReader(StagingIndex(STAGING_CONFIG["dir"]), EMBEDDING_MODEL_NAME, reembed=reembed)
+    jobs = reader.jobs(collections)
+    if not jobs:
+        logger.warning(f"Keine gestagten Dateien in {STAGING_CONFIG['dir']}")
+    embedding_model = None
+    if reader.needs_embedding(jobs):
+        logger.info("Lade Embedding Model zum Neu-Einbetten der gestagten Texte...")
+        from sentence_transformers import SentenceTransformer
+        embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+    xml_processor = XMLProcessor(embedding_model, batch_size=ETL_CONFIG["embedding_batch_size"],
+                                 normalize=INDEX_CONFIG["normalize"])
+
+    for collection_name in sorted({collection_name for collection_name, _ in jobs}):
+        try:
+            milvus_client.delete_collection(collection_name)
+        except Exception as e:
+            logger.warning(f"Fehler beim Löschen der Collection {collection_name}: {str(e)}")
+        milvus_client.create_collection(collection_name)
+
+    pipeline = ETLPipeline(milvus_client, xml_processor, reader, queue_size=ETL_CONFIG["stage_queue_size"],
+                           insert_window=ETL_CONFIG["insert_window"])
+    totals = pipeline.run(jobs)
+    for collection_name in sorted({collection_name for collection_name, _ in totals}):
+        try:
+            milvus_client.tune_index(collection_name)
+        except Exception:
+            logger.warning(f"Index von {collection_name} bleibt unverändert")
+    for (collection_name, key), total in totals.items():
+        logger.success(f"{total} gestagte Datensätze aus {key.as_posix()} in {collection_name} gespeichert")
+    return pipeline
+
+def parse_args() -> argparse.Namespace:
+    """Liest die Kommandozeilenargumente."""
+    parser = argparse.ArgumentParser(description="Gestagte Parquet-/Arrow-Dateien in den Vektorspeicher laden")
+    parser.add_argument(
+        "--collections", nargs="+", choices=sorted(COLLECTION_CONFIGS), default=None,
+        help="Geladene Collections (Standard: alle gestagten)"
+    )
+    parser.add_argument(
+        "--reembed", action="store_true",
+        help="Gestagte Texte neu einbetten, statt die gestagten Vektoren zu übernehmen"
+    )
+    parser.add_argument(
+        "--local", action="store_true",
+        help="In den lokalen Vektorspeicher (state/local_store) statt nach Milvus laden"
+    )
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    logger.remove()
+    for handler in LOG_CONFIG["handlers"]:
+        if handler["sink"] == "sys.stdout":
+            handler["sink"] = sys.stdout
+        logger.add(**handler)
+
+    args = parse_args()
+    if args.local:
+        from local_store import LocalVectorStore
+        client = LocalVectorStore(LOCAL_STORE_DIR)
+    else:
+        from milvus_client import MilvusClient
+        client = MilvusClient()
+    try:
+        if load_staged(client, args.collections, args.reembed).failed_jobs:
+            sys.exit(1)
+    finally:
+        client.close()
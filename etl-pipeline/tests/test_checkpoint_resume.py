@@ -0,0 +1,105 @@
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+import numpy as np
+import main
+from benchmark import StubEmbeddingModel
+from checkpoint import CheckpointStore
+from config import ETL_CONFIG
+from local_store import LocalVectorStore
+from mastr_generator import generate_dataset
+
+class DurableLocalStore(LocalVectorStore):
+    # Wie Milvus: bestätigte Inserts überstehen den Abbruch (der Speicher bleibt im Test im Prozess)
+    durable_inserts = True
+
+class CrashBeforeCommit(CheckpointStore):
+    """Checkpoint, dessen Einträge nie auf die Platte gelangen, wie bei einem Absturz vor dem ersten Commit."""
+    def commit(self) -> None:
+        pass
+
+class TestCheckpointResume(unittest.TestCase):
+    def setUp(self):
+        self.path = Path(tempfile.mkdtemp())
+        generate_dataset(self.path, 3000, ["solar_anlagen"], records_per_file=1500, encoding="utf-8")
+        self.data_dir = self.path / "data"
+        patches = [
+            mock.patch.object(main, "DATA_DIR", self.data_dir),
+            mock.patch.object(main, "DATA_SCHEMA_DIR", self.path / "schema"),
+            mock.patch.dict(ETL_CONFIG, {"parse_workers": 1, "insert_batch_size": 500})
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.jobs = main.all_jobs(main.route_xml_files(self.data_dir))
+        self.store = DurableLocalStore(self.path / "store")
+        self.model = StubEmbeddingModel(32)
+        self.checkpoint_file = self.path / "checkpoint.jsonl"
+
+    def tearDown(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def stored_ids(self) -> np.ndarray:
+        collection = self.store._get_collection("solar_anlagen")
+        with collection.lock:
+            collection._consolidate()
+            return collection.ids.copy()
+
+    def test_crash_before_first_commit(self):
+        """Test, dass ein Absturz vor dem ersten Checkpoint beim Fortsetzen keine doppelten Datensätze erzeugt"""
+        crashed = CrashBeforeCommit(self.checkpoint_file, self.data_dir)
+        crashed.start("full")
+        main.process_files(self.jobs, self.store, self.model, checkpoint=crashed)
+        crashed.close()
+        self.assertEqual(len(self.stored_ids()), 3000)
+
+        checkpoint = CheckpointStore(self.checkpoint_file, self.data_dir)
+        self.assertTrue(checkpoint.can_resume("full"))
+        checkpoint.resume()
+        pipeline = main.process_files(self.jobs, self.store, self.model, checkpoint=checkpoint)
+        checkpoint.close()
+
+        ids = self.stored_ids()
+        self.assertFalse(pipeline.failed_jobs)
+        self.assertEqual(len(ids), 3000)
+        self.assertEqual(len(np.unique(ids)), 3000)
+
+    def test_resume_after_partial_commit(self):
+        """Test, dass eine ab einem Offset fortgesetzte Datei genau einmal gespeichert wird"""
+        checkpoint = CheckpointStore(self.checkpoint_file, self.data_dir)
+        checkpoint.start("full")
+        main.process_files(self.jobs, self.store, self.model, checkpoint=checkpoint)
+        checkpoint.close()
+
+        # Abbruch nach dem ersten Block der ersten Datei: nur dieser Fortschritt ist vermerkt
+        first = self.jobs[0]
+        lines = [line for line in self.checkpoint_file.read_text(encoding="utf-8").splitlines()
+                 if '"run"' in line or (checkpoint.key(first) in line and '"offset": 500,' in line)]
+        self.checkpoint_file.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+        resumed = CheckpointStore(self.checkpoint_file, self.data_dir)
+        resumed.resume()
+        self.assertEqual(resumed.begin(self.jobs), {first[1]: 500})
+        resumed.close()
+        resumed = CheckpointStore(self.checkpoint_file, self.data_dir)
+        resumed.resume()
+        pipeline = main.process_files(self.jobs, self.store, self.model, checkpoint=resumed)
+        resumed.close()
+
+        ids = self.stored_ids()
+        self.assertEqual(len(ids), 3000)
+        self.assertEqual(len(np.unique(ids)), 3000)
+        self.assertEqual(sum(pipeline.totals.values()), 3000)
+
+    def test_fresh_run_inserts(self):
+        """Test, dass ein neu begonnener Lauf keine Datei als fortgesetzt behandelt"""
+        checkpoint = CheckpointStore(self.checkpoint_file, self.data_dir)
+        checkpoint.start("full")
+        checkpoint.begin(self.jobs)
+        self.assertFalse(any(checkpoint.resumed(job) for job in self.jobs))
+        checkpoint.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+import main
+
+class TestFileMatcher(unittest.TestCase):
+    def test_precedence_decides_overlapping_patterns(self):
+        """Test, dass bei mehreren passenden Mustern die Collection mit der höchsten Rangfolge gewinnt"""
+        match = main.build_file_matcher()
+        # *Netzanschlusspunkt*.xml und *Netz*.xml passen beide
+        self.assertEqual(match("Netzanschlusspunkte_1.xml"), "netzanschlusspunkte")
+        self.assertEqual(match("Netze_1.xml"), "netze")
+        # *Solar*.xml und *Wind*.xml passen beide
+        self.assertEqual(match("AnlagenSolarWind_1.xml"), "solar_anlagen")
+        self.assertIsNone(match("Marktakteure_1.xml"))
+
+    def test_changed_precedence(self):
+        """Test, dass die Rangfolge aus COLLECTION_PRECEDENCE kommt und fehlende Collections hinten angehängt werden"""
+        with mock.patch.object(main, "COLLECTION_PRECEDENCE", ["wind_anlagen", "netze"]):
+            match = main.build_file_matcher()
+        self.assertEqual(match("AnlagenSolarWind_1.xml"), "wind_anlagen")
+        self.assertEqual(match("Netzanschlusspunkte_1.xml"), "netze")
+        self.assertEqual(match("AnlagenEegSolar_1.xml"), "solar_anlagen")
+
+    def test_route_assigns_each_file_once(self):
+        """Test, dass route_xml_files jede Datei genau einer Collection zuordnet"""
+        data_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, data_dir, True)
+        for name in ("Netzanschlusspunkte_1.xml", "Netze_1.xml", "AnlagenSolarWind_1.xml", "Marktakteure_1.xml"):
+            (data_dir / name).write_text("<root/>", encoding="utf-8")
+        routes = main.route_xml_files(data_dir)
+        routed = {path.name: name for name, files in routes.items() for path in files}
+        self.assertEqual(routed, {
+            "Netzanschlusspunkte_1.xml": "netzanschlusspunkte",
+            "Netze_1.xml": "netze",
+            "AnlagenSolarWind_1.xml": "solar_anlagen"
+        })
+
+    def test_case_sensitive_where_filesystem_is(self):
+        """Test, dass die Groß-/Kleinschreibung beachtet wird, wenn os.path.normcase sie beibehält"""
+        with mock.patch("os.path.normcase", lambda path: path):
+            match = main.build_file_matcher()
+        self.assertEqual(match("AnlagenEegSolar_1.xml"), "solar_anlagen")
+        self.assertIsNone(match("anlageneegsolar_1.XML"))
+
+    def test_case_insensitive_on_windows(self):
+        """Test, dass Dateinamen wie bei fnmatch.fnmatch unter Windows ohne Groß-/Kleinschreibung zugeordnet werden"""
+        with mock.patch("os.path.normcase", str.lower):
+            match = main.build_file_matcher()
+        self.assertEqual(match("anlageneegsolar_1.XML"), "solar_anlagen")
+        self.assertEqual(match("EINHEITENWIND.xml"), "wind_anlagen")
+
+if __name__ == '__main__':
+    unittest.main()
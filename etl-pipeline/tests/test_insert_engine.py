@@ -0,0 +1,64 @@
+import threading
+import time
+import unittest
+from insert_engine import InsertEngine
+
+class TestInsertEngine(unittest.TestCase):
+    def setUp(self):
+        self.engine = InsertEngine(concurrency=4, initial_batch_size=1000, min_batch_size=100, max_batch_size=10000,
+                                   max_retries=2, retry_backoff=0.01)
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+        self.sent = []
+
+    def tearDown(self):
+        self.engine.close()
+
+    def slow_send(self, start: int, stop: int) -> None:
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(0.1)
+        with self.lock:
+            self.active -= 1
+            self.sent.append((start, stop))
+
+    def test_window_spans_calls(self):
+        """Test, dass Aufrufe mit je einem Block gleichzeitig unterwegs sind"""
+        futures = [self.engine.submit(self.slow_send, 500, 100.0) for _ in range(8)]
+        self.assertEqual([future.result() for future in futures], [500] * 8)
+        self.assertEqual(self.max_active, 4)
+
+    def test_split_into_blocks(self):
+        """Test, dass ein Aufruf vollständig in Blöcke der aktuellen Größe geteilt wird"""
+        self.assertEqual(self.engine.run(self.slow_send, 2500, 100.0), 2500)
+        self.assertEqual(sorted(self.sent), [(0, 1000), (1000, 2000), (2000, 2500)])
+
+    def test_failure_ends_in_future(self):
+        """Test, dass ein endgültig fehlgeschlagener Block nur das Future seines Aufrufs beendet"""
+        def failing_send(start: int, stop: int) -> None:
+            raise ValueError("kaputt")
+
+        failed = self.engine.submit(failing_send, 500, 100.0, retryable=lambda e: False)
+        succeeded = self.engine.submit(self.slow_send, 500, 100.0)
+        with self.assertRaises(ValueError):
+            failed.result()
+        self.assertEqual(succeeded.result(), 500)
+        self.assertEqual(self.engine.stats()["failures"], 1)
+
+    def test_retry(self):
+        """Test, dass ein vorübergehender Fehler wiederholt wird"""
+        attempts = []
+
+        def flaky_send(start: int, stop: int) -> None:
+            attempts.append(start)
+            if len(attempts) == 1:
+                raise ConnectionError("Zeitüberschreitung")
+
+        self.assertEqual(self.engine.run(flaky_send, 500, 100.0), 500)
+        self.assertEqual(len(attempts), 2)
+        self.assertEqual(self.engine.stats()["retries"], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,24 @@
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+import numpy as np
+from local_store import LocalVectorStore
+from record_batch import RecordBatch
+
+class TestLocalStore(unittest.TestCase):
+    def setUp(self):
+        self.path = Path(tempfile.mkdtemp())
+        self.store = LocalVectorStore(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def test_insert_into_missing_collection(self):
+        """Test, dass ein Insert in eine fehlende Collection fehlschlägt, statt Datensätze zu verlieren"""
+        batch = RecordBatch(np.arange(3, dtype=np.int64), {}, {}, None, vectors=np.ones((3, 8), dtype=np.float32))
+        with self.assertRaises(ValueError):
+            self.store.insert_data("solar_anlagen", batch)
+
+if __name__ == '__main__':
+    unittest.main()
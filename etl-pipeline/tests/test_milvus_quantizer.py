@@ -0,0 +1,58 @@
+import threading
+import unittest
+from types import SimpleNamespace
+import numpy as np
+from pymilvus import DataType
+from milvus_client import MilvusClient
+
+class FakeCollection:
+    """Collection mit INT8_VECTOR-Feld, deren Properties wie in Milvus beim Handle liegen."""
+    def __init__(self, properties=None, num_entities=0):
+        self.schema = SimpleNamespace(fields=[SimpleNamespace(name="vector", dtype=DataType.INT8_VECTOR)])
+        self.properties = dict(properties or {})
+        self.num_entities = num_entities
+
+    def describe(self):
+        return {"properties": dict(self.properties)}
+
+    def set_properties(self, properties):
+        self.properties.update(properties)
+
+def offline_client() -> MilvusClient:
+    """MilvusClient ohne Verbindung, nur mit dem Zustand, den _quantizer braucht."""
+    client = MilvusClient.__new__(MilvusClient)
+    client._quantizers = {}
+    client._quantizer_lock = threading.Lock()
+    client._index_cache = {"solar_anlagen": {"metric_type": "IP"}}
+    return client
+
+class TestMilvusQuantizer(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.vectors = rng.normal(size=(200, 16)).astype(np.float32)
+
+    def test_calibration_is_stored_with_collection(self):
+        """Test, dass die int8-Skala in der Collection gespeichert wird und ein anderer Client sie übernimmt"""
+        collection = FakeCollection()
+        quantizer = offline_client()._quantizer("solar_anlagen", collection, self.vectors)
+        self.assertIn("etl.quantization", collection.properties)
+
+        collection.num_entities = len(self.vectors)
+        restored = offline_client()._quantizer("solar_anlagen", collection)
+        np.testing.assert_array_equal(restored.scale, quantizer.scale)
+        np.testing.assert_array_equal(restored.quantize(self.vectors), quantizer.quantize(self.vectors))
+
+    def test_search_without_calibration_is_refused(self):
+        """Test, dass eine int8-Suche ohne gespeicherte Kalibrierung abgelehnt wird"""
+        with self.assertRaises(ValueError):
+            offline_client()._quantizer("solar_anlagen", FakeCollection(num_entities=200))
+
+    def test_insert_into_filled_collection_without_calibration_is_refused(self):
+        """Test, dass eine nicht leere int8-Collection ohne Kalibrierung nicht neu kalibriert wird"""
+        collection = FakeCollection(num_entities=200)
+        with self.assertRaises(ValueError):
+            offline_client()._quantizer("solar_anlagen", collection, self.vectors)
+        self.assertEqual(collection.properties, {})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import threading
+import unittest
+from concurrent.futures import Future
+from pathlib import Path
+import numpy as np
+from pipeline import ETLPipeline
+from record_batch import RecordBatch
+
+JOB = ("solar_anlagen", Path("AnlagenEegSolar_1.xml"))
+
+def make_batch(start: int, size: int = 10) -> RecordBatch:
+    batch = RecordBatch(np.arange(start, start + size, dtype=np.int64), {}, {}, None,
+                        vectors=np.zeros((size, 4), dtype=np.float32))
+    batch.end_offset = start + size
+    return batch
+
+class ListParser:
+    """Liefert vorbereitete, bereits eingebettete Blöcke mit Dateiende-Marker."""
+    def __init__(self, batches):
+        self.batches = batches
+        self.failed_jobs = set()
+
+    def iter_batches(self, jobs):
+        for batch in self.batches:
+            yield JOB, batch
+        yield JOB, None
+
+    def queue_depth(self):
+        return None
+
+class ManualClient:
+    """Vektorspeicher, dessen Inserts der Test in beliebiger Reihenfolge abschließt."""
+    durable_inserts = True
+
+    def __init__(self, expected: int):
+        self.futures = []
+        self.expected = expected
+        self.all_submitted = threading.Event()
+
+    def submit_batch(self, collection_name, batch, upsert=False):
+        future = Future()
+        self.futures.append(future)
+        if len(self.futures) == self.expected:
+            self.all_submitted.set()
+        return future
+
+class RecordingCheckpoint:
+    def __init__(self):
+        self.events = []
+
+    def max_updates(self):
+        return {}
+
+    def resumed(self, job):
+        return False
+
+    def advance(self, job, offset, records, max_update=""):
+        self.events.append(("advance", offset))
+
+    def complete(self, job):
+        self.events.append(("complete",))
+
+    def commit(self):
+        self.events.append(("commit",))
+
+class TestPipelineAcknowledgement(unittest.TestCase):
+    def run_pipeline(self, finish):
+        batches = [make_batch(start) for start in range(0, 40, 10)]
+        client = ManualClient(len(batches))
+        checkpoint = RecordingCheckpoint()
+        pipeline = ETLPipeline(client, None, ListParser(batches), checkpoint=checkpoint, interval_records=1000,
+                               insert_window=8)
+
+        def complete():
+            client.all_submitted.wait(5)
+            finish(client.futures)
+
+        finisher = threading.Thread(target=complete)
+        finisher.start()
+        totals = pipeline.run([JOB])
+        finisher.join()
+        return pipeline, totals, checkpoint.events
+
+    def test_acknowledged_in_order(self):
+        """Test, dass der Checkpoint in Eingangsreihenfolge fortschreitet, auch wenn spätere Inserts zuerst fertig sind"""
+        def finish(futures):
+            for future in reversed(futures):
+                future.set_result(10)
+
+        pipeline, totals, events = self.run_pipeline(finish)
+        self.assertEqual(totals, {JOB: 40})
+        self.assertEqual(events, [("advance", 10), ("advance", 20), ("advance", 30), ("advance", 40),
+                                  ("complete",), ("commit",)])
+
+    def test_failed_block_stops_progress(self):
+        """Test, dass nach einem fehlgeschlagenen Block weder Fortschritt noch Dateiende vermerkt werden"""
+        def finish(futures):
+            for i, future in reversed(list(enumerate(futures))):
+                if i == 1:
+                    future.set_exception(ConnectionError("Milvus nicht erreichbar"))
+                else:
+                    future.set_result(10)
+
+        pipeline, totals, events = self.run_pipeline(finish)
+        self.assertEqual(pipeline.failed_jobs, {JOB})
+        self.assertEqual(events, [("advance", 10), ("commit",)])
+
+if __name__ == '__main__':
+    unittest.main()
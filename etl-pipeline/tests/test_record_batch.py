@@ -0,0 +1,44 @@
+import unittest
+import numpy as np
+from record_batch import RecordBatchBuilder
+from xsd_types import parse_date
+
+class TestRecordBatchBuilder(unittest.TestCase):
+    def build(self, builder, rows):
+        for i, fields in enumerate(rows):
+            builder.add(i, "", fields)
+        return builder.build()
+
+    def test_infers_kinds_without_xsd(self):
+        """Test, dass Felder ohne XSD-Angabe spaltenweise typisiert werden"""
+        batch = self.build(RecordBatchBuilder({}), [
+            [("Leistung", "10"), ("Faktor", "1.5"), ("Aktiv", "true"), ("Datum", "2020-01-02"), ("Ort", "Berlin")],
+            [("Leistung", "20"), ("Faktor", "2"), ("Aktiv", "false"), ("Datum", "2021-03-04")]
+        ])
+        self.assertEqual(batch.columns["leistung"].tolist(), [10, 20])
+        self.assertEqual(batch.columns["faktor"].dtype, np.float64)
+        self.assertEqual(batch.columns["aktiv"].tolist(), [True, False])
+        self.assertEqual(batch.columns["datum"].tolist(), [parse_date("2020-01-02"), parse_date("2021-03-04")])
+        self.assertEqual(batch.columns["ort"].tolist(), ["Berlin", ""])
+        self.assertEqual(batch.valid["ort"].tolist(), [True, False])
+
+    def test_leading_zeros_stay_strings(self):
+        """Test, dass Werte mit führenden Nullen nicht als Zahl erkannt werden"""
+        batch = self.build(RecordBatchBuilder({}), [[("Postleitzahl", "01067")], [("Postleitzahl", "10115")]])
+        self.assertEqual(batch.columns["postleitzahl"].tolist(), ["01067", "10115"])
+
+    def test_xsd_kind_takes_precedence(self):
+        """Test, dass die Feldart aus der XSD Vorrang vor der Erkennung hat"""
+        batch = self.build(RecordBatchBuilder({"Nummer": "string"}), [[("Nummer", "42")]])
+        self.assertEqual(batch.columns["nummer"].tolist(), ["42"])
+
+    def test_inferred_kind_is_kept_across_blocks(self):
+        """Test, dass die erkannte Feldart für spätere Blöcke derselben Datei gilt"""
+        builder = RecordBatchBuilder({})
+        self.build(builder, [[("Leistung", "10")]])
+        batch = self.build(builder, [[("Leistung", "12")], [("Leistung", "unbekannt")]])
+        self.assertEqual(batch.columns["leistung"].dtype, np.int64)
+        self.assertEqual(batch.valid["leistung"].tolist(), [True, False])
+
+if __name__ == '__main__':
+    unittest.main()
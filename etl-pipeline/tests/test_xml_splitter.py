@@ -0,0 +1,76 @@
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+import numpy as np
+import xml_splitter
+from mastr_generator import generate_file
+from xml_processor import XMLProcessor
+from xml_splitter import split_xml_file
+
+class TestXMLSplitter(unittest.TestCase):
+    def setUp(self):
+        self.path = Path(tempfile.mkdtemp())
+        self.processor = XMLProcessor()
+
+    def tearDown(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def generate(self, encoding: str, records: int = 500) -> Path:
+        xml_file = self.path / f"AnlagenEegSolar_{encoding}.xml"
+        generate_file("solar_anlagen", xml_file, records, encoding=encoding)
+        return xml_file
+
+    def parse(self, xml_file: Path, part=None):
+        # Ohne key_field werden die IDs aus der Position abgeleitet
+        batches = list(self.processor.iter_record_batches(str(xml_file), batch_size=64, source_file="solar", part=part))
+        ids = np.concatenate([batch.ids for batch in batches])
+        keys = [key for batch in batches for key in batch.columns["eegmastrnummer"].tolist()]
+        return ids, keys
+
+    def assert_parts_match_whole(self, xml_file: Path, parts):
+        self.assertGreater(len(parts), 2)
+        # Die Bereiche schließen lückenlos aneinander an
+        self.assertEqual(parts[0].first_index, 0)
+        for previous, part in zip(parts, parts[1:]):
+            self.assertEqual(previous.end, part.start)
+            self.assertEqual(previous.first_index + previous.count, part.first_index)
+
+        whole_ids, whole_keys = self.parse(xml_file)
+        self.assertEqual(sum(part.count for part in parts), len(whole_ids))
+        part_ids, part_keys = [], []
+        for part in parts:
+            ids, keys = self.parse(xml_file, part)
+            self.assertEqual(len(ids), part.count)
+            part_ids.append(ids)
+            part_keys += keys
+        np.testing.assert_array_equal(np.concatenate(part_ids), whole_ids)
+        self.assertEqual(part_keys, whole_keys)
+
+    def test_parts_match_unsplit_parse_utf16(self):
+        """Test, dass die Bereiche einer UTF-16-Datei zusammen dieselben Datensätze und IDs liefern wie die ganze Datei"""
+        xml_file = self.generate("utf-16")
+        self.assert_parts_match_whole(xml_file, split_xml_file(xml_file, 8 << 10))
+
+    def test_parts_match_unsplit_parse_utf8(self):
+        """Test, dass die Bereiche einer UTF-8-Datei zusammen dieselben Datensätze und IDs liefern wie die ganze Datei"""
+        xml_file = self.generate("utf-8")
+        self.assert_parts_match_whole(xml_file, split_xml_file(xml_file, 4 << 10))
+
+    def test_start_tags_across_scan_blocks(self):
+        """Test, dass Start-Tags, die über die Grenze zweier Suchblöcke reichen, genau einmal gezählt werden"""
+        xml_file = self.generate("utf-16", records=200)
+        # Ungerade Blockgröße, damit Tags in UTF-16 auch auf ungeraden Byte-Positionen geteilt werden
+        with mock.patch.object(xml_splitter, "_SCAN_BYTES", 333):
+            parts = split_xml_file(xml_file, 4 << 10)
+        self.assertEqual(parts, split_xml_file(xml_file, 4 << 10))
+        self.assert_parts_match_whole(xml_file, parts)
+
+    def test_single_record_is_not_split(self):
+        """Test, dass eine Datei mit nur einem Datensatz nicht geteilt wird"""
+        xml_file = self.generate("utf-8", records=1)
+        self.assertEqual(split_xml_file(xml_file, 16), [])
+
+if __name__ == '__main__':
+    unittest.main()
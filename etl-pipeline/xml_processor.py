@@ -1,13 +1,38 @@
 import numpy as np
-from typing import Dict, Any, List, Optional
+from pathlib import Path
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 from loguru import logger
 import xml.etree.ElementTree as ET
-from datetime import datetime
+import hashlib
 import json
+import time
+from xsd_types import load_field_kinds
+from record_batch import RecordBatch, RecordBatchBuilder
+from index_tuning import normalize_rows
+from metrics import LogSampler
+from sources import open_source
+from xml_splitter import FilePart, open_part
+
+def stable_record_id(key: str) -> int:
+    """Leitet aus einem fachlichen Schlüssel eine stabile, positive INT64-ID ab."""
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") & 0x7FFFFFFFFFFFFFFF
 
 class XMLProcessor:
-    def __init__(self, embedding_model):
+    def __init__(self, embedding_model=None, batch_size: int = 256, embedding_cache=None, normalize: bool = False):
         self.embedding_model = embedding_model
+        # Anzahl Datensätze, die gemeinsam eingebettet werden
+        self.batch_size = batch_size
+        # Optionaler persistenter Cache (EmbeddingCache) vor dem Modell
+        self.embedding_cache = embedding_cache
+        # Normierte Vektoren erlauben die Suche mit innerem Produkt (IP) statt L2
+        self.normalize = normalize
+        # Fortschritt höchstens alle 30 Sekunden statt je Block protokollieren
+        self._log_sampler = LogSampler(30.0)
+        if self.embedding_model is None:
+            # Reiner Parse-Modus (z.B. in Worker-Prozessen), ohne Embedding-Modell
+            self.vector_dim = None
+            return
         # Get dimension from model
         self.vector_dim = self.embedding_model.get_sentence_embedding_dimension()
         logger.info(f"Initialisiere XMLProcessor mit Embedding-Dimension: {self.vector_dim}")
@@ -39,77 +64,193 @@ class XMLProcessor:
             logger.error(f"Fehler bei der Embedding-Generierung: {str(e)}")
             raise  # Re-raise the exception to handle it in the calling function
 
-    def process_xml(self, xml_file: str) -> List[Dict[str, Any]]:
-        """Verarbeitet eine XML-Datei und extrahiert die relevanten Daten."""
+    def generate_embeddings(self, texts: List[str]) -> np.ndarray:
+        """Generiert Embedding-Vektoren für mehrere Texte als float32-Matrix."""
         try:
-            tree = ET.parse(xml_file)
-            root = tree.getroot()
-            
-            processed_data = []
-            for i, element in enumerate(root):
-                try:
-                    # Extrahiere alle Text-Daten für Embedding
-                    text_data = []
-                    for child in element.iter():
-                        if child.text and child.text.strip():
-                            text_data.append(f"{child.tag}: {child.text.strip()}")
-                    
-                    # Generiere Embedding aus kombiniertem Text
-                    combined_text = " ".join(text_data)
-                    vector = self.generate_embedding(combined_text)
-
-                    # Erstelle Basis-Datensatz
-                    data_item = {
-                        "id": i + 1,  # Eindeutige ID
-                        "vector": vector,  # Embedding-Vektor
-                        "metadata": {}  # Für zusätzliche Metadaten
-                    }
-
-                    # Verarbeite alle Attribute und Unterelemente
-                    for child in element:
-                        if child.text and child.text.strip():
-                            # Konvertiere Werte in passende Datentypen
-                            value = self._convert_value(child.text.strip())
-                            data_item[child.tag.lower()] = value
-
-                            # Speichere Original-Wert in Metadaten
-                            data_item["metadata"][child.tag] = child.text.strip()
-
-                    processed_data.append(data_item)
-                    
-                    if (i + 1) % 100 == 0:
-                        logger.info(f"{i + 1} Datensätze verarbeitet")
-
-                except Exception as e:
-                    logger.error(f"Fehler bei der Verarbeitung von Element {i}: {str(e)}")
-                    continue
+            if self.embedding_model is None:
+                raise ValueError("XMLProcessor wurde ohne Embedding-Modell initialisiert")
+
+            embeddings = np.zeros((len(texts), self.vector_dim), dtype=np.float32)
+
+            # Leere Texte behalten den Null-Vektor
+            valid = [i for i, text in enumerate(texts) if text and isinstance(text, str)]
+            if len(valid) < len(texts):
+                logger.warning(f"{len(texts) - len(valid)} ungültige Texte für Embedding, verwende Null-Vektor")
+            if not valid:
+                return embeddings
+
+            valid_texts = [texts[i] for i in valid]
+            if self.embedding_cache is not None:
+                # Bereits bekannte Texte aus dem Cache übernehmen, nur der Rest geht an das Modell
+                cached, found = self.embedding_cache.get_many(valid_texts)
+                embeddings[valid] = cached
+                missing = [i for i, hit in zip(valid, found) if not hit]
+            else:
+                missing = valid
+            if not missing:
+                return embeddings
+
+            # Generiere alle fehlenden Embeddings in einem Aufruf
+            missing_texts = [texts[i] for i in missing]
+            encoded = self.embedding_model.encode(
+                missing_texts,
+                batch_size=self.batch_size,
+                convert_to_numpy=True,
+                show_progress_bar=False
+            )
+            encoded = np.asarray(encoded, dtype=np.float32)
+
+            # Validiere Dimension
+            if encoded.ndim != 2 or encoded.shape[1] != self.vector_dim:
+                logger.error(f"Kritischer Fehler: Unerwartete Embedding-Form: {encoded.shape}, erwarte (*, {self.vector_dim})")
+                raise ValueError(f"Embedding-Dimension stimmt nicht überein: {encoded.shape} != (*, {self.vector_dim})")
 
-            logger.success(f"XML-Verarbeitung abgeschlossen: {len(processed_data)} Datensätze erstellt")
-            return processed_data
+            embeddings[missing] = encoded
+            if self.embedding_cache is not None:
+                self.embedding_cache.put_many(missing_texts, encoded)
+            return embeddings
 
         except Exception as e:
-            logger.error(f"Fehler beim Parsen der XML-Datei {xml_file}: {str(e)}")
+            logger.error(f"Fehler bei der Batch-Embedding-Generierung: {str(e)}")
             raise
 
-    def _convert_value(self, value: str) -> Any:
-        """Konvertiert Strings in passende Datentypen."""
+    def embed_batch(self, batch: RecordBatch) -> np.ndarray:
+        """Bettet einen spaltenorientierten Block ein; die Texte werden danach freigegeben."""
+        batch.vectors = self.generate_embeddings(batch.texts)
+        if self.normalize:
+            batch.vectors = normalize_rows(batch.vectors)
+        batch.texts = None
+        return batch.vectors
+
+    def _iter_elements(self, xml_file: str, part: Optional[FilePart] = None) -> Iterator[Tuple[int, ET.Element]]:
+        """Liefert die vollständig gelesenen Datensatz-Elemente (direkte Kinder der Wurzel) mit ihrer Position.
+
+        xml_file kann auch ein Mitglied eines ZIP-Archivs oder eine .xml.gz-Datei
+        sein; sie werden beim Lesen entpackt (siehe sources.py). Mit part wird nur
+        ein Byte-Bereich der Datei gelesen (siehe xml_splitter.py); die Positionen
+        beziehen sich weiterhin auf die gesamte Datei.
+        """
         try:
-            # Versuche als Int
-            return int(value)
-        except ValueError:
+            with (open_part(Path(xml_file), part) if part is not None else open_source(Path(xml_file))) as stream:
+                context = ET.iterparse(stream, events=("start", "end"))
+                depth = 0
+                root = None
+                index = part.first_index if part is not None else 0
+
+                for event, element in context:
+                    if event == "start":
+                        if root is None:
+                            root = element
+                        depth += 1
+                        continue
+
+                    depth -= 1
+                    if depth != 1:
+                        continue
+
+                    try:
+                        yield index, element
+                    finally:
+                        index += 1
+                        # Verarbeitete Elemente freigeben, damit der Speicherbedarf konstant bleibt
+                        element.clear()
+                        root.clear()
+
+        except Exception as e:
+            logger.error(f"Fehler beim Parsen der XML-Datei {xml_file}: {str(e)}")
+            raise
+
+    def iter_record_batches(self, xml_file: str, batch_size: Optional[int] = None, source_file: Optional[str] = None,
+                            key_field: Optional[str] = None, update_field: Optional[str] = None,
+                            min_update: Optional[str] = None, schema_file: Optional[str] = None,
+                            start_offset: int = 0, part: Optional[FilePart] = None) -> Iterator[RecordBatch]:
+        """Liest eine XML-Datei im Streaming-Modus und liefert spaltenorientierte Blöcke (ohne Embeddings).
+
+        Ist source_file gesetzt, wird es in jedem Block vermerkt, damit die
+        Datensätze einer Datei später gezielt ersetzt oder gelöscht werden können.
+        Die ID wird stabil aus key_field (z.B. EegMaStRNummer) abgeleitet, sonst aus
+        Quelldatei und Position. Ist min_update gesetzt, werden Datensätze, deren
+        update_field nicht neuer ist, schon vor dem Aufbau des Blocks verworfen.
+        Mit schema_file werden die Feldwerte nach den Feldarten der XSD typisiert,
+        und zwar erst beim Abschluss eines Blocks spaltenweise. Jeder Block trägt in stage_seconds die
+        Dauer von Parsen und Typisierung und in end_offset die Anzahl der bis dahin
+        gelesenen Datensatz-Elemente. Die ersten start_offset Elemente werden nur
+        überlesen (Fortsetzung nach einem Checkpoint). Mit part wird nur ein
+        Byte-Bereich der Datei gelesen.
+        """
+        batch_size = batch_size or self.batch_size
+        source = source_file if source_file is not None else str(xml_file)
+        builder = RecordBatchBuilder(
+            load_field_kinds(schema_file) if schema_file else {},
+            source_file=source_file,
+            update_field=update_field
+        )
+        started = time.perf_counter()
+        index = start_offset - 1
+        for index, element in self._iter_elements(xml_file, part):
+            if index < start_offset:
+                continue
             try:
-                # Versuche als Float
-                return float(value)
-            except ValueError:
-                # Versuche als Boolean
-                if value.lower() in ['true', '1', 'yes', 'ja']:
-                    return True
-                elif value.lower() in ['false', '0', 'no', 'nein']:
-                    return False
-                
-                # Versuche als Datum
-                try:
-                    return int(datetime.strptime(value, "%Y-%m-%d").timestamp())
-                except ValueError:
-                    # Behalte als String
-                    return value 
\ No newline at end of file
+                # ISO-Zeitstempel lassen sich als Strings vergleichen
+                if min_update is not None and (element.findtext(update_field) or "").strip() <= min_update:
+                    continue
+
+                text, fields = self._extract_fields(element)
+                key = element.findtext(key_field) if key_field else None
+                key = key.strip() if key else None
+                builder.add(stable_record_id(key if key else f"{source}#{index}"), text, fields)
+
+                if len(builder) >= batch_size:
+                    yield self._build_timed(builder, started, index + 1)
+                    started = time.perf_counter()
+                    if self._log_sampler.ready():
+                        logger.info(f"{index + 1} Datensätze verarbeitet")
+
+            except Exception as e:
+                logger.error(f"Fehler bei der Verarbeitung von Element {index}: {str(e)}")
+
+        if len(builder):
+            yield self._build_timed(builder, started, index + 1)
+
+    @staticmethod
+    def _build_timed(builder: RecordBatchBuilder, started: float, end_offset: int) -> RecordBatch:
+        """Schließt einen Block ab und vermerkt die Dauer von Parsen (seit started) und Typisierung."""
+        built = time.perf_counter()
+        batch = builder.build()
+        batch.stage_seconds = {"parse": built - started, "convert": time.perf_counter() - built}
+        batch.end_offset = end_offset
+        return batch
+
+    def process_xml(self, xml_file: str, schema_file: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Verarbeitet eine XML-Datei vollständig und liefert eingebettete, zeilenbasierte Datensätze.
+
+        Hülle um iter_record_batches und RecordBatch.to_records für zeilenbasierte
+        Aufrufer; die ETL selbst verarbeitet die Blöcke spaltenorientiert.
+        """
+        processed_data: List[Dict[str, Any]] = []
+        for batch in self.iter_record_batches(xml_file, schema_file=schema_file):
+            self.embed_batch(batch)
+            processed_data.extend(batch.to_records())
+        logger.success(f"XML-Verarbeitung abgeschlossen: {len(processed_data)} Datensätze erstellt")
+        return processed_data
+
+    def _extract_fields(self, element: ET.Element) -> Tuple[str, List[Tuple[str, str]]]:
+        """Liest Embedding-Text und (Tag, Rohwert)-Paare eines XML-Elements in einem einzigen Durchlauf."""
+        text_data = []
+        fields = []
+        if element.text and element.text.strip():
+            text_data.append(f"{element.tag}: {element.text.strip()}")
+
+        for child in element:
+            text = child.text.strip() if child.text else ""
+            if text:
+                text_data.append(f"{child.tag}: {text}")
+                fields.append((child.tag, text))
+
+            # Verschachtelte Unterelemente fließen nur in den Embedding-Text ein
+            if len(child):
+                for descendant in child.iter():
+                    if descendant is not child and descendant.text and descendant.text.strip():
+                        text_data.append(f"{descendant.tag}: {descendant.text.strip()}")
+
+        return " ".join(text_data), fields
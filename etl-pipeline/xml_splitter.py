@@ -0,0 +1,180 @@
+import codecs
+import re
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Iterator, List, NamedTuple, Optional, Tuple
+from loguru import logger
+
+# Bytes am Dateianfang, aus denen Kodierung, Wurzel- und Datensatz-Element bestimmt werden
+_HEAD_BYTES = 1 << 16
+# Blockgröße beim Durchsuchen der Datei nach Datensatz-Grenzen
+_SCAN_BYTES = 16 << 20
+
+_DECLARED_ENCODING = re.compile(rb"""<\?xml[^>]*encoding=["']([A-Za-z0-9._-]+)["']""")
+_START_TAG = re.compile(r"<([A-Za-z_][\w.\-]*(?::[\w.\-]+)?)(?:\s[^>]*)?>")
+
+class FilePart(NamedTuple):
+    """Byte-Bereich einer XML-Datei mit ganzen Datensatz-Elementen.
+
+    first_index ist die Position des ersten Elements in der gesamten Datei,
+    count die Anzahl der Elemente im Bereich. head_end und tail_start grenzen
+    Kopf (BOM, XML-Deklaration, Start-Tag der Wurzel) und Ende (End-Tag der
+    Wurzel) der Datei ab, die jeden Bereich zu einem gültigen Dokument ergänzen.
+    """
+    start: int
+    end: int
+    first_index: int
+    count: int
+    head_end: int
+    tail_start: int
+
+def detect_encoding(head: bytes) -> str:
+    """Bestimmt die Kodierung einer XML-Datei aus BOM bzw. XML-Deklaration."""
+    if head.startswith(codecs.BOM_UTF16_LE):
+        return "utf-16-le"
+    if head.startswith(codecs.BOM_UTF16_BE):
+        return "utf-16-be"
+    if head.startswith(b"<\x00"):
+        return "utf-16-le"
+    if head.startswith(b"\x00<"):
+        return "utf-16-be"
+    declared = _DECLARED_ENCODING.match(head.lstrip(codecs.BOM_UTF8))
+    if declared:
+        encoding = codecs.lookup(declared.group(1).decode("ascii")).name
+        # Ohne BOM ist die Byte-Reihenfolge von "UTF-16" nicht eindeutig, sie wurde oben erkannt
+        if not encoding.startswith("utf-16"):
+            return encoding
+    return "utf-8"
+
+def _bom_length(head: bytes) -> int:
+    for bom in (codecs.BOM_UTF8, codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE):
+        if head.startswith(bom):
+            return len(bom)
+    return 0
+
+def _read_structure(f: BinaryIO, encoding: str) -> Optional[Tuple[str, str, int]]:
+    """Liest Wurzel- und Datensatz-Tag sowie das Byte-Ende des Wurzel-Start-Tags aus dem Dateianfang."""
+    f.seek(0)
+    head = f.read(_HEAD_BYTES)
+    bom = _bom_length(head)
+    width = 2 if encoding.startswith("utf-16") else 1
+    data = head[bom:]
+    data = data[:len(data) - len(data) % width]
+    text = data.decode(encoding, errors="replace")
+    tags = []
+    for match in _START_TAG.finditer(text):
+        tags.append(match)
+        if len(tags) == 2:
+            break
+    if len(tags) < 2:
+        return None
+    root, record = tags
+    if root.group(0).endswith("/>"):
+        return None
+    # Bei Ein-Byte-Kodierungen mit Umlauten im Kopf weicht die Zeichen- von der Byte-Position ab
+    head_end = bom + len(text[:root.end()].encode(encoding))
+    return root.group(1), record.group(1), head_end
+
+def _tag_pattern(tag: str, encoding: str) -> "re.Pattern[bytes]":
+    """Regulärer Ausdruck für den Start-Tag eines Elements in der Byte-Kodierung der Datei."""
+    follow = b"|".join(re.escape(char.encode(encoding)) for char in (">", "/", " ", "\t", "\r", "\n"))
+    return re.compile(re.escape(f"<{tag}".encode(encoding)) + b"(?:" + follow + b")")
+
+def split_xml_file(xml_file: Path, part_bytes: int) -> List[FilePart]:
+    """Teilt eine große XML-Datei an Datensatz-Grenzen in Byte-Bereiche von etwa part_bytes.
+
+    Die Datei wird dafür einmal blockweise nach den Start-Tags des
+    Datensatz-Elements (erstes Kind der Wurzel) durchsucht; so ist für jeden
+    Bereich die Position seines ersten Elements in der Datei bekannt und die
+    positionsbasierten IDs bleiben dieselben wie beim Lesen am Stück. Liefert
+    eine leere Liste, wenn sich die Datei nicht teilen lässt (z.B. ein einziges
+    Element). Elemente mit dem Namen des Datensatz-Elements innerhalb eines
+    Datensatzes oder in Kommentaren werden nicht unterschieden; MaStR-Exporte
+    enthalten beides nicht.
+    """
+    with open(xml_file, "rb") as f:
+        encoding = detect_encoding(f.read(4))
+        structure = _read_structure(f, encoding)
+        if structure is None:
+            return []
+        root_tag, record_tag, head_end = structure
+        size = f.seek(0, 2)
+
+        # End-Tag der Wurzel am Dateiende
+        f.seek(max(head_end, size - _HEAD_BYTES))
+        tail = f.read()
+        tail_start = tail.rfind(f"</{root_tag}".encode(encoding))
+        if tail_start < 0:
+            return []
+        tail_start += size - len(tail)
+
+        pattern = _tag_pattern(record_tag, encoding)
+        # In UTF-16 liegen Zeichen auf geraden bzw. ungeraden Byte-Positionen
+        width = 2 if encoding.startswith("utf-16") else 1
+        alignment = head_end % width
+        overlap = len(pattern.pattern)
+        boundaries: List[int] = []
+        counts: List[int] = []
+        next_split = head_end
+        position = head_end
+        index = 0
+        while position < tail_start:
+            f.seek(position)
+            chunk = f.read(min(_SCAN_BYTES, tail_start - position) + overlap)
+            limit = min(_SCAN_BYTES, tail_start - position)
+            for match in pattern.finditer(chunk):
+                offset = position + match.start()
+                if match.start() >= limit or offset % width != alignment:
+                    continue
+                if offset >= next_split:
+                    boundaries.append(offset)
+                    counts.append(index)
+                    next_split = offset + part_bytes
+                index += 1
+            position += limit
+
+    if len(boundaries) < 2:
+        return []
+    ends = boundaries[1:] + [tail_start]
+    first_indices = counts + [index]
+    parts = [
+        FilePart(start, end, first_indices[i], first_indices[i + 1] - first_indices[i], head_end, tail_start)
+        for i, (start, end) in enumerate(zip(boundaries, ends))
+    ]
+    logger.info(f"{Path(xml_file).name} in {len(parts)} Bereiche mit {index} <{record_tag}>-Elementen geteilt")
+    return parts
+
+class _PartReader:
+    """Liest Kopf, Byte-Bereich und Ende einer Datei hintereinander als ein Dokument."""
+
+    def __init__(self, f: BinaryIO, part: FilePart):
+        self._f = f
+        self._segments = [(0, part.head_end), (part.start, part.end), (part.tail_start, None)]
+        self._remaining: Optional[int] = None
+
+    def read(self, size: int = -1) -> bytes:
+        while self._segments:
+            start, end = self._segments[0]
+            if self._remaining is None:
+                self._f.seek(start)
+                self._remaining = end - start if end is not None else -1
+            if self._remaining == 0:
+                self._segments.pop(0)
+                self._remaining = None
+                continue
+            if self._remaining < 0:
+                data = self._f.read(size)
+            else:
+                data = self._f.read(self._remaining if size < 0 else min(size, self._remaining))
+                self._remaining -= len(data)
+            if data:
+                return data
+            self._segments.pop(0)
+            self._remaining = None
+        return b""
+
+@contextmanager
+def open_part(xml_file: Path, part: FilePart) -> Iterator[_PartReader]:
+    """Öffnet einen Byte-Bereich als eigenständiges XML-Dokument mit dem Kopf und Ende der Datei."""
+    with open(xml_file, "rb") as f:
+        yield _PartReader(f, part)
@@ -0,0 +1,98 @@
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+from loguru import logger
+
+XS_NAMESPACE = "{http://www.w3.org/2001/XMLSchema}"
+
+# Zuordnung der XSD-Basistypen zu den Feldarten der ETL
+_XSD_KINDS = {
+    "int": "int", "integer": "int", "long": "int", "short": "int", "byte": "int",
+    "nonNegativeInteger": "int", "positiveInteger": "int", "unsignedInt": "int",
+    "unsignedLong": "int", "unsignedShort": "int", "unsignedByte": "int",
+    "decimal": "decimal", "float": "decimal", "double": "decimal",
+    "date": "date",
+    "dateTime": "datetime",
+    "boolean": "bool"
+}
+
+_BOOL_VALUES = {"true": True, "1": True, "false": False, "0": False}
+
+@lru_cache(maxsize=65536)
+def parse_date(value: str) -> int:
+    """Wandelt ein Datum (YYYY-MM-DD) in einen Unix-Zeitstempel um; Ergebnisse werden gecacht."""
+    return int(datetime(int(value[0:4]), int(value[5:7]), int(value[8:10])).timestamp())
+
+@lru_cache(maxsize=65536)
+def parse_datetime(value: str) -> int:
+    """Wandelt einen Zeitpunkt (YYYY-MM-DDTHH:MM:SS[.f]) in einen Unix-Zeitstempel um; Ergebnisse werden gecacht."""
+    if len(value) < 19:
+        return parse_date(value)
+    return int(datetime(
+        int(value[0:4]), int(value[5:7]), int(value[8:10]),
+        int(value[11:13]), int(value[14:16]), int(value[17:19])
+    ).timestamp())
+
+def parse_bool(value: str) -> bool:
+    """Wandelt einen xs:boolean-Wert um."""
+    return _BOOL_VALUES[value.lower()]
+
+# Konverter je Feldart; Strings bleiben unverändert
+CONVERTERS: Dict[str, Callable[[str], Any]] = {
+    "int": int,
+    "decimal": float,
+    "date": parse_date,
+    "datetime": parse_datetime,
+    "bool": parse_bool,
+    "string": str
+}
+
+def _local_name(type_name: str) -> str:
+    """Entfernt das Namensraum-Präfix eines Typnamens (xs:date -> date)."""
+    return type_name.split(":")[-1]
+
+def _restriction_base(node: ET.Element) -> Optional[str]:
+    """Liefert den Basistyp einer (eingebetteten) simpleType-Einschränkung."""
+    restriction = node.find(f"{XS_NAMESPACE}simpleType/{XS_NAMESPACE}restriction")
+    if restriction is None and node.tag == f"{XS_NAMESPACE}simpleType":
+        restriction = node.find(f"{XS_NAMESPACE}restriction")
+    return restriction.get("base") if restriction is not None else None
+
+@lru_cache(maxsize=None)
+def load_field_kinds(schema_file: str) -> Dict[str, str]:
+    """Liest eine XSD einmal ein und liefert die Feldart (int, decimal, date, datetime, bool, string) je Element-Tag."""
+    path = Path(schema_file)
+    if not path.exists():
+        logger.warning(f"XSD {path.name} nicht gefunden, Feldarten werden spaltenweise aus den Werten erkannt")
+        return {}
+
+    root = ET.parse(path).getroot()
+
+    # Benannte simpleTypes auf ihren Basistyp abbilden
+    simple_types: Dict[str, str] = {}
+    for simple_type in root.iter(f"{XS_NAMESPACE}simpleType"):
+        name = simple_type.get("name")
+        base = _restriction_base(simple_type)
+        if name and base:
+            simple_types[name] = _local_name(base)
+
+    def resolve(type_name: str) -> str:
+        seen = set()
+        # Ketten benannter Typen bis zum XSD-Basistyp auflösen
+        while type_name in simple_types and type_name not in seen:
+            seen.add(type_name)
+            type_name = simple_types[type_name]
+        return _XSD_KINDS.get(type_name, "string")
+
+    kinds: Dict[str, str] = {}
+    for element in root.iter(f"{XS_NAMESPACE}element"):
+        name = element.get("name")
+        if not name or element.find(f"{XS_NAMESPACE}complexType") is not None:
+            continue
+        type_name = element.get("type") or _restriction_base(element)
+        kinds[name] = resolve(_local_name(type_name)) if type_name else "string"
+
+    logger.info(f"XSD {path.name} geladen: {len(kinds)} typisierte Felder")
+    return kinds